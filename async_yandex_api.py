@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from termcolor import colored
+
+from event_log import get_logger
+from yandex_api import YandexSmartHomeAPI
+
+class AsyncYandexSmartHomeAPI:
+    """Асинхронный фасад над YandexSmartHomeAPI с параллельной обработкой устройств
+    
+    Блокирующие запросы выполняются в пуле потоков; общая сессия и кэш состояний
+    переиспользуются. Число одновременных запросов ограничено max_concurrency,
+    каждый запрос ограничен по времени request_deadline.
+    """
+    def __init__(self, api=None, token=None, max_concurrency=8, request_deadline=5.0):
+        self.api = api or YandexSmartHomeAPI(token)
+        self.max_concurrency = max_concurrency
+        self.request_deadline = request_deadline
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="api-async")
+        self._semaphore = None
+    
+    @property
+    def device_ids(self):
+        return self.api.device_ids
+    
+    async def _call(self, func, *args, deadline=None):
+        """Выполнение блокирующего вызова в пуле с ограничением параллелизма и времени"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            future = loop.run_in_executor(self._executor, functools.partial(func, *args))
+            return await asyncio.wait_for(future, timeout=deadline or self.request_deadline)
+    
+    async def add_devices(self, device_ids):
+        """Добавление устройств с параллельной проверкой доступности"""
+        self.api.device_ids = device_ids
+        print(colored(f"✓ Добавлено {len(device_ids)} устройств", "blue"))
+        
+        # Лампы с возможностями из кэша проверяются одним запросом /user/info, остальные - параллельно
+        cached, unchecked = self.api.split_cached_devices(device_ids)
+        calls = [self._call(self.api._check_device, device_id) for device_id in unchecked]
+        if cached:
+            calls.append(self._call(self.api._check_cached_devices, cached))
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        for device_id, result in zip(unchecked, results):
+            if isinstance(result, asyncio.TimeoutError):
+                print(colored(f"  • Устройство {device_id[:8]}... - превышено время ожидания", "yellow"))
+        
+        available = sum(1 for result in results[:len(unchecked)] if result is True)
+        if cached and isinstance(results[-1], int):
+            available += results[-1]
+        
+        if self.api.metadata_cache is not None:
+            self.api.metadata_cache.save()
+        self.api.start_reconciler()
+        return available
+    
+    async def connect(self, device_ids):
+        """Параллельная проверка подключения и доступности устройств
+        
+        Возвращает (подключение успешно, число доступных устройств).
+        """
+        connected, available = await asyncio.gather(
+            self._call(self.api._test_connection, deadline=10),
+            self.add_devices(device_ids),
+            return_exceptions=True
+        )
+        if isinstance(connected, BaseException):
+            print(colored(f"✗ Ошибка подключения к API: {str(connected) or 'превышено время ожидания'}", "red"))
+            connected = False
+        if isinstance(available, BaseException):
+            print(colored(f"✗ Ошибка проверки устройств: {str(available)}", "red"))
+            available = 0
+        return connected, available
+    
+    async def get_device_state(self, device_id):
+        """Текущее состояние устройства"""
+        return await self._call(self.api.get_device_state, device_id)
+    
+    async def toggle_device(self, device_id, trace=None):
+        """Переключение одного устройства"""
+        return await self._call(self.api.toggle_device, device_id, trace)
+    
+    async def toggle_all_devices(self, batched=True, trace=None):
+        """Переключение всех устройств
+        
+        batched=True - один запрос действий для всех устройств,
+        batched=False - параллельные запросы по каждому устройству.
+        trace - трасса задержки хлопок → лампа (ClapTrace) для отметок HTTP-запроса.
+        """
+        if batched:
+            try:
+                return await self._call(self.api.toggle_all_devices, True, trace)
+            except asyncio.TimeoutError:
+                get_logger().error("✗ Превышено время ожидания переключения ламп")
+                return False
+        
+        get_logger().info("\n🔄 Параллельное переключение всех ламп...", "cyan")
+        device_ids = list(self.api.device_ids)
+        
+        # Одно чтение состояний при промахе кэша, затем параллельные действия
+        await self._call(self.api.get_cached_states)
+        results = await asyncio.gather(
+            *(self.toggle_device(device_id, trace) for device_id in device_ids),
+            return_exceptions=True
+        )
+        
+        success_count = 0
+        for device_id, result in zip(device_ids, results):
+            if result is True:
+                success_count += 1
+            elif isinstance(result, BaseException):
+                reason = "превышено время ожидания" if isinstance(result, asyncio.TimeoutError) else str(result)
+                get_logger().error(f"✗ Устройство {device_id[:8]}...: {reason}", event="device_error", device_id=device_id)
+        
+        get_logger().info(f"✓ Успешно переключено {success_count}/{len(device_ids)} устройств\n", "green",
+                          event="toggle_all", succeeded=success_count, total=len(device_ids))
+        return success_count == len(device_ids)
+    
+    def close(self):
+        """Остановка пула потоков"""
+        self._executor.shutdown(wait=False)
+
+class EventLoopThread:
+    """Цикл событий asyncio в отдельном потоке для запуска корутин из синхронного кода"""
+    def __init__(self, name="asyncio-loop"):
+        self.name = name
+        self.loop = None
+        self._thread = None
+    
+    def start(self):
+        """Запуск цикла событий"""
+        if self._thread and self._thread.is_alive():
+            return self.loop
+        
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=self.name, daemon=True)
+        self._thread.start()
+        return self.loop
+    
+    def submit(self, coroutine):
+        """Передача корутины в цикл (возвращает concurrent.futures.Future)"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+    
+    def stop(self):
+        """Остановка цикла событий"""
+        if self.loop and self._thread and self._thread.is_alive():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=1)
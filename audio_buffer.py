@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+class AudioRingBuffer:
+    """Кольцевой буфер аудио-блоков без блокировок (один писатель, один читатель)"""
+    def __init__(self, capacity, chunk_size, channels=1):
+        self.capacity = capacity
+        self.chunk_size = chunk_size
+        self.channels = channels
+
+        # Память выделяется один раз, callback только копирует в неё
+        # (многоканальные блоки хранятся как chunk_size x channels)
+        shape = (capacity, chunk_size) if channels == 1 else (capacity, chunk_size, channels)
+        self.data = np.zeros(shape, dtype=np.float32)
+        self.lengths = np.zeros(capacity, dtype=np.int64)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.positions = np.zeros(capacity, dtype=np.int64)  # Номер первого сэмпла блока в потоке
+
+        # Индексы только растут: write_index меняет только писатель,
+        # read_index - только читатель, поэтому блокировки не нужны
+        self.write_index = 0
+        self.read_index = 0
+        self.dropped = 0
+
+    def write(self, chunk, timestamp, position=0):
+        """Копирование блока в буфер (вызывается из audio callback, никогда не блокируется)"""
+        if self.write_index - self.read_index >= self.capacity:
+            self.dropped += 1
+            return False
+
+        slot = self.write_index % self.capacity
+        frames = min(len(chunk), self.chunk_size)
+        self.data[slot, :frames] = chunk[:frames]
+        self.lengths[slot] = frames
+        self.timestamps[slot] = timestamp
+        self.positions[slot] = position
+
+        # Публикация блока читателю - последним действием
+        self.write_index += 1
+        return True
+
+    def peek(self):
+        """Следующий непрочитанный блок (без копирования) или None"""
+        if self.read_index >= self.write_index:
+            return None
+
+        slot = self.read_index % self.capacity
+        return self.data[slot, :self.lengths[slot]], self.timestamps[slot], self.positions[slot]
+
+    def consume(self):
+        """Освобождение блока, полученного через peek()"""
+        if self.read_index < self.write_index:
+            self.read_index += 1
+
+    def pending(self):
+        """Количество блоков, ожидающих анализа"""
+        return self.write_index - self.read_index
+
+    def has_space(self):
+        """Есть ли свободное место для записи"""
+        return self.write_index - self.read_index < self.capacity
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+# scipy импортируется только там, где нужен (фильтры, прореживание, WAV): его загрузка
+# занимает большую часть холодного старта, а режим fft без прореживания обходится numpy
+
+class SpectralPlan:
+    """Предрасчитанный план спектрального анализа для блока фиксированной длины"""
+    def __init__(self, sample_rate, chunk_size, freq_min, freq_max, window=None, ratio_max=None):
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        self.freq_min = freq_min
+        self.freq_max = freq_max
+        self.ratio_max = ratio_max  # Верхняя частота знаменателя доли; None - до частоты Найквиста
+        self.key = (sample_rate, chunk_size, freq_min, freq_max, window, ratio_max)
+        
+        # Индексы бинов rfft, попадающих в диапазон [freq_min, freq_max]
+        frequencies = np.fft.rfftfreq(chunk_size, 1 / sample_rate)
+        band = np.nonzero((frequencies >= freq_min) & (frequencies <= freq_max))[0]
+        if len(band):
+            self.band = slice(int(band[0]), int(band[-1]) + 1)
+        else:
+            self.band = slice(0, 0)
+        
+        # Веса бинов, чтобы сумма по rfft совпадала с суммой модуля полного fft:
+        # все бины, кроме DC и Найквиста (при чётной длине), встречаются дважды
+        bins = len(frequencies)
+        self.weights = np.full(bins, 2.0)
+        self.weights[0] = 1.0
+        if chunk_size % 2 == 0:
+            self.weights[-1] = 1.0
+        if ratio_max is not None:
+            self.weights[frequencies > ratio_max] = 0.0
+        
+        # Необязательное окно (по умолчанию прямоугольное, как у np.fft.fft)
+        if window is None:
+            self.window = None
+        else:
+            self.window = np.asarray(getattr(np, window)(chunk_size), dtype=np.float64)
+        
+        # Буферы, выделяемые один раз
+        self._windowed = np.empty(chunk_size, dtype=np.float64)
+        self._magnitude = np.empty(bins, dtype=np.float64)
+    
+    def band_ratio(self, audio_chunk):
+        """Доля модуля спектра, приходящаяся на диапазон хлопка"""
+        if self.window is not None:
+            np.multiply(audio_chunk, self.window, out=self._windowed)
+            spectrum = np.fft.rfft(self._windowed)
+        else:
+            spectrum = np.fft.rfft(audio_chunk)
+        
+        magnitude = np.abs(spectrum, out=self._magnitude)
+        total_energy = np.dot(magnitude, self.weights)
+        if total_energy <= 0:
+            return 0.0
+        
+        return float(np.sum(magnitude[self.band]) / total_energy)
+    
+    def band_ratios(self, frames):
+        """Доли спектра в диапазоне хлопка для массива блоков (frames x chunk_size) за один проход"""
+        if self.window is not None:
+            frames = frames * self.window
+        
+        magnitude = np.abs(np.fft.rfft(frames, axis=1))
+        total_energy = magnitude @ self.weights
+        band_energy = magnitude[:, self.band].sum(axis=1)
+        
+        ratios = np.zeros(len(frames))
+        np.divide(band_energy, total_energy, out=ratios, where=total_energy > 0)
+        return ratios
+
+class BandpassFilter:
+    """Потоковый полосовой IIR-фильтр (SOS) с сохранением состояния между блоками"""
+    def __init__(self, sample_rate, freq_min, freq_max, order=4):
+        self.sample_rate = sample_rate
+        self.freq_min = freq_min
+        self.freq_max = freq_max
+        self.key = (sample_rate, freq_min, freq_max, order)
+        
+        # Верхняя граница должна быть строго ниже частоты Найквиста
+        nyquist = sample_rate / 2
+        high = min(freq_max, nyquist * 0.95)
+        low = min(freq_min, high * 0.5)
+        from scipy import signal
+        self.sos = signal.butter(order, [low, high], btype='bandpass', fs=sample_rate, output='sos')
+        self.zi = np.zeros((self.sos.shape[0], 2))
+        self._sosfilt = signal.sosfilt
+    
+    def reset(self):
+        """Сброс состояния фильтра"""
+        self.zi.fill(0.0)
+    
+    def process(self, audio_chunk):
+        """Фильтрация блока с переносом состояния на следующий блок"""
+        filtered, self.zi = self._sosfilt(self.sos, audio_chunk, zi=self.zi)
+        return filtered
+    
+    def band_ratio(self, audio_chunk):
+        """Доля энергии сигнала в полосе хлопка (во временной области)"""
+        filtered = self.process(audio_chunk)
+        total_energy = np.dot(audio_chunk, audio_chunk)
+        if total_energy <= 0:
+            return 0.0
+        
+        return float(np.dot(filtered, filtered) / total_energy)
+    
+    def filter_signal(self, audio):
+        """Фильтрация целой записи с нулевого состояния (состояние потока не меняется)"""
+        return self._sosfilt(self.sos, audio)
+
+class OnsetDetector:
+    """Поиск начала хлопка внутри блока по производной энергии коротких окон"""
+    def __init__(self, hop_size=128, rise_ratio=4.0):
+        self.hop_size = hop_size
+        self.rise_ratio = rise_ratio  # Во сколько раз энергия окна должна превысить предыдущую
+        self.prev_energy = 0.0  # Энергия последнего окна предыдущего блока
+    
+    def reset(self):
+        """Сброс состояния между запусками"""
+        self.prev_energy = 0.0
+    
+    def hop_energies(self, audio_chunk):
+        """Средняя энергия каждого окна блока (без копирования данных)"""
+        hops = len(audio_chunk) // self.hop_size
+        if hops == 0:
+            return np.array([np.dot(audio_chunk, audio_chunk) / max(len(audio_chunk), 1)])
+        
+        framed = audio_chunk[:hops * self.hop_size].reshape(hops, self.hop_size)
+        return np.einsum('ij,ij->i', framed, framed) / self.hop_size
+    
+    def observe(self, audio_chunk):
+        """Обновление состояния для блока без хлопка (только последнее окно)"""
+        tail = audio_chunk[-self.hop_size:]
+        if len(tail):
+            self.prev_energy = float(np.dot(tail, tail) / len(tail))
+    
+    def locate(self, audio_chunk):
+        """Смещение начала хлопка от начала блока (в сэмплах)"""
+        energies = self.hop_energies(audio_chunk)
+        offset = self.locate_many(energies[np.newaxis, :], np.array([self.prev_energy]))[0]
+        self.prev_energy = float(energies[-1])
+        return int(offset)
+    
+    def locate_many(self, energies, prev_energies):
+        """Смещения начала хлопка для массива блоков (blocks x hops) за один проход"""
+        previous = np.empty_like(energies)
+        previous[:, 0] = prev_energies
+        previous[:, 1:] = energies[:, :-1]
+        
+        # Первое окно с резким ростом энергии, сопоставимой с пиком блока
+        rising = (energies > previous * self.rise_ratio) & (energies >= energies.max(axis=1, keepdims=True) * 0.25)
+        hops = np.where(rising.any(axis=1), rising.argmax(axis=1), np.argmax(energies - previous, axis=1))
+        
+        return hops * self.hop_size
+
+class ChannelFusion:
+    """Объединение каналов микрофонного массива в один сигнал для детектора
+    
+    Энергия всех каналов считается одной операцией; спектр всех каналов (один вызов
+    rfft по оси времени) - только для блоков с резким ростом энергии.
+    
+    mode: "max" - канал с наибольшей энергией в полосе хлопка в этом блоке;
+    "sum" - среднее каналов; "delay_and_sum" - среднее после выравнивания задержек
+    (оцениваются по громким блокам методом GCC-PHAT); "best" - канал с лучшим
+    отношением сигнал/шум на последних хлопках (выбирается адаптивно).
+    """
+    MODES = ("max", "sum", "delay_and_sum", "best")
+    
+    def __init__(self, channels, sample_rate, freq_min, freq_max, mode="max", max_delay=32,
+                 transient_ratio=8.0, smoothing=0.2):
+        if mode not in self.MODES:
+            raise ValueError(f"Неизвестный способ объединения каналов: {mode}")
+        self.channels = channels
+        self.sample_rate = sample_rate
+        self.freq_min = freq_min
+        self.freq_max = freq_max
+        self.mode = mode
+        self.max_delay = max_delay  # Наибольшая задержка между каналами (сэмплов)
+        self.transient_ratio = transient_ratio  # Во сколько раз энергия хлопка выше шума
+        self.smoothing = smoothing
+        
+        self.delays = np.zeros(channels, dtype=np.int64)  # Задержка каждого канала относительно опорного
+        self.noise = None  # Энергия шума по каналам (EMA)
+        self.scores = np.zeros(channels)  # Отношение сигнал/шум на хлопках по каналам (EMA)
+        self.best_channel = 0
+        self._history = np.zeros((2 * max_delay, channels), dtype=np.float32)  # Хвост предыдущих блоков
+        self._band = None
+        self._band_key = None
+    
+    def _get_band(self, frames):
+        """Маска бинов rfft в полосе хлопка (пересчитывается при смене длины блока)"""
+        if self._band_key != frames:
+            frequencies = np.fft.rfftfreq(frames, 1 / self.sample_rate)
+            self._band = (frequencies >= self.freq_min) & (frequencies <= self.freq_max)
+            self._band_key = frames
+        return self._band
+    
+    def band_energies(self, block):
+        """Энергия в полосе хлопка по каналам и спектр блока (frames x channels)"""
+        spectrum = np.fft.rfft(block, axis=0)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        return power[self._get_band(len(block))].sum(axis=0), spectrum
+    
+    def fuse(self, block):
+        """Один сигнал из многоканального блока (frames x channels)"""
+        levels = np.einsum('ij,ij->j', block, block)
+        
+        # Шум по каналам обновляется только на блоках без резкого роста энергии
+        if self.noise is None:
+            self.noise = levels.astype(np.float64)
+        transient = levels > self.noise * self.transient_ratio
+        quiet = ~transient
+        self.noise[quiet] += self.smoothing * 0.1 * (levels[quiet] - self.noise[quiet])
+        
+        channel = self.best_channel
+        if transient.any():
+            # Громкий блок: энергия в полосе хлопка по всем каналам за один rfft
+            energies, spectrum = self.band_energies(block)
+            snr = energies / np.maximum(self.noise, 1e-12)
+            self.scores += self.smoothing * (snr - self.scores)
+            self.best_channel = int(np.argmax(self.scores))
+            channel = int(np.argmax(energies))
+            if self.mode == "delay_and_sum":
+                self._update_delays(spectrum, len(block))
+        
+        if self.mode == "max":
+            fused = block[:, channel]
+        elif self.mode == "best":
+            fused = block[:, self.best_channel]
+        elif self.mode == "sum":
+            fused = block.mean(axis=1)
+        else:
+            fused = self._delay_and_sum(block)
+        return np.ascontiguousarray(fused, dtype=np.float32)
+    
+    def _update_delays(self, spectrum, frames):
+        """Оценка задержек каналов относительно лучшего канала (GCC-PHAT, все каналы сразу)"""
+        reference = spectrum[:, self.best_channel:self.best_channel + 1]
+        cross = reference * np.conj(spectrum)
+        cross /= np.maximum(np.abs(cross), 1e-12)
+        correlation = np.fft.irfft(cross, n=frames, axis=0)
+        
+        # Лаги от -max_delay до +max_delay (отрицательные - в конце массива)
+        lags = np.concatenate((correlation[-self.max_delay:], correlation[:self.max_delay + 1]))
+        self.delays = self.max_delay - np.argmax(lags, axis=0)
+    
+    def _delay_and_sum(self, block):
+        """Среднее каналов после выравнивания задержек (результат запаздывает на max_delay сэмплов)
+        
+        Канал с задержкой d задерживается ещё на max_delay - d, чтобы все каналы совпали.
+        """
+        frames = len(block)
+        extended = np.concatenate((self._history, block))
+        self._history = extended[-2 * self.max_delay:] if self.max_delay else self._history
+        
+        offsets = self.max_delay + np.clip(self.delays, -self.max_delay, self.max_delay)
+        fused = np.zeros(frames, dtype=np.float32)
+        for channel, offset in enumerate(offsets):
+            fused += extended[offset:offset + frames, channel]
+        fused /= self.channels
+        return fused
+
+class Decimator:
+    """Потоковое понижение частоты в целое число раз (многофазный FIR, как в signal.resample_poly)
+    
+    Фильтр тот же, что строит resample_poly; состояние между блоками сохраняется,
+    поэтому на границах блоков нет переходных процессов. Задержка - half_len входных сэмплов.
+    """
+    def __init__(self, factor, half_len=None):
+        self.factor = factor
+        half_len = half_len or 10 * factor
+        from scipy import signal
+        self.taps = signal.firwin(2 * half_len + 1, 1.0 / factor, window=('kaiser', 5.0))
+        self._upfirdn = signal.upfirdn
+        self._history = np.zeros(len(self.taps) - 1, dtype=np.float32)
+        self._phase = 0  # Смещение первого выходного сэмпла в следующем блоке
+    
+    def reset(self):
+        """Сброс состояния фильтра"""
+        self._history.fill(0.0)
+        self._phase = 0
+    
+    def process(self, audio_chunk):
+        """Понижение частоты блока (длина результата - около len(audio_chunk) / factor)"""
+        history_len = len(self._history)
+        extended = np.concatenate((self._history, audio_chunk))
+        
+        # (len(taps) - 1) кратно factor, поэтому выходы upfirdn совпадают с сеткой прореживания
+        filtered = self._upfirdn(self.taps, extended[self._phase:], up=1, down=self.factor)
+        count = max(0, -(-(len(audio_chunk) - self._phase) // self.factor))
+        start = history_len // self.factor
+        
+        self._history = extended[-history_len:]
+        self._phase = (self._phase - len(audio_chunk)) % self.factor
+        return filtered[start:start + count].astype(np.float32)
+
+def lowest_sample_rate(freq_max, candidates=(8000, 11025, 16000, 22050, 24000, 32000, 44100, 48000), margin=1.1):
+    """Наименьшая стандартная частота дискретизации, у которой частота Найквиста покрывает freq_max"""
+    required = 2 * freq_max * margin
+    for rate in sorted(candidates):
+        if rate >= required:
+            return rate
+    return max(candidates)
+
+def spectrum_limit(freq_max):
+    """Верхняя частота спектра для доли полосы хлопка - частота Найквиста наименьшей подходящей частоты
+    
+    Одна и та же при любой частоте дискретизации, которую может выбрать lowest_sample_rate,
+    поэтому доля полосы (и порог fft_band_ratio) не зависит от частоты захвата.
+    """
+    return lowest_sample_rate(freq_max) / 2
+
+def decimation_factor(capture_rate, freq_max, margin=1.1):
+    """Наибольший целый коэффициент прореживания, сохраняющий полосу до freq_max"""
+    return max(1, int(capture_rate // (2 * freq_max * margin)))
+
+class P2Quantile:
+    """Потоковая оценка квантиля алгоритмом P² (пять маркеров, O(1) памяти и времени на значение)"""
+    def __init__(self, q):
+        self.q = q
+        self.count = 0
+        self._heights = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self._increments = [0, q / 2, q, (1 + q) / 2, 1]
+    
+    def add(self, x):
+        """Учёт очередного значения"""
+        self.count += 1
+        heights = self._heights
+        if self.count <= 5:
+            heights.append(x)
+            heights.sort()
+            return
+        
+        positions = self._positions
+        if x < heights[0]:
+            heights[0] = x
+            cell = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            cell = 3
+        else:
+            cell = 0
+            while x >= heights[cell + 1]:
+                cell += 1
+        
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+        
+        # Корректировка средних маркеров к желаемым позициям
+        for i in (1, 2, 3):
+            delta = self._desired[i] - positions[i]
+            if (delta >= 1 and positions[i + 1] - positions[i] > 1) or (delta <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if delta > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+    
+    def _parabolic(self, i, step):
+        """Кусочно-параболическая интерполяция высоты маркера"""
+        h = self._heights
+        n = self._positions
+        return h[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+    
+    @property
+    def value(self):
+        """Текущая оценка квантиля (None, если значений ещё не было)"""
+        if self.count == 0:
+            return None
+        if self.count <= 5:
+            return self._heights[min(int(round(self.q * (self.count - 1))), self.count - 1)]
+        return self._heights[2]
+
+def read_wav(path):
+    """Чтение WAV-файла в массив float32 в диапазоне [-1, 1]"""
+    from scipy.io import wavfile
+    sample_rate, data = wavfile.read(path)
+    
+    if data.dtype == np.uint8:
+        audio = (data.astype(np.float32) - 128) / 128
+    elif np.issubdtype(data.dtype, np.integer):
+        audio = data.astype(np.float32) / np.iinfo(data.dtype).max
+    else:
+        audio = data.astype(np.float32, copy=False)
+    
+    return audio, sample_rate
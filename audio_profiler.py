@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import cProfile
+import io
+import pstats
+import time
+import numpy as np
+from termcolor import colored
+
+from event_log import get_logger
+
+# Флаги статуса sounddevice (sd.CallbackFlags), учитываемые по отдельности
+STATUS_FLAGS = ("input_overflow", "input_underflow", "output_overflow", "output_underflow", "priming_output")
+
+class RollingTimings:
+    """Последние size измерений в заранее выделенном кольцевом массиве"""
+    def __init__(self, size=1024):
+        self.values = np.zeros(size)
+        self.size = size
+        self.index = 0
+        self.count = 0
+        self.max = 0.0
+    
+    def add(self, value):
+        """Запись измерения (без выделения памяти)"""
+        self.values[self.index] = value
+        self.index = (self.index + 1) % self.size
+        self.count += 1
+        if value > self.max:
+            self.max = value
+    
+    def percentiles(self, qs=(50, 99)):
+        """Перцентили по окну (вызывается вне горячего пути)"""
+        filled = self.values[:min(self.count, self.size)]
+        if not len(filled):
+            return [0.0] * len(qs)
+        return [float(value) for value in np.percentile(filled, qs)]
+
+class CallbackProfiler:
+    """Профилировщик audio callback и анализа блоков
+    
+    Длительность каждого callback сравнивается с бюджетом блока (chunk_size / sample_rate),
+    флаги статуса считаются по типам, CPU-время is_clap_sound - по каждому блоку.
+    Горячий путь только пишет числа в кольцевые массивы; предупреждения выводит
+    поток анализа (check), не чаще warn_interval. При sample_every > 0 каждый
+    sample_every-й блок анализируется под cProfile.
+    """
+    def __init__(self, budget, size=1024, warn_ratio=0.8, warn_interval=5.0, sample_every=0):
+        self.budget = budget  # Бюджет одного блока (сек)
+        self.warn_ratio = warn_ratio  # Доля бюджета, после которой callback считается близким к пределу
+        self.warn_interval = warn_interval
+        self.sample_every = sample_every
+        
+        self.callback_times = RollingTimings(size)
+        self.analysis_times = RollingTimings(size)  # CPU-время is_clap_sound (thread_time)
+        self.near_budget = 0
+        self.overruns = 0
+        self.analysis_overruns = 0  # Анализ блока дольше бюджета блока
+        self.status_counts = {flag: 0 for flag in STATUS_FLAGS}
+        
+        self._reported = (0, 0, 0, 0)
+        self._last_warning = 0.0
+        self._chunks = 0
+        self._profile = cProfile.Profile() if sample_every else None
+        self.profiled_chunks = 0
+    
+    def record_callback(self, elapsed, status=None):
+        """Длительность callback и флаги статуса (вызывается из audio callback)"""
+        self.callback_times.add(elapsed)
+        if elapsed > self.budget * self.warn_ratio:
+            self.near_budget += 1
+            if elapsed > self.budget:
+                self.overruns += 1
+        if status:
+            for flag in STATUS_FLAGS:
+                if getattr(status, flag, False):
+                    self.status_counts[flag] += 1
+    
+    def record_analysis(self, cpu_time):
+        """CPU-время анализа блока (вызывается потоком анализа)"""
+        self.analysis_times.add(cpu_time)
+        if cpu_time > self.budget:
+            self.analysis_overruns += 1
+    
+    def begin_sample(self):
+        """Включение cProfile для очередного блока, если он попадает в выборку"""
+        if self._profile is None:
+            return False
+        self._chunks += 1
+        if self._chunks % self.sample_every:
+            return False
+        try:
+            self._profile.enable()
+        except ValueError:
+            # Другой профилировщик уже активен (например, у соседнего потока супервизора)
+            return False
+        return True
+    
+    def end_sample(self):
+        self._profile.disable()
+        self.profiled_chunks += 1
+    
+    def check(self):
+        """Предупреждения о новых перегрузках и потерях (вызывается потоком анализа)"""
+        xruns = self.status_counts["input_overflow"] + self.status_counts["input_underflow"]
+        current = (self.near_budget, self.overruns, self.analysis_overruns, xruns)
+        if current == self._reported:
+            return
+        now = time.monotonic()
+        if now - self._last_warning < self.warn_interval:
+            return
+        
+        near, overruns, analysis_overruns, xruns = (
+            new - old for new, old in zip(current, self._reported))
+        self._reported = current
+        self._last_warning = now
+        
+        budget_ms = self.budget * 1000
+        log = get_logger()
+        if overruns:
+            log.warning(
+                f"⚠ Callback превысил бюджет {overruns} раз (макс. {self.callback_times.max * 1000:.2f} мс "
+                f"из {budget_ms:.1f} мс)", event="callback_overrun", count=overruns)
+        elif near:
+            log.warning(
+                f"⚠ Callback близок к бюджету: {near} раз > {self.warn_ratio:.0%} "
+                f"(макс. {self.callback_times.max * 1000:.2f} мс из {budget_ms:.1f} мс)", event="callback_near_budget", count=near)
+        if analysis_overruns:
+            log.warning(
+                f"⚠ Анализ блока дольше бюджета {analysis_overruns} раз "
+                f"(макс. {self.analysis_times.max * 1000:.2f} мс из {budget_ms:.1f} мс)",
+                event="analysis_overrun", count=analysis_overruns)
+        if xruns:
+            log.warning(
+                f"⚠ Потери аудио: переполнений входа {self.status_counts['input_overflow']}, "
+                f"опустошений входа {self.status_counts['input_underflow']}", event="xrun", count=xruns)
+    
+    def get_stats(self):
+        """Сводка профилировщика (мс)"""
+        callback_p50, callback_p99 = self.callback_times.percentiles()
+        analysis_p50, analysis_p99 = self.analysis_times.percentiles()
+        return {
+            'budget_ms': self.budget * 1000,
+            'callbacks': self.callback_times.count,
+            'callback_p50_ms': callback_p50 * 1000,
+            'callback_p99_ms': callback_p99 * 1000,
+            'callback_max_ms': self.callback_times.max * 1000,
+            'near_budget': self.near_budget,
+            'overruns': self.overruns,
+            'chunks': self.analysis_times.count,
+            'analysis_p50_ms': analysis_p50 * 1000,
+            'analysis_p99_ms': analysis_p99 * 1000,
+            'analysis_max_ms': self.analysis_times.max * 1000,
+            'analysis_overruns': self.analysis_overruns,
+            'status': dict(self.status_counts),
+            'profiled_chunks': self.profiled_chunks
+        }
+    
+    def print_report(self):
+        """Вывод сводки профилировщика"""
+        stats = self.get_stats()
+        load = stats['analysis_p99_ms'] / stats['budget_ms'] if stats['budget_ms'] else 0.0
+        print(colored(
+            f"  Callback: p50 {stats['callback_p50_ms']:.3f} мс, p99 {stats['callback_p99_ms']:.3f} мс, "
+            f"макс. {stats['callback_max_ms']:.3f} мс из {stats['budget_ms']:.1f} мс "
+            f"(близко к бюджету: {stats['near_budget']}, превышений: {stats['overruns']})", "blue"))
+        print(colored(
+            f"  Анализ (is_clap_sound, CPU): p50 {stats['analysis_p50_ms']:.3f} мс, "
+            f"p99 {stats['analysis_p99_ms']:.3f} мс ({load:.1%} бюджета), "
+            f"макс. {stats['analysis_max_ms']:.3f} мс", "blue"))
+        flags = ", ".join(f"{flag} {count}" for flag, count in stats['status'].items() if count)
+        if flags:
+            print(colored(f"  Флаги статуса: {flags}", "yellow"))
+    
+    def print_profile(self, limit=15):
+        """Самые затратные функции по выборке cProfile"""
+        if self._profile is None or not self.profiled_chunks:
+            return
+        output = io.StringIO()
+        pstats.Stats(self._profile, stream=output).sort_stats("cumulative").print_stats(limit)
+        print(colored(f"\nПрофиль анализа ({self.profiled_chunks} блоков):", "cyan"))
+        print(output.getvalue())
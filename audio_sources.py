@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from types import SimpleNamespace
+import numpy as np
+import sounddevice as sd
+
+from audio_dsp import read_wav
+
+class AudioSource(ABC):
+    """Базовый источник аудио с интерфейсом, совместимым с sd.InputStream / sd.rec"""
+    is_live = False
+    
+    @abstractmethod
+    def open_stream(self, callback, samplerate, blocksize, channels=1, ready=None):
+        """Контекстный менеджер потока, вызывающего callback(indata, frames, time_info, status)
+        
+        ready - необязательная функция без аргументов; источники воспроизведения
+        ждут, пока она не вернёт True, прежде чем отдать следующий блок.
+        """
+    
+    @abstractmethod
+    def record(self, frames, samplerate, channels=1):
+        """Запись фиксированного числа сэмплов (аналог sd.rec + sd.wait)"""
+    
+    def is_finished(self):
+        """Закончились ли данные источника"""
+        return False
+
+class SoundDeviceSource(AudioSource):
+    """Живой микрофон через sounddevice"""
+    is_live = True
+    
+    def __init__(self, device=None):
+        self.device = device
+    
+    def open_stream(self, callback, samplerate, blocksize, channels=1, ready=None):
+        return sd.InputStream(
+            device=self.device,
+            callback=callback,
+            channels=channels,
+            samplerate=samplerate,
+            blocksize=blocksize
+        )
+    
+    def record(self, frames, samplerate, channels=1):
+        audio_data = sd.rec(
+            frames,
+            samplerate=samplerate,
+            channels=channels,
+            dtype='float32',
+            device=self.device
+        )
+        sd.wait()
+        return audio_data
+
+class ArraySource(AudioSource):
+    """Воспроизведение массива NumPy в реальном времени или без ограничения скорости"""
+    def __init__(self, audio, sample_rate, realtime=False, loop=False):
+        audio = np.asarray(audio, dtype=np.float32)
+        self.audio = audio.reshape(-1, 1) if audio.ndim == 1 else audio
+        self.sample_rate = sample_rate
+        self.realtime = realtime
+        self.loop = loop
+        self.position = 0
+        # Устанавливается, когда последний блок отдан потребителю (после возврата callback
+        # или из record), а не когда position дошла до конца данных
+        self.finished = threading.Event()
+    
+    def _check_format(self, samplerate, channels):
+        """Проверка совпадения формата с запрошенным"""
+        if samplerate != self.sample_rate:
+            raise ValueError(f"Частота источника {self.sample_rate} Гц не совпадает с запрошенной {samplerate} Гц")
+        if channels > self.audio.shape[1]:
+            raise ValueError(f"В источнике {self.audio.shape[1]} каналов, запрошено {channels}")
+    
+    def _read(self, frames, channels):
+        """Следующие frames сэмплов (с дополнением нулями в конце данных)"""
+        block = np.zeros((frames, channels), dtype=np.float32)
+        filled = 0
+        
+        while filled < frames:
+            if self.position >= len(self.audio):
+                if not self.loop or len(self.audio) == 0:
+                    break
+                self.position = 0
+            
+            count = min(frames - filled, len(self.audio) - self.position)
+            block[filled:filled + count] = self.audio[self.position:self.position + count, :channels]
+            self.position += count
+            filled += count
+        
+        return block
+    
+    def _exhausted(self):
+        """Все данные прочитаны (без зацикливания)"""
+        return not self.loop and self.position >= len(self.audio)
+    
+    def is_finished(self):
+        return self.finished.is_set()
+    
+    def record(self, frames, samplerate, channels=1):
+        self._check_format(samplerate, channels)
+        if self.realtime:
+            time.sleep(frames / samplerate)
+        block = self._read(frames, channels)
+        if self._exhausted():
+            self.finished.set()
+        return block
+    
+    def open_stream(self, callback, samplerate, blocksize, channels=1, ready=None):
+        self._check_format(samplerate, channels)
+        return _ReplayStream(self, callback, blocksize, channels, ready)
+
+class _ReplayStream:
+    """Поток воспроизведения, передающий блоки в callback из отдельного потока"""
+    def __init__(self, source, callback, blocksize, channels, ready):
+        self.source = source
+        self.callback = callback
+        self.blocksize = blocksize
+        self.channels = channels
+        self.ready = ready
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def _run(self):
+        source = self.source
+        start_time = time.perf_counter()
+        start_position = source.position
+        stream_position = 0
+        
+        while not self._stop.is_set() and not source._exhausted():
+            if source.realtime:
+                # Темп реального времени по часам потока
+                delay = start_time + stream_position / source.sample_rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            elif self.ready is not None:
+                # Без ограничения скорости, но не быстрее, чем потребитель успевает читать
+                while not self.ready() and not self._stop.is_set():
+                    time.sleep(0.0005)
+            
+            indata = source._read(self.blocksize, self.channels)
+            adc_time = (start_position + stream_position) / source.sample_rate
+            time_info = SimpleNamespace(
+                inputBufferAdcTime=adc_time,
+                currentTime=adc_time + self.blocksize / source.sample_rate
+            )
+            self.callback(indata, self.blocksize, time_info, None)
+            stream_position += self.blocksize
+        
+        # Последний блок уже в буфере потребителя: теперь можно завершать анализ
+        if source._exhausted():
+            source.finished.set()
+    
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name="audio-replay", daemon=True)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+class WavFileSource(ArraySource):
+    """Воспроизведение WAV-файла"""
+    def __init__(self, path, realtime=False, loop=False):
+        audio, sample_rate = read_wav(path)
+        super().__init__(audio, sample_rate, realtime=realtime, loop=loop)
+        self.path = path
+
+class RawFileSource(ArraySource):
+    """Воспроизведение файла с сырыми сэмплами (без заголовка, отображается в память)"""
+    def __init__(self, path, sample_rate, dtype='float32', channels=1, realtime=False, loop=False):
+        data = np.memmap(path, dtype=dtype, mode='r')
+        data = data[:len(data) - len(data) % channels].reshape(-1, channels)
+        if np.issubdtype(data.dtype, np.integer):
+            data = data.astype(np.float32) / np.iinfo(data.dtype).max
+        super().__init__(data, sample_rate, realtime=realtime, loop=loop)
+        self.path = path
+
+def synthesize_claps(duration, sample_rate, clap_times=(), noise_level=0.01, clap_level=0.8, seed=0):
+    """Синтетическая запись: фоновый шум и короткие высокочастотные импульсы-хлопки"""
+    rng = np.random.default_rng(seed)
+    audio = rng.normal(0, noise_level, int(duration * sample_rate)).astype(np.float32)
+    
+    clap_length = int(0.02 * sample_rate)
+    envelope = np.exp(-np.linspace(0, 8, clap_length))
+    high = min(7000, sample_rate * 0.45)
+    from scipy import signal
+    sos = signal.butter(4, [min(2500, high * 0.5), high], btype='bandpass', fs=sample_rate, output='sos')
+    burst = signal.sosfilt(sos, rng.normal(0, 1, clap_length)) * envelope
+    burst = (burst / np.max(np.abs(burst)) * clap_level).astype(np.float32)
+    
+    for clap_time in clap_times:
+        start = int(clap_time * sample_rate)
+        end = min(start + clap_length, len(audio))
+        if start < end:
+            audio[start:end] += burst[:end - start]
+    
+    return audio
+
+class SyntheticSource(ArraySource):
+    """Генератор синтетического аудио с хлопками в заданные моменты"""
+    def __init__(self, sample_rate, duration, clap_times=(), noise_level=0.01, clap_level=0.8,
+                 seed=0, realtime=False, loop=False):
+        audio = synthesize_claps(duration, sample_rate, clap_times, noise_level, clap_level, seed)
+        super().__init__(audio, sample_rate, realtime=realtime, loop=loop)
+        self.clap_times = list(clap_times)
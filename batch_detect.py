@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+from termcolor import colored
+
+from record_audio import ClapDetector
+from calibration import CalibrationManager
+
+def analyze_files(paths, mode="fft"):
+    """Пакетная обработка WAV-файлов с параметрами из config.json"""
+    config = CalibrationManager().config
+    detector = ClapDetector(sample_rate=config.get('sample_rate', 44100), chunk_size=1024)
+    detector.threshold = config.get('threshold', 0.3)
+    detector.clap_cooldown = config.get('clap_cooldown', 0.5)
+    detector.double_clap_window = config.get('double_clap_window', 1.0)
+    detector.clap_freq_min = config.get('clap_freq_min', detector.clap_freq_min)
+    detector.clap_freq_max = config.get('clap_freq_max', detector.clap_freq_max)
+    detector.fft_band_ratio = config.get('fft_band_ratio', detector.fft_band_ratio)
+    detector.detection_mode = mode
+    
+    for path in paths:
+        print(colored(f"\n=== {path} ===", "blue", attrs=['bold']))
+        try:
+            start = time.perf_counter()
+            events = detector.detect_wav(path)
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            print(colored(f"✗ Ошибка обработки файла: {str(e)}", "red"))
+            continue
+        
+        for event in events:
+            if event['type'] == 'double_clap':
+                print(colored(f"  {event['time']:10.3f} с  👏👏 двойной хлопок", "green"))
+            else:
+                print(colored(f"  {event['time']:10.3f} с  👏 хлопок (сэмпл {event['sample']})", "cyan"))
+        
+        doubles = sum(1 for event in events if event['type'] == 'double_clap')
+        print(colored(f"✓ Хлопков: {len(events) - doubles}, двойных: {doubles}, время анализа: {elapsed:.2f} с", "green"))
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    mode = "fft"
+    if args and args[0] in ("--iir", "--fft"):
+        mode = args.pop(0)[2:]
+    
+    if not args:
+        print(colored("Использование: python batch_detect.py [--fft|--iir] файл.wav [...]", "yellow"))
+        sys.exit(1)
+    
+    analyze_files(args, mode=mode)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+import numpy as np
+from termcolor import colored
+
+from record_audio import ClapDetector
+from audio_sources import synthesize_claps
+
+def benchmark_mode(mode, audio, sample_rate, chunk_size, threshold, repeats=3):
+    """CPU-время анализа одной секунды аудио в заданном режиме"""
+    detector = ClapDetector(sample_rate=sample_rate, chunk_size=chunk_size)
+    detector.detection_mode = mode
+    detector.threshold = threshold
+    
+    chunks = [audio[i:i + chunk_size] for i in range(0, len(audio) - chunk_size + 1, chunk_size)]
+    best = None
+    detections = 0
+    
+    for _ in range(repeats):
+        detections = 0
+        start = time.process_time()
+        for chunk in chunks:
+            if detector.is_clap_sound(chunk):
+                detections += 1
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    
+    audio_seconds = len(chunks) * chunk_size / sample_rate
+    return best / audio_seconds, detections
+
+def run_benchmark(duration=60, sample_rate=44100, chunk_size=1024):
+    """Сравнение режимов детекции fft и iir"""
+    print(colored(f"\n=== Бенчмарк детекции ({duration} с аудио, {sample_rate} Гц, блок {chunk_size}) ===", "blue", attrs=['bold']))
+    
+    clap_times = np.arange(1.0, duration - 1, 2.5)
+    audio = synthesize_claps(duration, sample_rate, clap_times)
+    
+    # threshold=0 - спектральный анализ выполняется для каждого блока (худший случай)
+    for label, threshold in (("все блоки", 0.0), ("порог 0.05", 0.05)):
+        print(colored(f"\nРежим анализа: {label}", "cyan"))
+        for mode in ("fft", "iir"):
+            cpu_per_second, detections = benchmark_mode(mode, audio, sample_rate, chunk_size, threshold)
+            print(colored(
+                f"  {mode:<4} {cpu_per_second * 1000:8.3f} мс CPU на 1 с аудио "
+                f"({cpu_per_second * 100:.2f}% ядра), срабатываний: {detections}", "white"))
+
+if __name__ == "__main__":
+    duration = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    run_benchmark(duration=duration)
@@ -3,6 +3,7 @@
 
 import json
 import os
+import sounddevice as sd
 from record_audio import ClapDetector
 from termcolor import colored
 
@@ -28,25 +29,73 @@ class CalibrationManager:
             "double_clap_window": 1.0
         }
     
-    def save_config(self):
+    def save_config(self, quiet=False):
         """Сохранение конфигурации"""
         try:
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(self.config, f, indent=2, ensure_ascii=False)
-            print(colored("✓ Конфигурация сохранена", "green"))
+            if not quiet:
+                print(colored("✓ Конфигурация сохранена", "green"))
         except Exception as e:
             print(colored(f"✗ Ошибка сохранения конфигурации: {str(e)}", "red"))
     
-    def run_calibration(self):
-        """Запуск процесса калибровки"""
+    def save_noise_floor(self, noise_floor):
+        """Сохранение уровня шума, отслеживаемого детектором (вызывается периодически)"""
+        self.config['noise_floor'] = noise_floor
+        self.save_config(quiet=True)
+    
+    def run_calibration(self, source=None, interactive=None):
+        """Запуск процесса калибровки
+        
+        source - источник аудио (AudioSource); по умолчанию выбранный микрофон.
+        interactive - задавать ли вопросы пользователю; по умолчанию только для живого микрофона.
+        """
         print(colored("\n=== Калибровка микрофона ===", "blue", attrs=['bold']))
         
+        if interactive is None:
+            interactive = source is None or source.is_live
+        
         detector = ClapDetector(
             sample_rate=self.config['sample_rate'],
             chunk_size=1024
         )
+        detector.source = source
         
-        # Выбор микрофона
+        if source is None or source.is_live:
+            if not self._select_microphone(detector):
+                return False
+            if self.config.get('auto_sample_rate', True):
+                detector.select_sample_rate(self.config.get('device_id'))
+            
+            # Калибровка порога
+            print(colored("\n🔊 Начало калибровки...", "yellow"))
+            print(colored("1. Уровень звука будет показываться в реальном времени", "blue"))
+            print(colored("2. Оставайтесь в тишине первые 2 секунды", "blue"))
+            print(colored("3. Затем сделайте 3 хлопка с паузами - калибровка завершится сама", "blue"))
+            if interactive:
+                print(colored("\nНажмите Enter для начала калибровки...", "green"))
+                input()
+        else:
+            print(colored("\n🔊 Калибровка по источнику без микрофона...", "yellow"))
+        
+        threshold = detector.calibrate_streaming(duration=15, show_levels=interactive)
+        self.config['threshold'] = threshold
+        self.config['reference_noise_floor'] = detector.reference_noise_floor
+        self.config['noise_floor'] = detector.noise_floor
+        
+        self._test_calibration(detector)
+        
+        if interactive:
+            self._ask_parameters()
+        
+        # Сохранение конфигурации
+        self.save_config()
+        
+        print(colored("\n✅ Калибровка успешно завершена!", "green", attrs=['bold']))
+        return True
+    
+    def _select_microphone(self, detector):
+        """Выбор и установка микрофона для калибровки"""
         devices = detector.find_best_microphone()
         if not devices:
             print(colored("✗ Микрофоны не найдены", "red"))
@@ -74,20 +123,10 @@ class CalibrationManager:
                 print(colored("\nКалибровка прервана", "yellow"))
                 return False
         
-        if not detector.set_microphone(device_id):
-            return False
-        
-        # Калибровка порога
-        print(colored("\n🔊 Начало калибровки...", "yellow"))
-        print(colored("1. Будет записано 5 секунд аудио", "blue"))
-        print(colored("2. Оставайтесь в тишине первые 2 секунды", "blue"))
-        print(colored("3. Сделайте 2-3 хлопка в последние 3 секунды", "blue"))
-        print(colored("\nНажмите Enter для начала калибровки...", "green"))
-        input()
-        
-        threshold = detector.calibrate_threshold(duration=5)
-        self.config['threshold'] = threshold
-        
+        return detector.set_microphone(device_id)
+    
+    def _test_calibration(self, detector):
+        """Проверка калибровки детекцией двойных хлопков"""
         # Тестирование калибровки
         print(colored("\n🎯 Тестирование калибровки...", "yellow"))
         print(colored("Сделайте двойной хлопок для проверки", "blue"))
@@ -106,7 +145,10 @@ class CalibrationManager:
             detector.stop_detection()
         
         print(colored(f"\n✓ Обнаружено {test_count} двойных хлопков", "green"))
-        
+        return test_count
+    
+    def _ask_parameters(self):
+        """Интерактивная настройка параметров двойного хлопка"""
         # Настройка параметров
         print(colored("\n=== Настройка параметров ===", "blue", attrs=['bold']))
         
@@ -127,12 +169,6 @@ class CalibrationManager:
                 self.config['double_clap_window'] = float(new_window)
         except ValueError:
             print(colored("Неверное значение, оставлено по умолчанию", "yellow"))
-        
-        # Сохранение конфигурации
-        self.save_config()
-        
-        print(colored("\n✅ Калибровка успешно завершена!", "green", attrs=['bold']))
-        return True
     
     def show_current_settings(self):
         """Показ текущих настроек"""
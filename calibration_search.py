@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from termcolor import colored
+
+from audio_dsp import OnsetDetector, read_wav, spectrum_limit
+from audio_sources import synthesize_claps
+from calibration import CalibrationManager
+from record_audio import ClapDetector
+
+# Сетка параметров по умолчанию (порог строится по уровням записей корпуса)
+DEFAULT_COOLDOWNS = (0.1, 0.2, 0.3, 0.5)
+DEFAULT_WINDOWS = (0.5, 0.75, 1.0, 1.5)
+DEFAULT_FREQ_MINS = (1000, 1500, 2000, 3000)
+DEFAULT_FREQ_MAXS = (6000, 8000, 10000)
+DEFAULT_BAND_RATIOS = (0.2, 0.25, 0.3, 0.35, 0.4)
+
+class RecordingFeatures:
+    """Признаки всех блоков записи, вычисленные за один векторизованный проход
+    
+    Уровень RMS, спектр и момент начала хлопка считаются один раз; доля спектра
+    в любом диапазоне частот затем получается разностью накопленных сумм.
+    """
+    def __init__(self, audio, sample_rate, chunk_size=1024, window=None, hop_size=128, rise_ratio=4.0):
+        audio = np.asarray(audio, dtype=np.float32)
+        if audio.ndim > 1:
+            audio = audio[:, 0]
+        self.sample_rate = sample_rate
+        self.chunk_size = chunk_size
+        
+        frame_count = len(audio) // chunk_size
+        frames = np.lib.stride_tricks.sliding_window_view(audio, chunk_size)[::chunk_size][:frame_count]
+        self.rms = np.sqrt(np.einsum('ij,ij->i', frames, frames) / chunk_size)
+        
+        # Модуль спектра всех блоков; веса - как в SpectralPlan (DC и Найквист учитываются один раз):
+        # сумма до любого бина - удвоенная накопленная сумма без DC и Найквиста
+        self.frequencies = np.fft.rfftfreq(chunk_size, 1 / sample_rate)
+        windowed = frames * getattr(np, window)(chunk_size) if window else frames
+        magnitude = np.abs(np.fft.rfft(windowed, axis=1))
+        self._dc = magnitude[:, 0].copy()
+        self._nyquist = magnitude[:, -1].copy() if chunk_size % 2 == 0 else np.zeros(frame_count)
+        self.cumulative = np.zeros((frame_count, len(self.frequencies) + 1), dtype=np.float32)
+        np.cumsum(magnitude, axis=1, out=self.cumulative[:, 1:])
+        
+        # Начало хлопка внутри каждого блока (как в ClapDetector.detect_offline)
+        onset = OnsetDetector(hop_size=hop_size, rise_ratio=rise_ratio)
+        hops = chunk_size // hop_size
+        starts = np.arange(frame_count) * chunk_size
+        if hops > 0 and frame_count:
+            hop_view = frames[:, :hops * hop_size].reshape(frame_count, hops, hop_size)
+            energies = np.einsum('ijk,ijk->ij', hop_view, hop_view) / hop_size
+            tails = frames[:, -hop_size:]
+            prev_energies = np.zeros(frame_count)
+            prev_energies[1:] = np.einsum('ij,ij->i', tails[:-1], tails[:-1]) / hop_size
+            self.clap_samples = starts + onset.locate_many(energies, prev_energies)
+        else:
+            self.clap_samples = starts
+    
+    def band_ratios(self, freq_min, freq_max):
+        """Доли спектра в диапазоне [freq_min, freq_max] для всех блоков (знаменатель - до spectrum_limit)"""
+        low = np.searchsorted(self.frequencies, freq_min, side='left')
+        high = np.searchsorted(self.frequencies, freq_max, side='right')
+        band_energy = self.cumulative[:, high] - self.cumulative[:, low]
+        
+        top = np.searchsorted(self.frequencies, spectrum_limit(freq_max), side='right')
+        total = 2 * self.cumulative[:, top] - self._dc
+        if top == len(self.frequencies):
+            total -= self._nyquist
+        
+        ratios = np.zeros(len(total))
+        np.divide(band_energy, total, out=ratios, where=total > 0)
+        return ratios
+
+def double_clap_times(clap_times, cooldown, window):
+    """Моменты двойных хлопков по моментам кандидатов (логика ClapDetector._register_clap)"""
+    doubles = []
+    last_clap_time = float('-inf')
+    clap_count = 0
+    for clap_time in clap_times:
+        time_since_last_clap = clap_time - last_clap_time
+        if time_since_last_clap <= cooldown:
+            continue
+        last_clap_time = clap_time
+        if clap_count == 1 and time_since_last_clap <= window:
+            clap_count = 0
+            doubles.append(clap_time)
+        else:
+            clap_count = 1
+    return doubles
+
+def match_events(predicted, expected, tolerance):
+    """Сопоставление событий с разметкой: (верные, ложные, пропущенные)"""
+    used = np.zeros(len(expected), dtype=bool)
+    true_positives = 0
+    for event_time in predicted:
+        if len(expected) == 0:
+            break
+        distances = np.abs(np.asarray(expected) - event_time)
+        distances[used] = np.inf
+        index = int(np.argmin(distances))
+        if distances[index] <= tolerance:
+            used[index] = True
+            true_positives += 1
+    return true_positives, len(predicted) - true_positives, len(expected) - true_positives
+
+def _search_detector(chunk_size, adaptive):
+    """Детектор, шаги адаптивного порога и гистерезиса которого используются при поиске"""
+    detector = ClapDetector(chunk_size=chunk_size)
+    detector.adaptive_threshold = adaptive
+    return detector
+
+def _evaluate_band(task):
+    """Оценка всех порогов и временных параметров для одного диапазона частот (в процессе пула)"""
+    freq_min, freq_max, recordings, threshold_traces, band_ratios, cooldowns, windows, tolerance, chunk_size, adaptive = task
+    detector = _search_detector(chunk_size, adaptive)
+    results = []
+    
+    for (threshold, traces), band_ratio in itertools.product(threshold_traces, band_ratios):
+        # Кандидаты каждой записи не зависят от временных параметров; решения - с тем же
+        # порогом по блокам и гистерезисом, что и у детектора в реальном времени
+        candidates = []
+        for (rms, ratios, clap_samples, sample_rate, expected), thresholds in zip(recordings, traces):
+            mask = detector.apply_hysteresis(rms, thresholds, (rms >= thresholds) & (ratios > band_ratio))
+            candidates.append((clap_samples[mask] / sample_rate, expected))
+        
+        for cooldown, window in itertools.product(cooldowns, windows):
+            if window <= cooldown:
+                continue
+            true_positives = false_positives = false_negatives = 0
+            for clap_times, expected in candidates:
+                tp, fp, fn = match_events(double_clap_times(clap_times, cooldown, window), expected, tolerance)
+                true_positives += tp
+                false_positives += fp
+                false_negatives += fn
+            
+            predicted = true_positives + false_positives
+            labelled = true_positives + false_negatives
+            precision = true_positives / predicted if predicted else 1.0
+            recall = true_positives / labelled if labelled else 1.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            results.append({
+                'threshold': float(threshold),
+                'clap_cooldown': cooldown,
+                'double_clap_window': window,
+                'clap_freq_min': freq_min,
+                'clap_freq_max': freq_max,
+                'fft_band_ratio': band_ratio,
+                'precision': precision,
+                'recall': recall,
+                'f1': f1,
+                'false_positives': false_positives,
+                'false_negatives': false_negatives
+            })
+    
+    return results
+
+def pareto_frontier(results):
+    """Недоминируемые по точности и полноте варианты (по убыванию полноты)"""
+    frontier = []
+    best_precision = -1.0
+    for result in sorted(results, key=lambda r: (-r['recall'], -r['precision'])):
+        if result['precision'] > best_precision:
+            frontier.append(result)
+            best_precision = result['precision']
+    return frontier
+
+def load_labels(wav_path):
+    """Разметка записи из файла рядом с WAV: {"double_claps": [секунды второго хлопка, ...]}
+    
+    Запись без файла разметки считается записью без двойных хлопков (только шум).
+    """
+    labels_path = os.path.splitext(wav_path)[0] + '.json'
+    if not os.path.exists(labels_path):
+        return []
+    with open(labels_path, 'r', encoding='utf-8') as f:
+        return [float(t) for t in json.load(f).get('double_claps', [])]
+
+def load_corpus(paths):
+    """Записи корпуса: список (имя, аудио, частота, моменты двойных хлопков)"""
+    wav_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            wav_paths.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith('.wav')))
+        else:
+            wav_paths.append(path)
+    
+    corpus = []
+    for wav_path in wav_paths:
+        audio, sample_rate = read_wav(wav_path)
+        corpus.append((wav_path, audio, sample_rate, load_labels(wav_path)))
+    return corpus
+
+def synthetic_corpus(count=8, duration=20, sample_rate=44100, seed=0):
+    """Синтетический размеченный корпус: двойные хлопки, одиночные хлопки-помехи и шум разного уровня"""
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for i in range(count):
+        clap_times = []
+        doubles = []
+        t = 1.0
+        while t < duration - 3:
+            if rng.random() < 0.7:
+                gap = rng.uniform(0.25, 0.6)
+                clap_times.extend([t, t + gap])
+                doubles.append(t + gap)
+            else:
+                clap_times.append(t)
+            t += rng.uniform(2.0, 3.5)
+        
+        noise_level = rng.uniform(0.005, 0.03)
+        clap_level = rng.uniform(0.3, 0.9)
+        audio = synthesize_claps(duration, sample_rate, clap_times, noise_level, clap_level, seed=seed + i)
+        corpus.append((f"synthetic-{i}", audio, sample_rate, doubles))
+    return corpus
+
+def search_parameters(corpus, chunk_size=1024, thresholds=None, cooldowns=DEFAULT_COOLDOWNS,
+                      windows=DEFAULT_WINDOWS, freq_mins=DEFAULT_FREQ_MINS, freq_maxs=DEFAULT_FREQ_MAXS,
+                      band_ratios=DEFAULT_BAND_RATIOS, tolerance=0.15, max_workers=None, adaptive=True):
+    """Поиск параметров детектора по сетке на размеченном корпусе
+    
+    adaptive - оценивать с адаптивным порогом и гистерезисом, как работает детектор по умолчанию.
+    Возвращает (все результаты, фронт точность/полнота, лучший вариант по F1).
+    """
+    # Блоки той же длительности, что и у детектора (chunk_size - на его частоте по умолчанию)
+    detector = _search_detector(chunk_size, adaptive)
+    start = time.perf_counter()
+    features = [(RecordingFeatures(audio, sample_rate, detector.block_size(sample_rate)), sample_rate, expected)
+                for _, audio, sample_rate, expected in corpus]
+    feature_time = time.perf_counter() - start
+    
+    if thresholds is None:
+        # Пороги - от двойного медианного уровня до пика записей (логарифмическая шкала)
+        all_rms = np.concatenate([f.rms for f, _, _ in features])
+        low = max(float(np.median(all_rms)) * 2, 1e-4)
+        high = max(float(all_rms.max()) * 0.9, low * 1.01)
+        thresholds = np.geomspace(low, high, 16)
+    
+    # Адаптивный порог по блокам зависит только от порога и уровней записи - считается один раз
+    threshold_traces = []
+    for threshold in thresholds:
+        detector.threshold = float(threshold)
+        threshold_traces.append((float(threshold), [detector.threshold_trace(f.rms, sample_rate) for f, sample_rate, _ in features]))
+    
+    # Задачи пула - по диапазону частот; передаются только векторы признаков блоков
+    tasks = []
+    for freq_min, freq_max in itertools.product(freq_mins, freq_maxs):
+        if freq_max <= freq_min:
+            continue
+        recordings = [
+            (f.rms, f.band_ratios(freq_min, freq_max), f.clap_samples, sample_rate, expected)
+            for f, sample_rate, expected in features
+        ]
+        tasks.append((freq_min, freq_max, recordings, threshold_traces, band_ratios, cooldowns, windows, tolerance,
+                      chunk_size, adaptive))
+    
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = [result for batch in executor.map(_evaluate_band, tasks) for result in batch]
+    search_time = time.perf_counter() - start - feature_time
+    
+    print(colored(
+        f"ℹ Признаки: {feature_time:.2f} с, поиск: {search_time:.2f} с, "
+        f"вариантов: {len(results)}", "blue"))
+    
+    frontier = pareto_frontier(results)
+    # Лучший по F1; при равенстве - меньше ложных срабатываний, затем выше порог
+    best = max(results, key=lambda r: (r['f1'], r['precision'], r['threshold']))
+    return results, frontier, best
+
+def print_frontier(frontier, limit=15):
+    """Вывод фронта точность/полнота"""
+    print(colored("\nФронт точность/полнота:", "cyan"))
+    for result in frontier[:limit]:
+        print(colored(
+            f"  точность {result['precision']:.3f}  полнота {result['recall']:.3f}  "
+            f"порог {result['threshold']:.4f}  пауза {result['clap_cooldown']}  "
+            f"окно {result['double_clap_window']}  доля {result['fft_band_ratio']}  "
+            f"{result['clap_freq_min']}-{result['clap_freq_max']} Гц", "white"))
+
+def apply_parameters(best, calibration_manager=None):
+    """Запись выбранных параметров в config.json"""
+    manager = calibration_manager or CalibrationManager()
+    for key in ('threshold', 'clap_cooldown', 'double_clap_window', 'clap_freq_min', 'clap_freq_max', 'fft_band_ratio'):
+        manager.config[key] = best[key]
+    
+    # Поиск оценивал порог без опорного уровня шума (опорным становится шум после первой
+    # секунды) - уровни прежней калибровки сдвигали бы новый порог иначе, чем при поиске
+    manager.config['reference_noise_floor'] = None
+    manager.config['noise_floor'] = None
+    manager.save_config()
+    return manager
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    save = "--save" in args
+    args = [arg for arg in args if arg != "--save"]
+    
+    if not args:
+        print(colored("Использование: python calibration_search.py [--save] (--synthetic | папка | файл.wav ...)", "yellow"))
+        print(colored("Разметка: файл.json рядом с файл.wav, {\"double_claps\": [2.4, 7.9]}", "yellow"))
+        sys.exit(1)
+    
+    print(colored("\n=== Подбор параметров детектора по корпусу ===", "blue", attrs=['bold']))
+    corpus = synthetic_corpus() if args == ["--synthetic"] else load_corpus(args)
+    total = sum(len(audio) / sample_rate for _, audio, sample_rate, _ in corpus)
+    print(colored(f"✓ Записей: {len(corpus)}, длительность: {total:.0f} с", "green"))
+    
+    results, frontier, best = search_parameters(corpus)
+    print_frontier(frontier)
+    
+    print(colored(
+        f"\n✓ Выбрано: порог {best['threshold']:.4f}, пауза {best['clap_cooldown']} с, "
+        f"окно {best['double_clap_window']} с, {best['clap_freq_min']}-{best['clap_freq_max']} Гц, "
+        f"доля спектра {best['fft_band_ratio']} "
+        f"(точность {best['precision']:.3f}, полнота {best['recall']:.3f})", "green"))
+    
+    if save:
+        apply_parameters(best)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from collections import deque
+
+from event_log import get_logger
+
+class CommandQueue:
+    """Очередь команд переключения с одним потребителем и схлопыванием
+    
+    Пока выполняется переключение, новые команды накапливаются. Затем чётное
+    число накопленных переключений взаимно уничтожается, нечётное превращается
+    в одно переключение. Команды старше max_age отбрасываются.
+    handler вызывается с трассой задержки выполняемой команды (ClapTrace или None).
+    """
+    def __init__(self, handler, max_age=5.0, tracer=None):
+        self.handler = handler
+        self.max_age = max_age
+        self.tracer = tracer  # LatencyTracer: учёт трасс невыполненных команд
+        
+        self._pending = deque()  # (время постановки в очередь, трасса) каждой команды
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+        self.in_flight = False
+        
+        # Статистика
+        self.submitted = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.dropped_stale = 0
+        self.failed = 0
+        self.last_wait = 0.0
+        self.max_wait = 0.0
+        self.total_wait = 0.0
+    
+    def start(self):
+        """Запуск потока-потребителя"""
+        if self._thread and self._thread.is_alive():
+            return
+        
+        self._running = True
+        self._thread = threading.Thread(target=self._consume_loop, name="command-queue", daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout=1):
+        """Остановка потока-потребителя"""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=timeout)
+    
+    def submit(self, trace=None):
+        """Постановка команды переключения в очередь (не блокируется на выполнении)"""
+        if trace is not None:
+            trace.mark("queued")
+        with self._condition:
+            self._pending.append((time.monotonic(), trace))
+            self.submitted += 1
+            self._condition.notify()
+    
+    @property
+    def depth(self):
+        """Число команд, ожидающих выполнения"""
+        return len(self._pending)
+    
+    def _consume_loop(self):
+        """Поток-потребитель: не более одного выполняемого переключения"""
+        while True:
+            with self._condition:
+                while self._running and not self._pending:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                
+                # Все накопленные команды забираются разом
+                batch = list(self._pending)
+                self._pending.clear()
+            
+            now = time.monotonic()
+            fresh = [command for command in batch if now - command[0] <= self.max_age]
+            stale = len(batch) - len(fresh)
+            if stale:
+                self.dropped_stale += stale
+                get_logger().warning(f"⚠ Отброшено устаревших команд: {stale}")
+            
+            # Выполняется первая свежая команда, остальные схлопываются
+            executed = fresh[0] if len(fresh) % 2 else None
+            self._discard_traces(command for command in batch if command is not executed)
+            if executed is None:
+                # Чётное число переключений - ничего не делать, нечётное - одно переключение
+                self.coalesced += len(fresh)
+                continue
+            self.coalesced += len(fresh) - 1
+            
+            queued_at, trace = executed
+            if trace is not None:
+                trace.mark("dequeued")
+            
+            wait = now - queued_at
+            self.last_wait = wait
+            self.max_wait = max(self.max_wait, wait)
+            self.total_wait += wait
+            
+            self.in_flight = True
+            try:
+                self.handler(trace)
+                self.executed += 1
+            except Exception as e:
+                self.failed += 1
+                get_logger().error(f"✗ Ошибка выполнения команды: {str(e)}")
+            finally:
+                self.in_flight = False
+    
+    def _discard_traces(self, commands):
+        """Учёт трасс схлопнутых и устаревших команд"""
+        if self.tracer is None:
+            return
+        for _, trace in commands:
+            if trace is not None:
+                self.tracer.discard(trace)
+    
+    def get_stats(self):
+        """Статистика очереди"""
+        executions = self.executed + self.failed
+        return {
+            'depth': self.depth,
+            'in_flight': self.in_flight,
+            'submitted': self.submitted,
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'dropped_stale': self.dropped_stale,
+            'failed': self.failed,
+            'last_wait_ms': self.last_wait * 1000,
+            'max_wait_ms': self.max_wait * 1000,
+            'avg_wait_ms': self.total_wait / executions * 1000 if executions else 0.0
+        }
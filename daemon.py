@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+
+_process_start = time.perf_counter()
+
+import os
+import sys
+import threading
+from termcolor import colored
+
+def run_daemon(config_file='config.json'):
+    """Мониторинг хлопков без меню: настройки из конфигурации и окружения, слушание - сразу
+    
+    Токен и лампы: YANDEX_TOKEN, YANDEX_DEVICE_IDS (через запятую) или ключи
+    yandex_token, lamp_device_ids конфигурации. Микрофон - device_id конфигурации
+    или устройство ввода по умолчанию. Клиент API создаётся в фоне, пока
+    открывается аудио-поток; хлопок до его готовности ждёт в очереди команд.
+    Код завершения: 0 - остановлен, 1 - микрофон не открылся, 2 - нет токена или ламп.
+    """
+    import_start = time.perf_counter()
+    from main import MISSING_CREDENTIALS, SmartLampController
+    import_time = time.perf_counter() - import_start
+    
+    controller = SmartLampController(config_file=config_file)
+    if not controller.has_credentials():
+        print(colored(MISSING_CREDENTIALS, "red"))
+        return 2
+    
+    controller._init_logging()
+    controller.command_queue.start()
+    if not controller._init_detector():
+        return 1
+    controller._start_metrics()
+    
+    # API (requests, проверка подключения) - параллельно с открытием микрофона
+    api_thread = threading.Thread(target=controller._init_api, name="api-init", daemon=True)
+    api_thread.start()
+    
+    def on_listening():
+        now = time.perf_counter()
+        controller.time_to_ready = now - controller.start_time
+        print(colored(
+            f"✅ Слушаю: импорт {import_time * 1000:.0f} мс, запуск {controller.time_to_ready * 1000:.0f} мс, "
+            f"всего от старта процесса {(now - _process_start) * 1000:.0f} мс", "green", attrs=['bold']))
+    
+    controller.on_listening = on_listening
+    # Микрофон не открылся - ненулевой код, чтобы systemd (Restart=on-failure) перезапустил демона
+    listened = controller.start_monitoring(require_microphone=False, interactive=False)
+    controller.exit_program(0 if listened else 1)
+
+# Режим демона: python daemon.py [файл конфигурации]
+if __name__ == "__main__":
+    sys.exit(run_daemon(sys.argv[1] if len(sys.argv) > 1 else os.environ.get("SMARTLAMP_CONFIG", "config.json")))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import threading
+import time
+from termcolor import colored
+
+class DeviceStateCache:
+    """Кэш состояний устройств (вкл/выкл) со временем жизни записей"""
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._states = {}  # device_id -> (значение, время обновления)
+        self._lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.drift_corrections = 0
+    
+    def get(self, device_id):
+        """Состояние из кэша или None, если записи нет или она устарела"""
+        with self._lock:
+            entry = self._states.get(device_id)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0]
+    
+    def set(self, device_id, value):
+        """Запись состояния (в т.ч. оптимистичная - до подтверждения API)"""
+        with self._lock:
+            self._states[device_id] = (value, time.monotonic())
+    
+    def update(self, states):
+        """Запись нескольких состояний, полученных от API"""
+        now = time.monotonic()
+        with self._lock:
+            for device_id, value in states.items():
+                self._states[device_id] = (value, now)
+    
+    def reconcile(self, states, since):
+        """Исправление расхождений по данным API, запрошенным в момент since
+        
+        Записи, изменённые после since (например, оптимистичным переключением),
+        не перезаписываются - ответ API для них может быть устаревшим.
+        """
+        corrected = 0
+        now = time.monotonic()
+        with self._lock:
+            for device_id, value in states.items():
+                entry = self._states.get(device_id)
+                if entry is not None and entry[1] > since:
+                    continue
+                if entry is not None and entry[0] != value:
+                    corrected += 1
+                self._states[device_id] = (value, now)
+            self.drift_corrections += corrected
+        return corrected
+    
+    def invalidate(self, device_id=None):
+        """Сброс записи устройства (или всего кэша)"""
+        with self._lock:
+            if device_id is None:
+                self._states.clear()
+            else:
+                self._states.pop(device_id, None)
+    
+    def get_stats(self):
+        """Статистика кэша"""
+        return {
+            'entries': len(self._states),
+            'hits': self.hits,
+            'misses': self.misses,
+            'drift_corrections': self.drift_corrections
+        }
+
+class DeviceMetadataCache:
+    """Кэш имён и возможностей устройств на диске (переживает перезапуски)"""
+    def __init__(self, cache_file='device_cache.json'):
+        self.cache_file = cache_file
+        self.devices = self.load()
+        self._lock = threading.Lock()
+    
+    def load(self):
+        """Загрузка кэша с диска"""
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(colored(f"⚠ Ошибка загрузки кэша устройств: {str(e)}", "yellow"))
+        return {}
+    
+    def save(self):
+        """Сохранение кэша на диск (через временный файл)"""
+        try:
+            with self._lock:
+                data = json.dumps(self.devices, indent=2, ensure_ascii=False)
+            tmp_file = self.cache_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            print(colored(f"⚠ Ошибка сохранения кэша устройств: {str(e)}", "yellow"))
+    
+    def get(self, device_id):
+        """Метаданные устройства или None"""
+        return self.devices.get(device_id)
+    
+    def has_capability(self, device_id, capability):
+        """Есть ли у устройства возможность по кэшу (None - устройство не в кэше)"""
+        metadata = self.devices.get(device_id)
+        if metadata is None:
+            return None
+        return capability in metadata.get('capabilities', [])
+    
+    def update(self, device_id, device_info):
+        """Обновление метаданных по ответу /devices/{id}"""
+        with self._lock:
+            self.devices[device_id] = {
+                'name': device_info.get("name", "Неизвестное устройство"),
+                'type': device_info.get("type"),
+                'capabilities': [cap.get("type") for cap in device_info.get("capabilities", [])],
+                'updated': time.time()
+            }
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import sys
+import threading
+import time
+from collections import deque
+from termcolor import colored
+
+class EventLogger:
+    """Неблокирующий журнал: горячий путь кладёт готовые записи в ограниченную очередь
+    
+    Запись - кортеж (время, уровень, сообщение, цвет, атрибуты, поля); вывод в консоль
+    (с цветом) и/или в файл JSON (по строке на запись) выполняет фоновый поток.
+    Если очередь заполнена, запись отбрасывается и учитывается в dropped -
+    вызывающий поток (audio callback, анализ, API) никогда не ждёт вывода.
+    До start() и после stop() записи только накапливаются в той же очереди.
+    """
+    def __init__(self, capacity=2048, console=True, json_file=None, flush_interval=0.05):
+        self.capacity = capacity
+        self.console = console
+        self.json_file = json_file
+        self.flush_interval = flush_interval
+        
+        self._records = deque()
+        self._thread = None
+        self._running = False
+        self._wake = threading.Event()  # Только для flush/stop, горячий путь его не трогает
+        self._json = None
+        
+        self.dropped = 0
+        self.written = 0
+    
+    def start(self):
+        """Запуск фонового потока вывода"""
+        if self._thread and self._thread.is_alive():
+            return self
+        if self.json_file:
+            self._json = open(self.json_file, 'a', encoding='utf-8')
+        self._running = True
+        self._thread = threading.Thread(target=self._writer_loop, name="event-log", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self, timeout=1.0):
+        """Вывод оставшихся записей и остановка потока"""
+        self._running = False
+        self._wake.set()
+        thread = self._thread
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=timeout)
+        if thread is None or not thread.is_alive():
+            # Поток вывода завершён или не запускался - остаток выводит вызывающий stop()
+            self._write_batch()
+        self._thread = None
+        if self._json:
+            self._json.close()
+            self._json = None
+    
+    def log(self, level, message, color=None, attrs=None, **fields):
+        """Запись в очередь без блокировки; False - запись отброшена"""
+        if len(self._records) >= self.capacity:
+            self.dropped += 1
+            return False
+        self._records.append((time.time(), level, message, color, attrs, fields))
+        return True
+    
+    def info(self, message, color="white", attrs=None, **fields):
+        return self.log("info", message, color, attrs, **fields)
+    
+    def warning(self, message, color="yellow", attrs=None, **fields):
+        return self.log("warning", message, color, attrs, **fields)
+    
+    def error(self, message, color="red", attrs=None, **fields):
+        return self.log("error", message, color, attrs, **fields)
+    
+    def flush(self, timeout=1.0):
+        """Ожидание вывода накопленных записей (вне горячего пути)"""
+        deadline = time.monotonic() + timeout
+        self._wake.set()
+        while self._records and self._thread is not None and time.monotonic() < deadline:
+            time.sleep(0.005)
+    
+    def _writer_loop(self):
+        while self._running:
+            if not self._records:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                continue
+            self._write_batch()
+        self._write_batch()
+    
+    def _write_batch(self):
+        """Вывод всех накопленных записей одним сбросом буферов"""
+        lines = []
+        json_lines = []
+        while self._records:
+            try:
+                timestamp, level, message, color, attrs, fields = self._records.popleft()
+            except IndexError:
+                break
+            if self.console:
+                lines.append(colored(message, color, attrs=attrs) if color else message)
+            if self._json:
+                # Поля события - отдельным объектом: не перекрывают time/level/message
+                record = {'time': round(timestamp, 6), 'level': level, 'message': message}
+                if fields:
+                    record['fields'] = fields
+                json_lines.append(json.dumps(record, ensure_ascii=False, default=str))
+            self.written += 1
+        
+        try:
+            if lines:
+                sys.stdout.write("\n".join(lines) + "\n")
+                sys.stdout.flush()
+            if json_lines:
+                self._json.write("\n".join(json_lines) + "\n")
+                self._json.flush()
+        except Exception:
+            pass
+    
+    def get_stats(self):
+        """Статистика журнала"""
+        return {
+            'pending': len(self._records),
+            'written': self.written,
+            'dropped': self.dropped
+        }
+
+_logger = None
+
+def get_logger():
+    """Общий журнал процесса (создаётся и запускается при первом обращении)"""
+    global _logger
+    if _logger is None:
+        _logger = EventLogger().start()
+    return _logger
+
+def configure_logging(console=True, json_file=None, capacity=2048):
+    """Замена общего журнала: вывод в консоль и/или в файл JSON"""
+    global _logger
+    previous = _logger
+    _logger = EventLogger(capacity=capacity, console=console, json_file=json_file).start()
+    if previous is not None:
+        previous.stop()
+        # Записи, попавшие в прежний журнал уже после его остановки, выводит новый
+        while previous._records and len(_logger._records) < _logger.capacity:
+            _logger._records.append(previous._records.popleft())
+        _logger.dropped += previous.dropped + len(previous._records)
+        _logger.written += previous.written
+    return _logger
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import math
+import threading
+import time
+from collections import deque
+from termcolor import colored
+
+# Этапы пути от хлопка до ответа лампы (время - по time.perf_counter())
+STAGES = ("adc", "detected", "confirmed", "queued", "dequeued", "sent", "response")
+
+# Интервалы между соседними этапами и полный путь
+SEGMENTS = tuple(zip(STAGES, STAGES[1:])) + (("adc", "response"),)
+
+SEGMENT_NAMES = {
+    ("adc", "detected"): "АЦП → решение детектора",
+    ("detected", "confirmed"): "решение → двойной хлопок",
+    ("confirmed", "queued"): "двойной хлопок → очередь",
+    ("queued", "dequeued"): "ожидание в очереди",
+    ("dequeued", "sent"): "подготовка запроса",
+    ("sent", "response"): "HTTP /devices/actions",
+    ("adc", "response"): "полный путь"
+}
+
+_local = threading.local()
+
+def current_trace():
+    """Трасса двойного хлопка, обрабатываемого в текущем потоке (или None)"""
+    return getattr(_local, "trace", None)
+
+def set_current_trace(trace):
+    """Привязка трассы к текущему потоку (None - отвязка)"""
+    _local.trace = trace
+
+class ClapTrace:
+    """Отметки времени одного двойного хлопка по этапам"""
+    def __init__(self):
+        self.stamps = {}
+        self.created = time.time()
+    
+    def mark(self, stage, timestamp=None):
+        """Отметка этапа (по умолчанию - текущий момент)"""
+        self.stamps[stage] = time.perf_counter() if timestamp is None else timestamp
+    
+    def mark_once(self, stage):
+        """Отметка этапа, если он ещё не отмечен (первая попытка запроса)"""
+        if stage not in self.stamps:
+            self.stamps[stage] = time.perf_counter()
+    
+    def durations(self):
+        """Длительности интервалов (сек) для отмеченных этапов"""
+        return {
+            segment: self.stamps[segment[1]] - self.stamps[segment[0]]
+            for segment in SEGMENTS
+            if segment[0] in self.stamps and segment[1] in self.stamps
+        }
+
+class LatencyHistogram:
+    """Гистограмма задержек фиксированного размера с логарифмическими корзинами
+    
+    Корзины от min_ms до max_ms, bins_per_decade на порядок; значения за
+    границами попадают в крайние корзины. Перцентили - с точностью до корзины.
+    """
+    def __init__(self, min_ms=0.01, max_ms=60000.0, bins_per_decade=20):
+        self.min_ms = min_ms
+        self.bins_per_decade = bins_per_decade
+        self.bins = int(math.ceil(math.log10(max_ms / min_ms) * bins_per_decade)) + 1
+        self.counts = [0] * self.bins
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_value_ms = 0.0
+        self.min_value_ms = None
+    
+    def _bin(self, ms):
+        if ms <= self.min_ms:
+            return 0
+        return min(int(math.log10(ms / self.min_ms) * self.bins_per_decade), self.bins - 1)
+    
+    def _upper_edge(self, index):
+        return self.min_ms * 10 ** ((index + 1) / self.bins_per_decade)
+    
+    def add(self, seconds):
+        """Добавление задержки (сек)"""
+        ms = max(seconds * 1000, 0.0)
+        self.counts[self._bin(ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_value_ms = max(self.max_value_ms, ms)
+        self.min_value_ms = ms if self.min_value_ms is None else min(self.min_value_ms, ms)
+    
+    def percentile(self, q):
+        """Перцентиль (мс, верхняя граница корзины, не больше максимума) или None"""
+        if not self.count:
+            return None
+        target = q / 100 * self.count
+        cumulative = 0
+        for index, bin_count in enumerate(self.counts):
+            cumulative += bin_count
+            if cumulative >= target and bin_count:
+                return min(self._upper_edge(index), self.max_value_ms)
+        return self.max_value_ms
+    
+    def to_dict(self):
+        """Сводка и непустые корзины (для JSON)"""
+        return {
+            'count': self.count,
+            'mean_ms': self.total_ms / self.count if self.count else None,
+            'min_ms': self.min_value_ms,
+            'max_ms': self.max_value_ms if self.count else None,
+            'p50_ms': self.percentile(50),
+            'p90_ms': self.percentile(90),
+            'p99_ms': self.percentile(99),
+            'buckets': [
+                {'le_ms': round(self._upper_edge(index), 4), 'count': bin_count}
+                for index, bin_count in enumerate(self.counts) if bin_count
+            ]
+        }
+
+class LatencyTracer:
+    """Сбор трасс двойных хлопков в гистограммы по этапам"""
+    def __init__(self, recent=20):
+        self.histograms = {segment: LatencyHistogram() for segment in SEGMENTS}
+        self.recent = deque(maxlen=recent)  # Последние трассы целиком
+        self.completed = 0
+        self.discarded = 0  # Трассы схлопнутых и устаревших команд
+        self._lock = threading.Lock()
+    
+    def finish(self, trace):
+        """Запись завершённой трассы"""
+        durations = trace.durations()
+        with self._lock:
+            for segment, seconds in durations.items():
+                self.histograms[segment].add(seconds)
+            self.recent.append({
+                'time': trace.created,
+                'stages_ms': {
+                    SEGMENT_NAMES[segment]: round(seconds * 1000, 3) for segment, seconds in durations.items()
+                }
+            })
+            self.completed += 1
+    
+    def discard(self, trace):
+        """Трасса команды, которая не была выполнена"""
+        with self._lock:
+            self.discarded += 1
+    
+    def get_stats(self):
+        """Гистограммы и последние трассы"""
+        with self._lock:
+            return {
+                'completed': self.completed,
+                'discarded': self.discarded,
+                'segments': {
+                    f"{start}->{end}": dict(self.histograms[(start, end)].to_dict(), name=SEGMENT_NAMES[(start, end)])
+                    for start, end in SEGMENTS
+                },
+                'recent': list(self.recent)
+            }
+    
+    def export_json(self, path='latency_stats.json'):
+        """Сохранение гистограмм в JSON"""
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.get_stats(), f, indent=2, ensure_ascii=False)
+            print(colored(f"✓ Статистика задержек сохранена в {path}", "green"))
+            return True
+        except Exception as e:
+            print(colored(f"✗ Ошибка сохранения статистики задержек: {str(e)}", "red"))
+            return False
+    
+    def print_report(self):
+        """Вывод перцентилей задержки по этапам"""
+        stats = self.get_stats()
+        if not stats['completed']:
+            print(colored("Задержка хлопок → лампа: нет данных", "white"))
+            return
+        
+        print(colored(f"Задержка хлопок → лампа ({stats['completed']} событий, мс):", "white"))
+        for segment in stats['segments'].values():
+            if not segment['count']:
+                continue
+            print(colored(
+                f"  {segment['name']:<26} p50 {segment['p50_ms']:8.1f}  p90 {segment['p90_ms']:8.1f}  "
+                f"p99 {segment['p99_ms']:8.1f}  макс. {segment['max_ms']:8.1f}", "white"))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import contextlib
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from termcolor import colored
+
+from event_log import configure_logging, get_logger
+from yandex_api import YandexSmartHomeAPI
+from mock_yandex_server import MockYandexServer, LatencyModel
+
+# Сценарии нагрузки: параметры MockYandexServer
+SCENARIOS = {
+    "baseline": {"latency": LatencyModel("fixed", mean=0.02)},
+    "jitter": {"latency": LatencyModel("lognormal", mean=0.03, spread=0.6, tail_probability=0.02, tail_latency=0.5, seed=1)},
+    "errors": {"latency": LatencyModel("uniform", mean=0.03, spread=0.01, seed=2), "error_rate": 0.1},
+    "rate_limit": {"latency": LatencyModel("fixed", mean=0.01), "rate_limit": 50, "burst": 10}
+}
+
+def run_load_test(scenario="baseline", toggles=200, concurrency=4, device_count=3, batched=False):
+    """Нагрузочный тест YandexSmartHomeAPI против локального тестового сервера
+    
+    batched=False - каждый запрос переключает одну лампу (toggle_device),
+    batched=True - каждый запрос переключает все лампы (toggle_all_devices).
+    Возвращает словарь с пропускной способностью и перцентилями задержки.
+    """
+    # Сообщения клиента о каждом переключении не выводятся: print - перенаправлением
+    # stdout, журнал событий (его поток пишет уже после перенаправления) - отключением консоли
+    previous = get_logger()
+    configure_logging(console=False, capacity=previous.capacity)
+    try:
+        with MockYandexServer(device_count=device_count, **SCENARIOS[scenario]) as server:
+            api = YandexSmartHomeAPI("mock-token", base_url=server.base_url, test_connection=False,
+                                     pool_size=max(4, concurrency))
+            device_ids = server.device_ids
+            
+            with contextlib.redirect_stdout(io.StringIO()):
+                api.add_devices(device_ids)
+                
+                def toggle(index):
+                    start = time.perf_counter()
+                    if batched:
+                        ok = api.toggle_all_devices()
+                    else:
+                        ok = api.toggle_device(device_ids[index % len(device_ids)])
+                    return time.perf_counter() - start, ok
+                
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                    results = list(executor.map(toggle, range(toggles)))
+                elapsed = time.perf_counter() - start
+            
+            api.close()
+            server_stats = server.get_stats()
+    finally:
+        configure_logging(console=previous.console, json_file=previous.json_file, capacity=previous.capacity)
+    
+    latencies = np.array([latency for latency, _ in results])
+    succeeded = sum(1 for _, ok in results if ok)
+    return {
+        'scenario': scenario,
+        'toggles': toggles,
+        'succeeded': succeeded,
+        'elapsed': elapsed,
+        'throughput': toggles / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)) * 1000,
+        'p99_ms': float(np.percentile(latencies, 99)) * 1000,
+        'max_ms': float(latencies.max()) * 1000,
+        'retries': api.retry_count,
+        'hedges': api.hedge_count,
+        'requests': api.request_count,
+        'server': server_stats
+    }
+
+def print_report(result):
+    """Вывод результатов одного сценария"""
+    color = "green" if result['succeeded'] == result['toggles'] else "yellow"
+    print(colored(f"\nСценарий: {result['scenario']}", "cyan"))
+    print(colored(
+        f"  Переключений: {result['succeeded']}/{result['toggles']} за {result['elapsed']:.2f} с "
+        f"({result['throughput']:.1f} в сек)", color))
+    print(colored(
+        f"  Задержка: p50 {result['p50_ms']:.1f} мс, p99 {result['p99_ms']:.1f} мс, "
+        f"макс. {result['max_ms']:.1f} мс", "white"))
+    print(colored(
+        f"  Клиент: запросов {result['requests']}, повторов {result['retries']}, "
+        f"дублирований {result['hedges']}", "white"))
+    server = result['server']
+    print(colored(
+        f"  Сервер: ошибок 500 {server['injected_errors']}, ответов 429 {server['rate_limited']}, "
+        f"действий {server['actions_applied']}", "white"))
+
+if __name__ == "__main__":
+    toggles = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    scenarios = sys.argv[3:] or list(SCENARIOS)
+    
+    print(colored(f"\n=== Нагрузочный тест API ({toggles} переключений, {concurrency} потоков) ===", "blue", attrs=['bold']))
+    for scenario in scenarios:
+        print_report(run_load_test(scenario, toggles=toggles, concurrency=concurrency))
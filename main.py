@@ -1,30 +1,61 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import functools
 import os
 import sys
+import threading
 import time
 import signal
 from termcolor import colored
 
-from yandex_api import YandexSmartHomeAPI
+# Клиент API (requests) импортируется в _init_api: демон начинает слушать, не дожидаясь его
+from command_queue import CommandQueue
+from event_log import configure_logging, get_logger
+from latency_trace import LatencyTracer, current_trace
+from metrics_server import Metric, MetricsServer
 from record_audio import ClapDetector
+from multi_stream import MultiStreamSupervisor
 from calibration import CalibrationManager
 
+MISSING_CREDENTIALS = "✗ Не заданы токен или лампы (YANDEX_TOKEN, YANDEX_DEVICE_IDS)"
+
+def load_credentials(config, token=None, device_ids=None):
+    """Токен и ID ламп: аргументы, затем окружение, затем конфигурация (yandex_token, lamp_device_ids)"""
+    env_device_ids = [device_id.strip() for device_id in os.environ.get("YANDEX_DEVICE_IDS", "").split(",")]
+    token = token or os.environ.get("YANDEX_TOKEN") or config.get('yandex_token')
+    device_ids = device_ids or [device_id for device_id in env_device_ids if device_id] or config.get('lamp_device_ids')
+    return token, list(device_ids or [])
+
 class SmartLampController:
-    def __init__(self):
-        self.api_token = "y0__xDLjqC3BhjMgj0gkub-jhYwq63BsggL8YblL10mlsjdh7nt0KStsUr2sg"
-        self.device_ids = [
-            "19a27edd-f48b-43d5-9a53-5d913cd9272b",
-            "72a33ab1-6a1d-4b98-a811-8a98bfeb873d", 
-            "95cf0e1e-8117-4248-a87a-f7d83a1c50b1"
-        ]
+    def __init__(self, token=None, device_ids=None, config_file='config.json'):
+        self.start_time = time.perf_counter()
+        self.calibration_manager = CalibrationManager(config_file)
+        self.api_token, self.device_ids = load_credentials(self.calibration_manager.config, token, device_ids)
         
         self.yandex_api = None
+        self.async_api = None
+        self.event_loop = None  # Цикл событий для действий по двойному хлопку (создаётся в _init_api)
+        self.api_ready = threading.Event()
+        self.latency_tracer = LatencyTracer()  # Задержки хлопок → лампа по этапам
+        self.command_queue = CommandQueue(self._toggle_lamps, tracer=self.latency_tracer)  # Не более одного переключения одновременно
         self.clap_detector = None
-        self.calibration_manager = CalibrationManager()
+        self.room_detectors = []  # Дополнительные микрофоны: [(имя, ClapDetector), ...]
+        self.supervisor = None
+        self.on_listening = None  # Вызывается, когда микрофоны начали слушать (режим демона)
         self.is_running = False
         
+        # Метрики запуска (сек от создания контроллера)
+        self.time_to_ready = None       # Детектор готов слушать хлопки
+        self.time_to_api_ready = None   # Фоновые проверки API и устройств завершены
+        self.api_connected = False
+        self.connect_future = None
+        
+        # Результаты переключений и сервер метрик (включается ключом metrics_port в конфигурации)
+        self.toggles_succeeded = 0
+        self.toggles_failed = 0
+        self.metrics_server = None
+        
         # Обработка сигналов для корректного выхода
         signal.signal(signal.SIGINT, self._signal_handler)
         signal.signal(signal.SIGTERM, self._signal_handler)
@@ -37,48 +68,233 @@ class SmartLampController:
     def initialize(self):
         """Инициализация компонентов"""
         print(colored("=== Инициализация системы управления умными лампами ===\n", "blue", attrs=['bold']))
+        if not self.has_credentials():
+            print(colored(MISSING_CREDENTIALS, "red"))
+            return False
+        self._init_logging()
+        self.command_queue.start()
+        
+        if not self._init_api() or not self._init_detector():
+            return False
+        self._start_metrics()
         
-        # Инициализация API Яндекс.Дом
+        self.time_to_ready = time.perf_counter() - self.start_time
+        print(colored(f"✅ Система успешно инициализирована за {self.time_to_ready * 1000:.0f} мс!\n", "green", attrs=['bold']))
+        return True
+    
+    def _data_path(self, name):
+        """Путь к служебному файлу рядом с файлом конфигурации (не в текущем каталоге)"""
+        return os.path.join(os.path.dirname(os.path.abspath(self.calibration_manager.config_file)), name)
+    
+    def has_credentials(self):
+        """Заданы ли токен API и хотя бы одна лампа"""
+        return bool(self.api_token and self.device_ids)
+    
+    def _init_logging(self):
+        """Сообщения горячего пути (хлопки, переключения) - через неблокирующий журнал"""
+        config = self.calibration_manager.config
+        configure_logging(console=config.get('log_console', True), json_file=config.get('log_file'))
+    
+    def _init_api(self):
+        """Инициализация API Яндекс.Дом: проверки подключения и устройств идут в фоне"""
         try:
-            self.yandex_api = YandexSmartHomeAPI(self.api_token)
-            self.yandex_api.add_devices(self.device_ids)
+            from yandex_api import YandexSmartHomeAPI
+            from async_yandex_api import AsyncYandexSmartHomeAPI, EventLoopThread
+            from device_cache import DeviceMetadataCache
+            
+            metadata_cache = DeviceMetadataCache(self._data_path('device_cache.json'))
+            self.yandex_api = YandexSmartHomeAPI(self.api_token, test_connection=False, metadata_cache=metadata_cache)
+            self.yandex_api.device_ids = self.device_ids
+            self.async_api = AsyncYandexSmartHomeAPI(self.yandex_api)
+            self.event_loop = EventLoopThread()
+            self.event_loop.start()
+            self.api_ready.set()
+            
+            cached = [device_id for device_id in self.device_ids if metadata_cache.get(device_id)]
+            for device_id in cached:
+                print(colored(f"  • {self.yandex_api.get_device_name(device_id)} ({device_id[:8]}...) - из кэша", "white"))
+            print(colored(f"ℹ Проверка подключения к API в фоне ({len(cached)}/{len(self.device_ids)} устройств в кэше)", "blue"))
+            
+            self.connect_future = self.event_loop.submit(self.async_api.connect(self.device_ids))
+            self.connect_future.add_done_callback(self._on_api_connected)
             print()
+            return True
         except Exception as e:
             print(colored(f"✗ Ошибка инициализации API: {str(e)}", "red"))
             return False
-        
-        # Инициализация детектора хлопков
+    
+    def _init_detector(self):
+        """Инициализация детекторов хлопков (основного и микрофонов других комнат)"""
         try:
             config = self.calibration_manager.config
-            self.clap_detector = ClapDetector(
-                sample_rate=config.get('sample_rate', 44100),
-                chunk_size=1024
-            )
-            self.clap_detector.threshold = config.get('threshold', 0.3)
-            self.clap_detector.clap_cooldown = config.get('clap_cooldown', 0.5)
-            self.clap_detector.double_clap_window = config.get('double_clap_window', 1.0)
-            
-            device_id = config.get('device_id')
-            if device_id is not None:
-                self.clap_detector.set_microphone(device_id)
-            else:
+            self.clap_detector = self._create_detector(config)
+            self.clap_detector.on_noise_floor_update = self.calibration_manager.save_noise_floor
+            if config.get('device_id') is None:
                 print(colored("⚠ Микрофон не настроен. Требуется калибровка.", "yellow"))
+            
+            # Микрофоны других комнат: [{"device_id": 3, "name": "Кухня", "threshold": 0.2}, ...]
+            # Не заданные для комнаты настройки берутся из общей конфигурации
+            for room in config.get('microphones', []):
+                settings = dict(config, noise_floor=None, reference_noise_floor=None)
+                settings.update(room)
+                detector = self._create_detector(settings)
+                detector.on_noise_floor_update = functools.partial(self._save_room_noise_floor, room)
+                self.room_detectors.append((room.get('name') or f"mic-{room['device_id']}", detector))
+            return True
         except Exception as e:
             print(colored(f"✗ Ошибка инициализации детектора хлопков: {str(e)}", "red"))
             return False
+    
+    def _start_metrics(self):
+        """Сервер метрик, если в конфигурации задан metrics_port"""
+        metrics_port = self.calibration_manager.config.get('metrics_port')
+        if metrics_port is not None:
+            try:
+                host = self.calibration_manager.config.get('metrics_host', "127.0.0.1")
+                self.metrics_server = MetricsServer(self.collect_metrics, host=host, port=metrics_port).start()
+            except Exception as e:
+                print(colored(f"⚠ Не удалось запустить сервер метрик: {str(e)}", "yellow"))
+    
+    def _create_detector(self, settings):
+        """Детектор хлопков с настройками из конфигурации (общей или отдельной комнаты)"""
+        detector = ClapDetector(
+            sample_rate=settings.get('sample_rate', 44100),
+            chunk_size=1024
+        )
+        detector.threshold = settings.get('threshold', 0.3)
+        detector.clap_cooldown = settings.get('clap_cooldown', 0.5)
+        detector.double_clap_window = settings.get('double_clap_window', 1.0)
+        detector.clap_freq_min = settings.get('clap_freq_min', detector.clap_freq_min)
+        detector.clap_freq_max = settings.get('clap_freq_max', detector.clap_freq_max)
+        detector.fft_band_ratio = settings.get('fft_band_ratio', detector.fft_band_ratio)
         
-        print(colored("✅ Система успешно инициализирована!\n", "green", attrs=['bold']))
-        return True
+        # Адаптивный порог продолжает с сохранённого уровня шума
+        detector.adaptive_threshold = settings.get('adaptive_threshold', True)
+        detector.noise_floor = settings.get('noise_floor')
+        detector.reference_noise_floor = settings.get('reference_noise_floor')
+        
+        detector.profile_every = settings.get('profile_every', 0)
+        detector.multichannel = settings.get('multichannel', False)
+        detector.channel_fusion = settings.get('channel_fusion', "max")
+        
+        device_id = settings.get('device_id')
+        if device_id is not None:
+            detector.set_microphone(device_id)
+            if settings.get('auto_sample_rate', True):
+                detector.allow_decimation = settings.get('allow_decimation', False)
+                detector.select_sample_rate(device_id)
+        return detector
+    
+    def _save_room_noise_floor(self, room, noise_floor):
+        """Сохранение уровня шума микрофона комнаты"""
+        room['noise_floor'] = noise_floor
+        self.calibration_manager.save_config(quiet=True)
+    
+    def _on_api_connected(self, future):
+        """Завершение фоновой проверки API (вызывается в потоке цикла событий)"""
+        self.time_to_api_ready = time.perf_counter() - self.start_time
+        try:
+            self.api_connected, available = future.result()
+        except Exception as e:
+            print(colored(f"✗ Ошибка фоновой проверки API: {str(e)}", "red"))
+            return
+        
+        color = "green" if self.api_connected and available == len(self.device_ids) else "yellow"
+        print(colored(
+            f"ℹ API проверен за {self.time_to_api_ready:.2f} с: "
+            f"доступно {available}/{len(self.device_ids)} устройств", color))
+    
+    def collect_metrics(self):
+        """Метрики для /metrics (собираются при запросе из уже существующих счётчиков)"""
+        claps = Metric("smartlamp_claps_total", "counter", "Обнаружено хлопков")
+        double_claps = Metric("smartlamp_double_claps_total", "counter", "Обнаружено двойных хлопков")
+        overruns = Metric("smartlamp_callback_overruns_total", "counter", "Audio callback дольше бюджета блока")
+        xruns = Metric("smartlamp_audio_status_flags_total", "counter", "Флаги статуса аудио-потока по типам")
+        dropped = Metric("smartlamp_dropped_chunks_total", "counter", "Блоков, потерянных при переполнении буфера")
+        threshold = Metric("smartlamp_threshold", "gauge", "Действующий порог хлопка (RMS)")
+        noise_floor = Metric("smartlamp_noise_floor", "gauge", "Текущий уровень шума (RMS)")
+        
+        detectors = [("main", self.clap_detector)] if self.clap_detector else []
+        for stream, detector in detectors + self.room_detectors:
+            claps.add(detector.claps_detected, stream=stream)
+            double_claps.add(detector.double_claps_detected, stream=stream)
+            threshold.add(detector.active_threshold, stream=stream)
+            noise_floor.add(detector.noise_floor, stream=stream)
+            if detector.profiler is not None:
+                overruns.add(detector.profiler.overruns, stream=stream)
+                for flag, count in detector.profiler.status_counts.items():
+                    xruns.add(count, stream=stream, flag=flag)
+            if detector._ring is not None:
+                dropped.add(detector._ring.dropped, stream=stream)
+        
+        toggles = Metric("smartlamp_toggles_total", "counter", "Переключений ламп по результату")
+        toggles.add(self.toggles_succeeded, result="success").add(self.toggles_failed, result="failure")
+        queue_stats = self.command_queue.get_stats()
+        metrics = [
+            claps, double_claps, toggles, overruns, xruns, dropped, threshold, noise_floor,
+            Metric("smartlamp_command_queue_depth", "gauge", "Команд в очереди").add(queue_stats['depth']),
+            Metric("smartlamp_commands_coalesced_total", "counter", "Схлопнутых команд").add(queue_stats['coalesced']),
+            Metric("smartlamp_log_dropped_total", "counter", "Записей журнала, отброшенных при переполнении").add(
+                get_logger().dropped),
+            Metric("smartlamp_monitoring", "gauge", "Мониторинг хлопков запущен").add(int(self.is_running)),
+            Metric("smartlamp_api_connected", "gauge", "Подключение к API Яндекс.Дом").add(int(self.api_connected))
+        ]
+        
+        if self.yandex_api:
+            api_latency = Metric("smartlamp_api_latency_seconds", "summary", "Перцентили задержки запросов API")
+            for endpoint, stats in self.yandex_api.latency.snapshot().items():
+                for quantile in ("p50", "p95", "p99"):
+                    api_latency.add(stats[quantile], endpoint=endpoint, quantile=f"0.{quantile[1:]}")
+            connection_stats = self.yandex_api.get_connection_stats()
+            cache_stats = self.yandex_api.state_cache.get_stats()
+            cache_lookups = Metric("smartlamp_state_cache_lookups_total", "counter", "Обращений к кэшу состояний")
+            cache_lookups.add(cache_stats['hits'], result="hit").add(cache_stats['misses'], result="miss")
+            metrics += [
+                api_latency,
+                Metric("smartlamp_api_requests_total", "counter", "HTTP-запросов к API").add(self.yandex_api.request_count),
+                Metric("smartlamp_api_retries_total", "counter", "Повторов запросов").add(self.yandex_api.retry_count),
+                Metric("smartlamp_api_hedged_total", "counter", "Дублированных запросов").add(self.yandex_api.hedge_count),
+                Metric("smartlamp_api_circuit_open", "gauge", "Выключатель API разомкнут").add(
+                    int(self.yandex_api.circuit_breaker.state != "closed")),
+                Metric("smartlamp_api_connections_total", "counter", "Новых соединений в пуле").add(
+                    connection_stats['new_connections']),
+                Metric("smartlamp_api_reused_requests_total", "counter", "Запросов по уже открытым соединениям").add(
+                    connection_stats['reused_requests']),
+                cache_lookups,
+                Metric("smartlamp_state_cache_corrections_total", "counter", "Состояний, исправленных сверкой").add(
+                    cache_stats['drift_corrections'])
+            ]
+        return metrics
     
     def on_double_clap(self):
         """Обработчик двойного хлопка"""
         timestamp = time.strftime("%H:%M:%S")
-        print(colored(f"🎉 [{timestamp}] Двойной хлопок обнаружен! Переключение ламп...", "green", attrs=['bold']))
+        get_logger().info(f"🎉 [{timestamp}] Двойной хлопок обнаружен! Переключение ламп...", "green", attrs=['bold'],
+                          event="toggle_requested")
         
+        # Команда ставится в очередь; повторные хлопки во время переключения схлопываются
+        self.command_queue.submit(current_trace())
+    
+    def _toggle_lamps(self, trace=None):
+        """Переключение ламп (выполняется потоком очереди команд)"""
+        # Хлопок мог прозвучать до окончания фоновой инициализации API (режим демона)
+        if not self.api_ready.wait(timeout=self.command_queue.max_age):
+            self.toggles_failed += 1
+            raise RuntimeError("API Яндекс.Дом не инициализирован")
         try:
-            self.yandex_api.toggle_all_devices()
-        except Exception as e:
-            print(colored(f"✗ Ошибка переключения ламп: {str(e)}", "red"))
+            if self.event_loop.submit(self.async_api.toggle_all_devices(trace=trace)).result():
+                self.toggles_succeeded += 1
+            else:
+                self.toggles_failed += 1
+        except Exception:
+            self.toggles_failed += 1
+            raise
+        finally:
+            if trace is not None:
+                if "response" in trace.stamps:
+                    self.latency_tracer.finish(trace)
+                else:
+                    self.latency_tracer.discard(trace)
     
     def show_menu(self):
         """Отображение главного меню"""
@@ -115,6 +331,8 @@ class SmartLampController:
             elif choice.isdigit() and 1 <= int(choice) <= len(devices):
                 device_id = devices[int(choice) - 1]['id']
                 if self.clap_detector.set_microphone(device_id):
+                    if self.calibration_manager.config.get('auto_sample_rate', True):
+                        self.clap_detector.select_sample_rate(device_id)
                     self.calibration_manager.config['device_id'] = device_id
                     self.calibration_manager.save_config()
                     print(colored("✓ Микрофон успешно выбран и сохранен", "green"))
@@ -123,35 +341,59 @@ class SmartLampController:
         except KeyboardInterrupt:
             print(colored("\nОтмена выбора микрофона", "yellow"))
     
-    def start_monitoring(self):
-        """Запуск мониторинга хлопков"""
-        if self.calibration_manager.config.get('device_id') is None:
+    def start_monitoring(self, require_microphone=True, interactive=True):
+        """Запуск мониторинга хлопков (без настроенного микрофона - только при require_microphone=False)
+        
+        Возвращает False, если микрофон не удалось открыть или мониторинг прервала ошибка.
+        interactive - мониторинг запущен из меню (иначе - режим демона).
+        """
+        if require_microphone and self.calibration_manager.config.get('device_id') is None:
             print(colored("⚠ Микрофон не выбран. Пожалуйста, выберите микрофон (пункт 3) или пройдите калибровку (пункт 2).", "yellow"))
-            return
+            return False
         
         print(colored("\n=== Мониторинг хлопков ===", "blue", attrs=['bold']))
         print(colored("🎤 Ожидание двойного хлопка...", "green"))
-        print(colored("Нажмите Ctrl+C для возврата в меню\n", "yellow"))
+        if interactive:
+            print(colored("Нажмите Ctrl+C для возврата в меню\n", "yellow"))
+        else:
+            print(colored("Нажмите Ctrl+C для остановки\n", "yellow"))
         
         try:
             self.is_running = True
+            if self.room_detectors:
+                # Все микрофоны дома - в одном процессе с общим пулом анализа
+                self.supervisor = MultiStreamSupervisor(workers=min(len(self.room_detectors) + 1, os.cpu_count() or 1))
+                self.supervisor.add_stream(self.clap_detector, name="main")
+                for name, detector in self.room_detectors:
+                    self.supervisor.add_stream(detector, name=name)
+                self.supervisor.on_listening = self.on_listening
+                self.supervisor.run(lambda name: self.on_double_clap())
+                return True
             self.clap_detector.on_double_clap = self.on_double_clap
-            self.clap_detector.start_detection()
+            self.clap_detector.on_listening = self.on_listening
+            return self.clap_detector.start_detection()
         except KeyboardInterrupt:
             print(colored("\n⏹ Мониторинг остановлен", "yellow"))
-            self.is_running = False
+            return True
         except Exception as e:
             print(colored(f"✗ Ошибка мониторинга: {str(e)}", "red"))
+            return False
+        finally:
             self.is_running = False
     
     def test_lamps(self):
         """Тестирование подключения к лампам"""
         print(colored("\n=== Тестирование ламп ===", "blue", attrs=['bold']))
         try:
+            # Состояния из кэша API; при промахе - один запрос для всех ламп
+            states = self.yandex_api.get_cached_states() or {}
             for device_id in self.device_ids:
-                state = self.yandex_api.get_device_state(device_id)
+                if device_id not in states:
+                    print(colored(f"  • {self.yandex_api.get_device_name(device_id)}: НЕДОСТУПНО", "yellow"))
+                    continue
+                state = states[device_id]
                 status = colored("ВКЛЮЧЕНА", "green") if state else colored("ВЫКЛЮЧЕНА", "red")
-                print(colored(f"  • Устройство {device_id[:8]}...: {status}", "white"))
+                print(colored(f"  • {self.yandex_api.get_device_name(device_id)}: {status}", "white"))
         except Exception as e:
             print(colored(f"✗ Ошибка тестирования: {str(e)}", "red"))
     
@@ -209,22 +451,92 @@ class SmartLampController:
         """Отображение информации о системе"""
         print(colored("\n=== Информация о системе ===", "blue", attrs=['bold']))
         print(colored(f"Python версия: {sys.version}", "white"))
-        print(colored(f"API Яндекс.Дом: {'Подключен' if self.yandex_api else 'Не подключен'}", "green" if self.yandex_api else "red"))
+        print(colored(f"API Яндекс.Дом: {'Подключен' if self.api_connected else 'Не подключен'}", "green" if self.api_connected else "red"))
         print(colored(f"Количество ламп: {len(self.device_ids)}", "white"))
         print(colored(f"Мониторинг: {'Активен' if self.is_running else 'Неактивен'}", "cyan" if self.is_running else "white"))
         
         if self.clap_detector:
             print(colored(f"Частота дискретизации: {self.clap_detector.sample_rate} Гц", "white"))
             print(colored(f"Размер блока: {self.clap_detector.chunk_size} samples", "white"))
+            if self.room_detectors:
+                print(colored(f"Микрофонов: {len(self.room_detectors) + 1}", "white"))
+                if self.supervisor:
+                    self.supervisor.print_stats()
+            if self.clap_detector.noise_floor is not None:
+                print(colored(
+                    f"Уровень шума: {self.clap_detector.noise_floor:.4f}, "
+                    f"действующий порог: {self.clap_detector.active_threshold:.4f}", "white"))
+            if self.clap_detector.profiler is not None:
+                self.clap_detector.profiler.print_report()
+        
+        if self.time_to_ready is not None:
+            print(colored(f"Время до готовности: {self.time_to_ready * 1000:.0f} мс", "white"))
+        api_ready = f"{self.time_to_api_ready:.2f} с" if self.time_to_api_ready is not None else "проверка выполняется"
+        print(colored(f"Время проверки API: {api_ready}", "white"))
+        
+        self.latency_tracer.print_report()
+        
+        if self.yandex_api:
+            self.print_api_stats()
+        
+        log_stats = get_logger().get_stats()
+        print(colored(
+            f"Журнал: выведено {log_stats['written']}, отброшено {log_stats['dropped']}",
+            "yellow" if log_stats['dropped'] else "white"))
+        
+        queue_stats = self.command_queue.get_stats()
+        print(colored(
+            f"Очередь команд: в очереди {queue_stats['depth']}, выполнено {queue_stats['executed']}, "
+            f"схлопнуто {queue_stats['coalesced']}, устарело {queue_stats['dropped_stale']}, "
+            f"ожидание макс. {queue_stats['max_wait_ms']:.0f} мс", "white"))
+    
+    def print_api_stats(self):
+        """Задержки API, переиспользование соединений и кэш состояний"""
+        latency_stats = self.yandex_api.get_latency_stats()
+        for endpoint, stats in latency_stats['endpoints'].items():
+            if stats['count']:
+                print(colored(
+                    f"API {endpoint}: p50 {stats['p50'] * 1000:.0f} мс, p95 {stats['p95'] * 1000:.0f} мс, "
+                    f"p99 {stats['p99'] * 1000:.0f} мс, запросов в окне: {stats['count']}", "white"))
+        print(colored(
+            f"Выключатель API: {latency_stats['circuit_state']}, отклонено {latency_stats['circuit_rejected']}, "
+            f"повторов {latency_stats['retries']}, дублировано {latency_stats['hedged']}",
+            "white" if latency_stats['circuit_state'] == "closed" else "yellow"))
+        
+        connection_stats = self.yandex_api.get_connection_stats()
+        print(colored(
+            f"Соединения API: новых {connection_stats['new_connections']}, "
+            f"переиспользовано {connection_stats['reused_requests']} ({connection_stats['reuse_ratio']:.0%}), "
+            f"прогревов {connection_stats['warmups']}", "white"))
+        
+        cache_stats = self.yandex_api.state_cache.get_stats()
+        print(colored(
+            f"Кэш состояний: записей {cache_stats['entries']}, попаданий {cache_stats['hits']}, "
+            f"промахов {cache_stats['misses']}, исправлено сверкой {cache_stats['drift_corrections']}", "white"))
     
-    def exit_program(self):
-        """Выход из программы"""
+    def exit_program(self, status=0):
+        """Выход из программы (status - код завершения процесса)"""
         print(colored("\n🚪 Выход из программы...", "yellow"))
         if self.is_running:
             self.is_running = False
+            if self.supervisor:
+                self.supervisor.is_running = False
             if self.clap_detector:
                 self.clap_detector.stop_detection()
-        sys.exit(0)
+        self.command_queue.stop()
+        if self.event_loop:
+            self.event_loop.stop()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if self.latency_tracer.completed:
+            self.latency_tracer.export_json(self._data_path('latency_stats.json'))
+        if self.async_api:
+            self.async_api.close()
+        if self.yandex_api:
+            self.yandex_api.close()
+        # Журнал - последним: потоки анализа, API и очереди команд могли ещё писать в него
+        get_logger().stop()
+        sys.exit(status)
     
     def run(self):
         """Запуск главного цикла программы"""
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from termcolor import colored
+
+class Metric:
+    """Одна метрика Prometheus: имя, тип (counter/gauge/summary), описание и значения по меткам"""
+    def __init__(self, name, kind, help_text):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.samples = []  # [(словарь меток, значение), ...]
+    
+    def add(self, value, **labels):
+        if value is not None:
+            self.samples.append((labels, value))
+        return self
+
+def _format_value(value):
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value) if not value.is_integer() else str(int(value))
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def render_metrics(metrics):
+    """Текстовый формат Prometheus (exposition format 0.0.4)"""
+    lines = []
+    for metric in metrics:
+        if not metric.samples:
+            continue
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for labels, value in metric.samples:
+            label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            name = f"{metric.name}{{{label_text}}}" if label_text else metric.name
+            lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+class MetricsServer:
+    """HTTP-сервер метрик (/metrics) на стандартной библиотеке
+    
+    Модель pull: значения собираются функцией collect() только при запросе,
+    поэтому аудио- и API-потоки лишь увеличивают обычные счётчики - без
+    блокировок и выделения памяти на горячем пути.
+    """
+    def __init__(self, collect, host="127.0.0.1", port=9108):
+        self.collect = collect  # Функция без аргументов, возвращающая список Metric
+        self.host = host
+        self.port = port
+        self.scrapes = 0
+        self._server = None
+        self._thread = None
+    
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/metrics"
+    
+    def start(self):
+        """Запуск сервера в фоновом потоке"""
+        handler = type("MetricsHandler", (_MetricsHandler,), {"metrics_server": self})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+        print(colored(f"✓ Метрики доступны: {self.url}", "green"))
+        return self
+    
+    def stop(self):
+        """Остановка сервера"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+    
+    def render(self):
+        """Текущие метрики в текстовом формате"""
+        self.scrapes += 1
+        metrics = self.collect()
+        metrics.append(Metric("smartlamp_metrics_scrapes_total", "counter", "Запросов /metrics").add(self.scrapes))
+        return render_metrics(metrics)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Обработчик /metrics (атрибут metrics_server задаётся при запуске)"""
+    metrics_server = None
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        
+        try:
+            body = self.metrics_server.render().encode("utf-8")
+            status = 200
+        except Exception as e:
+            body = f"# ошибка сбора метрик: {str(e)}\n".encode("utf-8")
+            status = 500
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
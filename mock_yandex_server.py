@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from termcolor import colored
+
+class LatencyModel:
+    """Распределение задержки ответа сервера
+    
+    kind: "fixed" - всегда mean; "uniform" - mean ± spread; "normal" - нормальное
+    со стандартным отклонением spread; "lognormal" - медиана mean, sigma = spread.
+    С вероятностью tail_probability к задержке добавляется tail_latency (редкие выбросы).
+    """
+    def __init__(self, kind="fixed", mean=0.05, spread=0.0, tail_probability=0.0, tail_latency=0.0, seed=None):
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Неизвестное распределение задержки: {kind}")
+        self.kind = kind
+        self.mean = mean
+        self.spread = spread
+        self.tail_probability = tail_probability
+        self.tail_latency = tail_latency
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+    
+    def sample(self):
+        """Случайная задержка (сек)"""
+        with self._lock:
+            if self.kind == "uniform":
+                delay = self._random.uniform(self.mean - self.spread, self.mean + self.spread)
+            elif self.kind == "normal":
+                delay = self._random.gauss(self.mean, self.spread)
+            elif self.kind == "lognormal":
+                delay = self.mean * self._random.lognormvariate(0, self.spread)
+            else:
+                delay = self.mean
+            
+            if self.tail_probability and self._random.random() < self.tail_probability:
+                delay += self.tail_latency
+        return max(delay, 0.0)
+
+class RateLimiter:
+    """Ограничение частоты запросов (маркерная корзина): rate запросов/сек, запас burst"""
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        """Можно ли обработать очередной запрос"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+class MockYandexServer:
+    """Локальный сервер, имитирующий API Яндекс.Дом (/user/info, /devices/{id}, /devices/actions)
+    
+    Состояние ламп хранится в памяти. Задержки задаются LatencyModel (общей или по
+    конечным точкам), error_rate - доля ответов 500, rate_limit - запросов/сек
+    до ответа 429. Используется вместо облака в нагрузочных тестах (load_test.py).
+    """
+    def __init__(self, device_ids=None, device_count=3, host="127.0.0.1", port=0,
+                 latency=None, error_rate=0.0, rate_limit=None, burst=None, token=None, seed=0):
+        if device_ids is None:
+            device_ids = [f"mock-lamp-{i:04d}-0000-0000-000000000000" for i in range(device_count)]
+        self.devices = {
+            device_id: {
+                "id": device_id,
+                "name": f"Лампа {i + 1}",
+                "type": "devices.types.light",
+                "capabilities": [{
+                    "type": "devices.capabilities.on_off",
+                    "retrievable": True,
+                    "state": {"instance": "on", "value": False}
+                }]
+            }
+            for i, device_id in enumerate(device_ids)
+        }
+        
+        # latency - LatencyModel для всех запросов или словарь {"/devices/actions": LatencyModel, ...}
+        # (ключи: "/user/info", "/devices/{id}", "/devices/actions", "default")
+        if latency is None or isinstance(latency, LatencyModel):
+            latency = {"default": latency or LatencyModel(mean=0.0)}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limiter = RateLimiter(rate_limit, burst) if rate_limit else None
+        self.token = token
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        
+        # Статистика
+        self.request_counts = {}
+        self.injected_errors = 0
+        self.rate_limited = 0
+        self.actions_applied = 0
+        
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+    
+    @property
+    def device_ids(self):
+        return list(self.devices)
+    
+    @property
+    def base_url(self):
+        """Адрес для YandexSmartHomeAPI(base_url=...)"""
+        return f"http://{self.host}:{self.port}/v1.0"
+    
+    def start(self):
+        """Запуск сервера в фоновом потоке"""
+        handler = type("MockYandexHandler", (_MockYandexHandler,), {"mock": self})
+        self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-yandex", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        """Остановка сервера"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+    
+    def get_state(self, device_id):
+        """Текущее значение on_off устройства"""
+        with self._lock:
+            return self.devices[device_id]["capabilities"][0]["state"]["value"]
+    
+    def _endpoint(self, path):
+        """Шаблон конечной точки по пути запроса"""
+        if path.startswith("/devices/") and path != "/devices/actions":
+            return "/devices/{id}"
+        return path
+    
+    def _before_response(self, endpoint):
+        """Учёт запроса, имитация задержки и сбоев; возвращает код ошибки или None"""
+        with self._lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+        
+        if self.rate_limiter is not None and not self.rate_limiter.allow():
+            with self._lock:
+                self.rate_limited += 1
+            return 429
+        
+        model = self.latency.get(endpoint) or self.latency.get("default")
+        if model is not None:
+            delay = model.sample()
+            if delay > 0:
+                time.sleep(delay)
+        
+        if self.error_rate:
+            with self._lock:
+                failed = self._random.random() < self.error_rate
+                if failed:
+                    self.injected_errors += 1
+            if failed:
+                return 500
+        return None
+    
+    def _user_info(self):
+        with self._lock:
+            return {"status": "ok", "devices": json.loads(json.dumps(list(self.devices.values())))}
+    
+    def _device_info(self, device_id):
+        with self._lock:
+            device = self.devices.get(device_id)
+            if device is None:
+                return None
+            return dict(json.loads(json.dumps(device)), status="ok")
+    
+    def _apply_actions(self, payload):
+        """Применение действий /devices/actions к состоянию в памяти"""
+        results = []
+        with self._lock:
+            for request_device in payload.get("devices", []):
+                device = self.devices.get(request_device.get("id"))
+                capabilities = []
+                for action in request_device.get("actions", []):
+                    if device is None:
+                        action_result = {"status": "ERROR", "error_code": "DEVICE_NOT_FOUND"}
+                    elif action.get("type") != "devices.capabilities.on_off":
+                        action_result = {"status": "ERROR", "error_code": "INVALID_ACTION"}
+                    else:
+                        device["capabilities"][0]["state"]["value"] = bool(action["state"]["value"])
+                        self.actions_applied += 1
+                        action_result = {"status": "DONE"}
+                    capabilities.append({
+                        "type": action.get("type"),
+                        "state": {"instance": "on", "action_result": action_result}
+                    })
+                results.append({"id": request_device.get("id"), "capabilities": capabilities})
+        return {"status": "ok", "devices": results}
+    
+    def get_stats(self):
+        """Статистика сервера"""
+        with self._lock:
+            return {
+                'requests': dict(self.request_counts),
+                'injected_errors': self.injected_errors,
+                'rate_limited': self.rate_limited,
+                'actions_applied': self.actions_applied
+            }
+
+class _MockYandexHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов MockYandexServer (атрибут mock задаётся при запуске)"""
+    protocol_version = "HTTP/1.1"  # Keep-alive, как у настоящего API
+    disable_nagle_algorithm = True  # Заголовки и тело уходят сразу, без ожидания ACK (иначе +40 мс на запрос)
+    mock = None
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def _route(self):
+        """Путь без префикса /v1.0 или None, если авторизация не прошла"""
+        if self.mock.token and self.headers.get("Authorization") != f"Bearer {self.mock.token}":
+            self._send_json(401, {"status": "error", "message": "Unauthorized"})
+            return None
+        path = self.path.split("?", 1)[0]
+        return path[len("/v1.0"):] if path.startswith("/v1.0") else path
+    
+    def do_HEAD(self):
+        # Прогрев соединений клиентом (keep-alive)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+    
+    def do_GET(self):
+        path = self._route()
+        if path is None:
+            return
+        
+        error = self.mock._before_response(self.mock._endpoint(path))
+        if error:
+            self._send_json(error, {"status": "error", "message": "Mock error"})
+        elif path == "/user/info":
+            self._send_json(200, self.mock._user_info())
+        elif path.startswith("/devices/"):
+            device = self.mock._device_info(path[len("/devices/"):])
+            if device is None:
+                self._send_json(404, {"status": "error", "message": "Device not found"})
+            else:
+                self._send_json(200, device)
+        else:
+            self._send_json(404, {"status": "error", "message": "Not found"})
+    
+    def do_POST(self):
+        path = self._route()
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if path is None:
+            return
+        
+        if path != "/devices/actions":
+            self._send_json(404, {"status": "error", "message": "Not found"})
+            return
+        
+        error = self.mock._before_response(path)
+        if error:
+            self._send_json(error, {"status": "error", "message": "Mock error"})
+            return
+        
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            self._send_json(400, {"status": "error", "message": "Invalid JSON"})
+            return
+        self._send_json(200, self.mock._apply_actions(payload))
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    
+    server = MockYandexServer(port=port, latency=LatencyModel("lognormal", mean=latency, spread=0.5),
+                              error_rate=error_rate).start()
+    print(colored(f"✓ Тестовый сервер API запущен: {server.base_url}", "green"))
+    for device_id in server.device_ids:
+        print(colored(f"  • {device_id}", "white"))
+    print(colored("Нажмите Ctrl+C для остановки", "yellow"))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
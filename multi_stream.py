@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from termcolor import colored
+
+from event_log import get_logger
+from record_audio import ClapDetector
+
+class MonitoredStream:
+    """Один аудио-поток супервизора: детектор со своим состоянием и счётчики"""
+    def __init__(self, detector, name, source):
+        self.detector = detector
+        self.name = name
+        self.source = source
+        self.stream = None
+        
+        self.chunks = 0
+        self.cpu_time = 0.0  # Процессорное время анализа (thread_time рабочих потоков)
+        self.double_claps = 0
+    
+    def get_stats(self):
+        """Статистика потока"""
+        callback = self.detector.get_callback_stats()
+        return {
+            'name': self.name,
+            'device': self.detector.device,
+            'chunks': self.chunks,
+            'cpu_s': self.cpu_time,
+            'cpu_per_chunk_ms': self.cpu_time / self.chunks * 1000 if self.chunks else 0.0,
+            'callback_max_ms': callback['max_ms'],
+            'callback_overruns': callback['profiler']['overruns'] if callback['profiler'] else 0,
+            'dropped_chunks': callback['dropped_chunks'],
+            'status_flags': callback['status_flags'],
+            'double_claps': self.double_claps,
+            'threshold': self.detector.active_threshold
+        }
+
+class MultiStreamSupervisor:
+    """Несколько микрофонов в одном процессе с общим пулом потоков анализа
+    
+    Каждое устройство открывается явно по ID (без sd.default.device) и пишет блоки
+    в кольцевой буфер своего детектора. Рабочие потоки пула по очереди берут потоки
+    из общей очереди: поток находится в очереди один раз, поэтому его детектор
+    в каждый момент анализирует не больше одного рабочего потока.
+    """
+    def __init__(self, workers=2, batch_size=4):
+        self.workers = workers
+        self.batch_size = batch_size  # Блоков одного потока за один заход рабочего потока
+        self.streams = []
+        self.on_double_clap = None  # Обработчик двойного хлопка: функция (имя потока)
+        self.on_listening = None  # Вызывается после открытия всех потоков
+        self.is_running = False
+        
+        self._queue = queue.Queue()
+        self._threads = []
+        self._action_executor = None
+    
+    def add_stream(self, detector, name=None, source=None):
+        """Добавление детектора (устройство - detector.device или переданный source)"""
+        name = name or f"mic-{detector.device if detector.device is not None else len(self.streams)}"
+        stream = MonitoredStream(detector, name, detector._get_source(source))
+        self.streams.append(stream)
+        return stream
+    
+    def add_device(self, device_id, name=None, **settings):
+        """Добавление микрофона по ID с отдельными настройками детектора (threshold и т.п.)"""
+        detector = ClapDetector(
+            sample_rate=settings.pop('sample_rate', 44100),
+            chunk_size=settings.pop('chunk_size', 1024)
+        )
+        for key, value in settings.items():
+            setattr(detector, key, value)
+        if not detector.set_microphone(device_id):
+            return None
+        return self.add_stream(detector, name)
+    
+    def _make_handler(self, stream):
+        """Обработчик двойного хлопка детектора с именем потока"""
+        def handler():
+            stream.double_claps += 1
+            if self.on_double_clap is not None:
+                self.on_double_clap(stream.name)
+        return handler
+    
+    def start(self, on_double_clap=None):
+        """Открытие всех потоков и запуск пула анализа"""
+        if on_double_clap is not None:
+            self.on_double_clap = on_double_clap
+        if not self.streams:
+            raise ValueError("Не добавлено ни одного микрофона")
+        
+        self.is_running = True
+        self._action_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clap-action")
+        
+        try:
+            for stream in self.streams:
+                detector = stream.detector
+                detector.is_running = True
+                detector.prepare_stream()
+                detector._action_executor = self._action_executor
+                detector.on_double_clap = self._make_handler(stream)
+                
+                stream.chunks = 0
+                stream.cpu_time = 0.0
+                opened = stream.source.open_stream(
+                    detector._audio_callback,
+                    samplerate=detector.stream_rate,
+                    blocksize=detector.chunk_size * detector.decimation,
+                    channels=detector.channels,
+                    ready=detector._ring.has_space
+                )
+                opened.__enter__()
+                stream.stream = opened  # Закрывается в _release только открытый поток
+                self._queue.put(stream)
+        except Exception:
+            # Не открылся очередной микрофон - уже открытые потоки и исполнитель закрываются
+            self.is_running = False
+            self._release()
+            raise
+        
+        self._threads = [
+            threading.Thread(target=self._worker_loop, name=f"clap-analysis-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        
+        print(colored(f"\n🎤 Мониторинг {len(self.streams)} микрофонов, потоков анализа: {self.workers}", "blue"))
+        for stream in self.streams:
+            print(colored(
+                f"  • {stream.name}: устройство {stream.detector.device}, "
+                f"порог {stream.detector.active_threshold:.4f}", "blue"))
+        if self.on_listening is not None:
+            self.on_listening()
+    
+    def _release(self):
+        """Закрытие открытых потоков, очистка очереди и остановка исполнителя действий"""
+        for stream in self.streams:
+            stream.detector.is_running = False
+            if stream.stream is not None:
+                stream.stream.__exit__(None, None, None)
+                stream.stream = None
+        
+        # Оставшиеся в очереди ссылки на потоки больше не нужны
+        while not self._queue.empty():
+            self._queue.get_nowait()
+        if self._action_executor:
+            self._action_executor.shutdown(wait=False)
+            self._action_executor = None
+    
+    def _worker_loop(self):
+        """Рабочий поток: анализ очередного потока порциями по batch_size блоков"""
+        # Один полный обход без данных - пауза в четверть самого короткого блока
+        poll_interval = min(stream.detector.callback_budget for stream in self.streams) / 4
+        idle_streams = 0
+        
+        while self.is_running:
+            try:
+                stream = self._queue.get(timeout=poll_interval)
+            except queue.Empty:
+                continue
+            
+            # Счётчики потока меняются до возврата в очередь - пока он у этого рабочего потока
+            start = time.thread_time()
+            processed = 0
+            try:
+                processed = stream.detector.analyze_pending(self.batch_size)
+            finally:
+                stream.cpu_time += time.thread_time() - start
+                stream.chunks += processed
+                self._queue.put(stream)
+            
+            idle_streams = 0 if processed else idle_streams + 1
+            if idle_streams >= len(self.streams):
+                idle_streams = 0
+                time.sleep(poll_interval)
+    
+    def is_finished(self):
+        """Все источники воспроизведения закончились и их блоки проанализированы"""
+        return all(
+            stream.source.is_finished() and stream.detector._ring.pending() == 0
+            for stream in self.streams
+        )
+    
+    def run(self, on_double_clap=None):
+        """Мониторинг до остановки (Ctrl+C) или до конца данных всех источников"""
+        self.start(on_double_clap)
+        live = any(stream.source.is_live for stream in self.streams)
+        try:
+            while self.is_running and not self.is_finished():
+                time.sleep(0.1 if live else 0.005)
+        finally:
+            self.stop()
+    
+    def stop(self):
+        """Остановка пула анализа и закрытие потоков"""
+        self.is_running = False
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        self._threads = []
+        self._release()
+        
+        get_logger().flush()
+        print(colored("\n🛑 Мониторинг остановлен", "yellow"))
+        self.print_stats()
+    
+    def get_stats(self):
+        """Статистика по всем потокам"""
+        return [stream.get_stats() for stream in self.streams]
+    
+    def print_stats(self):
+        """Вывод статистики по потокам"""
+        for stats in self.get_stats():
+            color = "yellow" if stats['dropped_chunks'] or stats['status_flags'] or stats['callback_overruns'] else "blue"
+            print(colored(
+                f"  {stats['name']}: блоков {stats['chunks']}, CPU {stats['cpu_s']:.2f} с "
+                f"({stats['cpu_per_chunk_ms']:.3f} мс/блок), callback макс. {stats['callback_max_ms']:.3f} мс "
+                f"(превышений бюджета: {stats['callback_overruns']}), "
+                f"потеряно блоков: {stats['dropped_chunks']}, двойных хлопков: {stats['double_claps']}", color))
+
+# Мониторинг нескольких микрофонов: python multi_stream.py [ID устройства ...]
+if __name__ == "__main__":
+    supervisor = MultiStreamSupervisor()
+    device_ids = [int(arg) for arg in sys.argv[1:]]
+    if not device_ids:
+        device_ids = [device['id'] for device in ClapDetector().find_best_microphone()]
+    
+    for device_id in device_ids:
+        supervisor.add_device(device_id)
+    
+    if not supervisor.streams:
+        print(colored("✗ Микрофоны не найдены", "red"))
+        sys.exit(1)
+    
+    def report(name):
+        print(colored(f"🎉 [{time.strftime('%H:%M:%S')}] Двойной хлопок: {name}", "green", attrs=['bold']))
+    
+    try:
+        supervisor.run(report)
+    except KeyboardInterrupt:
+        pass
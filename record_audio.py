@@ -1,31 +1,115 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import sys
 import numpy as np
 import sounddevice as sd
 import threading
 import time
-from scipy import signal
+from concurrent.futures import ThreadPoolExecutor
 from termcolor import colored
 
+from audio_buffer import AudioRingBuffer
+from audio_profiler import CallbackProfiler
+from audio_dsp import (SpectralPlan, BandpassFilter, OnsetDetector, P2Quantile, Decimator, ChannelFusion,
+                       lowest_sample_rate, decimation_factor, spectrum_limit, read_wav)
+from audio_sources import SoundDeviceSource
+from event_log import get_logger
+from latency_trace import ClapTrace, set_current_trace
+
 class ClapDetector:
     def __init__(self, sample_rate=44100, chunk_size=1024):
-        self.sample_rate = sample_rate
-        self.chunk_size = chunk_size
+        self.sample_rate = sample_rate  # Частота анализа
+        self.capture_rate = None  # Частота захвата; None - равна sample_rate (без прореживания)
+        self.chunk_size = chunk_size  # Размер блока анализа (в сэмплах частоты анализа)
+        # Программное прореживание, если устройство не умеет низкую частоту. На x86 оно
+        # обходится дороже, чем анализ на исходной частоте, поэтому по умолчанию выключено
+        self.allow_decimation = False
+        self._decimator = None
+        self.device = None  # ID устройства ввода; None - устройство по умолчанию
+        
+        # Многоканальный режим: открываются все каналы устройства, сигналы объединяются
+        # в один (ChannelFusion: "max", "sum", "delay_and_sum", "best") до анализа
+        self.multichannel = False
+        self.channels = 1
+        self.channel_fusion = "max"
+        self._fusion = None
         self.threshold = 0.3  # Порог громкости для хлопка
         self.clap_cooldown = 0.5  # Минимальное время между хлопками
         self.double_clap_window = 1.0  # Максимальное время между хлопками для двойного
         self.is_running = False
         self.audio_thread = None
+        self.source = None  # Источник аудио (AudioSource); None - микрофон через sounddevice
         
-        # Для детекции двойного хлопка
-        self.last_clap_time = 0
+        # Для детекции двойного хлопка (время - по часам аудио-потока, в секундах)
+        self.last_clap_time = float('-inf')
+        self.last_clap_sample = None
         self.clap_count = 0
         
+        # Счётчики за всё время работы (читаются сервером метрик без блокировок)
+        self.claps_detected = 0
+        self.double_claps_detected = 0
+        
+        # Часы потока: счётчик сэмплов и время АЦП первого блока
+        self._frame_counter = 0
+        self._clock_origin = None
+        self._clock_offset = 0.0  # perf_counter() - время потока (для трассировки задержек)
+        self._onset_detector = OnsetDetector(hop_size=128)
+        
         # Характеристики частот хлопка
         self.clap_freq_min = 2000  # Минимальная частота хлопка (Гц)
         self.clap_freq_max = 8000  # Максимальная частота хлопка (Гц)
         
+        # Спектральный план пересоздаётся при изменении частоты, размера блока или диапазона
+        self.fft_window = None  # Например, "hanning"; None - прямоугольное окно
+        self.fft_band_ratio = 0.4  # Минимальная доля спектра в полосе хлопка
+        self._spectral_plan = None
+        
+        # Режим детекции: "fft" - спектр каждого блока, "iir" - потоковый полосовой фильтр
+        self.detection_mode = "fft"
+        self.iir_order = 4
+        self.iir_band_ratio = 0.4  # Минимальная доля энергии в полосе хлопка
+        self._bandpass = None
+        
+        # Разделение потоков: callback только копирует блоки в кольцевой буфер,
+        # анализ выполняет отдельный поток, действия - отдельный исполнитель
+        self.ring_capacity = 64  # Около 1.5 с аудио при 1024 samples / 44.1 кГц
+        self._ring = None
+        self._action_executor = None
+        
+        # Адаптивный порог: уровень шума отслеживается EMA по каждому блоку (O(1)),
+        # порог сдвигается на прирост энергии шума относительно момента калибровки
+        self.adaptive_threshold = True
+        self.noise_floor = None  # Текущая оценка уровня шума (RMS)
+        self.reference_noise_floor = None  # Уровень шума, при котором подобран threshold
+        self.noise_time_constant = 10.0  # Постоянная времени EMA (сек)
+        self.noise_margin = 2.0  # Порог не ниже уровня шума * noise_margin
+        self.threshold_scale_limits = (0.5, 8.0)  # Допустимое отношение адаптивного порога к threshold
+        self.hysteresis = 0.7  # Новое срабатывание - только после спада уровня ниже порог * hysteresis
+        self.current_threshold = None  # Действующий адаптивный порог (None - используется threshold)
+        self.noise_floor_save_interval = 300.0  # Период сохранения уровня шума (сек по часам потока)
+        self.on_noise_floor_update = None  # Сохранение уровня шума (вызывается исполнителем действий)
+        self.on_listening = None  # Вызывается сразу после открытия аудио-потока
+        self._armed = True
+        self._last_rms = 0.0
+        self._noise_updates = 0
+        self._last_floor_save = None
+        
+        # Статистика audio callback
+        self.callback_count = 0
+        self.callback_time_last = 0.0
+        self.callback_time_max = 0.0
+        self.status_count = 0
+        self._last_status = None
+        
+        # Профилировщик callback и анализа (создаётся при запуске потока под текущий бюджет)
+        self.profile_every = 0  # Каждый N-й блок анализируется под cProfile; 0 - без профилирования
+        self.profiler = None
+        
+        # Трассировка задержки хлопок → лампа: трасса создаётся на каждый двойной хлопок
+        # и передаётся обработчику через latency_trace.current_trace()
+        self.trace_latency = True
+    
     def find_best_microphone(self):
         """Поиск доступных микрофонов"""
         try:
@@ -49,70 +133,376 @@ class ClapDetector:
     def set_microphone(self, device_id):
         """Установка микрофона по ID"""
         try:
-            sd.default.device = device_id
+            # Устройство передаётся потоку явно: sd.default.device общий для процесса
             device_info = sd.query_devices(device_id)
+            self.device = device_id
             print(colored(f"✓ Выбран микрофон: {device_info['name']}", "green"))
+            if self.multichannel:
+                self.channels = max(1, int(device_info['max_input_channels']))
+                print(colored(f"  Каналов: {self.channels}, объединение: {self.channel_fusion}", "blue"))
             return True
         except Exception as e:
             print(colored(f"✗ Ошибка установки микрофона: {str(e)}", "red"))
             return False
     
+    @property
+    def stream_rate(self):
+        """Частота, с которой открывается аудио-поток"""
+        return self.capture_rate or self.sample_rate
+    
+    @property
+    def decimation(self):
+        """Коэффициент прореживания от частоты захвата до частоты анализа"""
+        return max(1, self.stream_rate // self.sample_rate)
+    
+    def select_sample_rate(self, device=None):
+        """Выбор наименьшей частоты, покрывающей полосу хлопка (до clap_freq_max)
+        
+        Поддерживаемые устройством частоты проверяются через sd.check_input_settings.
+        Если устройство не умеет нужную частоту, захват идёт на ближайшей более высокой,
+        а при allow_decimation анализ - после прореживания в целое число раз.
+        Размер блока пересчитывается так, чтобы длительность блока (и уровни RMS,
+        под которые откалиброван порог) не изменилась.
+        Возвращает (частота захвата, частота анализа).
+        """
+        target = lowest_sample_rate(self.clap_freq_max)
+        candidates = sorted({target, 16000, 22050, 24000, 32000, 44100, 48000})
+        if device is None:
+            device = self.device
+        
+        for rate in candidates:
+            if rate < target:
+                continue
+            try:
+                sd.check_input_settings(device=device, samplerate=rate, channels=1)
+            except Exception:
+                continue
+            
+            # Наименьшая поддерживаемая частота; если она выше нужной - прореживание
+            factor = decimation_factor(rate, self.clap_freq_max) if self.allow_decimation else 1
+            self.capture_rate = rate if factor > 1 else None
+            self.chunk_size = self.block_size(rate // factor)
+            self.sample_rate = rate // factor
+            break
+        else:
+            print(colored("⚠ Не удалось подобрать частоту дискретизации, используется текущая", "yellow"))
+            return self.stream_rate, self.sample_rate
+        
+        if self.capture_rate:
+            print(colored(
+                f"✓ Частота захвата {self.capture_rate} Гц, анализ на {self.sample_rate} Гц "
+                f"(прореживание x{self.decimation})", "green"))
+        else:
+            print(colored(f"✓ Частота дискретизации: {self.sample_rate} Гц", "green"))
+        return self.stream_rate, self.sample_rate
+    
+    def block_size(self, sample_rate):
+        """Размер блока той же длительности, что и chunk_size на частоте анализа"""
+        if sample_rate == self.sample_rate:
+            return self.chunk_size
+        return max(self._onset_detector.hop_size, int(round(self.chunk_size * sample_rate / self.sample_rate)))
+    
     def is_clap_sound(self, audio_chunk):
         """Анализ аудио-фрагмента на наличие характеристик хлопка"""
-        # Вычисление уровня громкости
-        rms = np.sqrt(np.mean(audio_chunk**2))
+        # Вычисление уровня громкости (без временного массива audio_chunk**2)
+        rms = np.sqrt(np.dot(audio_chunk, audio_chunk) / len(audio_chunk))
+        self._last_rms = rms
+        threshold = self.active_threshold
         
-        if rms < self.threshold:
-            return False
+        if self.detection_mode == "iir":
+            # Фильтр обрабатывает каждый блок, чтобы его состояние оставалось непрерывным
+            ratio = self._get_bandpass().band_ratio(audio_chunk)
+            return rms >= threshold and ratio > self.iir_band_ratio
         
-        # Анализ частотного спектра
-        fft = np.fft.fft(audio_chunk)
-        frequencies = np.fft.fftfreq(len(audio_chunk), 1/self.sample_rate)
-        magnitude = np.abs(fft)
+        if rms < threshold:
+            return False
         
-        # Фильтрация частот в диапазоне хлопка
-        freq_mask = (frequencies >= self.clap_freq_min) & (frequencies <= self.clap_freq_max)
-        clap_energy = np.sum(magnitude[freq_mask])
-        total_energy = np.sum(magnitude)
+        # Анализ частотного спектра по предрасчитанному плану
+        plan = self._get_spectral_plan(len(audio_chunk))
         
         # Хлопок должен иметь значительную энергию в высокочастотном диапазоне
-        if total_energy > 0 and (clap_energy / total_energy) > 0.4:
-            return True
+        return plan.band_ratio(audio_chunk) > self.fft_band_ratio
+    
+    @property
+    def active_threshold(self):
+        """Действующий порог громкости (адаптивный, если уровень шума уже оценён)"""
+        if self.adaptive_threshold and self.current_threshold is not None:
+            return self.current_threshold
+        return self.threshold
+    
+    def _update_noise_floor(self, rms, is_clap, position):
+        """Обновление уровня шума и адаптивного порога с гистерезисом (O(1) на блок)
+        
+        Возвращает решение о хлопке с учётом гистерезиса.
+        """
+        threshold = self.active_threshold
+        is_clap = self._hysteresis_step(rms, is_clap, threshold)
+        self._track_noise_floor(rms, threshold, position)
+        return is_clap
+    
+    def _hysteresis_step(self, rms, is_clap, threshold):
+        """Гистерезис: после срабатывания уровень должен опуститься ниже порога"""
+        if not self._armed:
+            if rms < threshold * self.hysteresis:
+                self._armed = True
+            return False
+        if is_clap:
+            self._armed = False
+        return is_clap
+    
+    def _track_noise_floor(self, rms, threshold, position, sample_rate=None):
+        """Шаг EMA уровня шума и пересчёт адаптивного порога (не зависит от решений о хлопках)"""
+        sample_rate = sample_rate or self.sample_rate
+        
+        # EMA по уровню, ограниченному порогом: хлопки почти не влияют,
+        # а продолжительный громкий фон (ТВ, вентиляция) постепенно поднимает оценку
+        level = min(rms, threshold)
+        if self.noise_floor is None:
+            self.noise_floor = level
+        else:
+            alpha = min(self.callback_budget / self.noise_time_constant, 1.0)
+            self.noise_floor += alpha * (level - self.noise_floor)
+        self._noise_updates += 1
+        
+        # Без калибровки опорным считается уровень шума после первой секунды
+        if self.reference_noise_floor is None:
+            if self._noise_updates * self.callback_budget >= 1.0:
+                self.reference_noise_floor = self.noise_floor
+        else:
+            # Энергии шума и хлопка складываются: к порогу добавляется прирост энергии шума
+            low, high = self.threshold_scale_limits
+            shifted = np.sqrt(max(self.threshold ** 2 + self.noise_floor ** 2 - self.reference_noise_floor ** 2, 0.0))
+            adaptive = max(shifted, self.noise_floor * self.noise_margin)
+            self.current_threshold = float(min(max(adaptive, self.threshold * low), self.threshold * high))
+        
+        # Периодическое сохранение уровня шума (вне потока анализа)
+        stream_time = position / sample_rate
+        if self._last_floor_save is None:
+            self._last_floor_save = stream_time
+        elif stream_time - self._last_floor_save >= self.noise_floor_save_interval:
+            self._last_floor_save = stream_time
+            if self.on_noise_floor_update is not None:
+                if self._action_executor is not None:
+                    self._action_executor.submit(self.on_noise_floor_update, float(self.noise_floor))
+                else:
+                    self.on_noise_floor_update(float(self.noise_floor))
+    
+    def threshold_trace(self, rms, sample_rate=None):
+        """Действующий порог для каждого блока записи (rms - уровни блоков по порядку)
+        
+        Адаптивный порог проходит тот же шаг EMA, что и в реальном времени, начиная
+        с уровня калибровки; состояние детектора после прохода восстанавливается.
+        """
+        if not self.adaptive_threshold:
+            return np.full(len(rms), float(self.threshold))
+        
+        saved = (self.noise_floor, self.reference_noise_floor, self.current_threshold,
+                 self._noise_updates, self._last_floor_save, self.on_noise_floor_update)
+        self.noise_floor = self.reference_noise_floor
+        self.current_threshold = None
+        self._noise_updates = 0
+        self._last_floor_save = None
+        self.on_noise_floor_update = None  # Уровень шума записи не сохраняется
+        
+        thresholds = np.empty(len(rms))
+        block_size = self.block_size(sample_rate or self.sample_rate)
+        try:
+            for index, level in enumerate(np.asarray(rms).tolist()):
+                threshold = self.active_threshold
+                thresholds[index] = threshold
+                self._track_noise_floor(level, threshold, index * block_size, sample_rate)
+        finally:
+            (self.noise_floor, self.reference_noise_floor, self.current_threshold,
+             self._noise_updates, self._last_floor_save, self.on_noise_floor_update) = saved
+        return thresholds
+    
+    def apply_hysteresis(self, rms, thresholds, candidates):
+        """Решения по блокам записи с гистерезисом (как в реальном времени; без адаптации - кандидаты)"""
+        candidates = np.asarray(candidates, dtype=bool)
+        if not self.adaptive_threshold:
+            return candidates
+        
+        saved_armed = self._armed
+        self._armed = True
+        is_clap = np.zeros(len(candidates), dtype=bool)
+        try:
+            for index, (level, threshold, candidate) in enumerate(
+                    zip(np.asarray(rms).tolist(), np.asarray(thresholds).tolist(), candidates.tolist())):
+                if candidate or not self._armed:
+                    is_clap[index] = self._hysteresis_step(level, candidate, threshold)
+        finally:
+            self._armed = saved_armed
+        return is_clap
+    
+    def _get_spectral_plan(self, chunk_size):
+        """Спектральный план для текущих параметров (пересоздаётся при их изменении)"""
+        ratio_max = spectrum_limit(self.clap_freq_max)
+        key = (self.sample_rate, chunk_size, self.clap_freq_min, self.clap_freq_max, self.fft_window, ratio_max)
+        if self._spectral_plan is None or self._spectral_plan.key != key:
+            self._spectral_plan = SpectralPlan(
+                self.sample_rate, chunk_size,
+                self.clap_freq_min, self.clap_freq_max,
+                window=self.fft_window, ratio_max=ratio_max
+            )
+        return self._spectral_plan
+    
+    def _get_bandpass(self):
+        """Полосовой фильтр для текущих параметров (пересоздаётся при их изменении)"""
+        key = (self.sample_rate, self.clap_freq_min, self.clap_freq_max, self.iir_order)
+        if self._bandpass is None or self._bandpass.key != key:
+            self._bandpass = BandpassFilter(
+                self.sample_rate, self.clap_freq_min, self.clap_freq_max,
+                order=self.iir_order
+            )
+        return self._bandpass
+    
+    def detect_offline(self, audio, sample_rate=None, decimate=False):
+        """Пакетная детекция хлопков во всей записи (та же логика решений, что и в реальном времени)
+        
+        Возвращает список событий {'type': 'clap'|'double_clap', 'sample': int, 'time': float}.
+        При adaptive_threshold уровень шума, адаптивный порог и гистерезис обновляются
+        по блокам так же, как в реальном времени, начиная с уровня калибровки.
+        decimate=True - запись сначала прореживается (signal.resample_poly) до наименьшей
+        частоты, покрывающей полосу хлопка; номера сэмплов событий - в исходной частоте.
+        Состояние детектора двойного хлопка сбрасывается.
+        """
+        sample_rate = sample_rate or self.sample_rate
+        audio = np.asarray(audio, dtype=np.float32)
+        if audio.ndim > 1 and self.channels > 1 and audio.shape[1] > 1:
+            audio = self._fuse_offline(audio, sample_rate)
+        elif audio.ndim > 1:
+            audio = audio[:, 0]
+        
+        factor = decimation_factor(sample_rate, self.clap_freq_max) if decimate else 1
+        if factor > 1:
+            from scipy import signal
+            audio = signal.resample_poly(audio, 1, factor).astype(np.float32)
+            events = self.detect_offline(audio, sample_rate / factor)
+            for event in events:
+                event['sample'] *= factor
+            return events
+        
+        chunk_size = self.block_size(sample_rate)
+        frame_count = len(audio) // chunk_size
+        if frame_count == 0:
+            return []
+        
+        # Разбиение на блоки без копирования (представление с шагами)
+        frames = np.lib.stride_tricks.sliding_window_view(audio, chunk_size)[::chunk_size][:frame_count]
+        rms = np.sqrt(np.einsum('ij,ij->i', frames, frames) / chunk_size)
+        
+        # Действующий порог каждого блока (последовательный шаг O(1), как в реальном времени)
+        thresholds = self.threshold_trace(rms, sample_rate)
+        
+        # Признаки всех блоков за один векторизованный проход
+        if self.detection_mode == "iir":
+            bandpass = BandpassFilter(sample_rate, self.clap_freq_min, self.clap_freq_max, order=self.iir_order)
+            filtered = bandpass.filter_signal(audio)
+            filtered_frames = np.lib.stride_tricks.sliding_window_view(filtered, chunk_size)[::chunk_size][:frame_count]
+            band_energy = np.einsum('ij,ij->i', filtered_frames, filtered_frames)
+            total_energy = np.square(rms) * chunk_size
+            ratios = np.zeros(frame_count)
+            np.divide(band_energy, total_energy, out=ratios, where=total_energy > 0)
+            in_band = ratios > self.iir_band_ratio
+        else:
+            in_band = np.zeros(frame_count, dtype=bool)
+            candidates = np.nonzero(rms >= thresholds)[0]
+            if len(candidates):
+                plan = SpectralPlan(sample_rate, chunk_size, self.clap_freq_min, self.clap_freq_max,
+                                    window=self.fft_window, ratio_max=spectrum_limit(self.clap_freq_max))
+                in_band[candidates] = plan.band_ratios(frames[candidates]) > self.fft_band_ratio
+        
+        is_clap = self.apply_hysteresis(rms, thresholds, (rms >= thresholds) & in_band)
+        
+        clap_frames = np.nonzero(is_clap)[0]
+        if len(clap_frames) == 0:
+            return []
+        
+        # Начало хлопка внутри блоков; предыдущая энергия - последнее окно предыдущего блока
+        onset = OnsetDetector(hop_size=self._onset_detector.hop_size, rise_ratio=self._onset_detector.rise_ratio)
+        hops = chunk_size // onset.hop_size
+        starts = clap_frames * chunk_size
+        if hops > 0:
+            hop_view = frames[clap_frames, :hops * onset.hop_size].reshape(len(clap_frames), hops, onset.hop_size)
+            energies = np.einsum('ijk,ijk->ij', hop_view, hop_view) / onset.hop_size
+            prev_energies = np.zeros(len(clap_frames))
+            has_prev = clap_frames > 0
+            tails = frames[clap_frames[has_prev] - 1, -onset.hop_size:]
+            prev_energies[has_prev] = np.einsum('ij,ij->i', tails, tails) / onset.hop_size
+            clap_samples = starts + onset.locate_many(energies, prev_energies)
+        else:
+            clap_samples = starts
+        
+        # Последовательная логика решений - только по блокам-кандидатам
+        self.clap_count = 0
+        self.last_clap_time = float('-inf')
+        events = []
+        for clap_sample in clap_samples:
+            clap_sample = int(clap_sample)
+            clap_time = clap_sample / sample_rate
+            event = self._register_clap(clap_time)
+            if event is None:
+                continue
+            events.append({'type': 'clap', 'sample': clap_sample, 'time': clap_time})
+            if event == "double":
+                events.append({'type': 'double_clap', 'sample': clap_sample, 'time': clap_time})
         
-        return False
+        self.clap_count = 0
+        self.last_clap_time = float('-inf')
+        return events
+    
+    def _create_fusion(self, channels, sample_rate):
+        """Объединитель каналов для текущих параметров"""
+        return ChannelFusion(channels, sample_rate, self.clap_freq_min, self.clap_freq_max,
+                             mode=self.channel_fusion)
+    
+    def _fuse_offline(self, audio, sample_rate):
+        """Объединение каналов записи поблочно (как в реальном времени)"""
+        channels = min(audio.shape[1], self.channels)
+        fusion = self._create_fusion(channels, sample_rate)
+        chunk_size = self.block_size(sample_rate)
+        blocks = [fusion.fuse(audio[i:i + chunk_size, :channels])
+                  for i in range(0, len(audio) - chunk_size + 1, chunk_size)]
+        return np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.float32)
+    
+    def detect_wav(self, path, decimate=False):
+        """Пакетная детекция хлопков в WAV-файле"""
+        audio, sample_rate = read_wav(path)
+        return self.detect_offline(audio, sample_rate=sample_rate, decimate=decimate)
     
-    def calibrate_threshold(self, duration=5):
+    def _get_source(self, source=None):
+        """Источник аудио: переданный, заданный в детекторе или микрофон по умолчанию"""
+        return source or self.source or SoundDeviceSource(self.device)
+    
+    def calibrate_threshold(self, duration=5, source=None):
         """Калибровка порога чувствительности"""
         print(colored(f"\n🔊 Калибровка микрофона в течение {duration} секунд...", "yellow"))
         print(colored("Сделайте несколько хлопков для автоматической настройки", "yellow"))
         
         try:
             # Запись фонового шума и хлопков
-            audio_data = sd.rec(
-                int(duration * self.sample_rate),
-                samplerate=self.sample_rate,
-                channels=1,
-                dtype='float32'
+            audio_data = self._get_source(source).record(
+                int(duration * self.stream_rate),
+                samplerate=self.stream_rate,
+                channels=1
             )
-            sd.wait()
-            
-            # Анализ уровней громкости
-            rms_levels = []
-            chunk_samples = int(self.sample_rate * 0.1)  # 100ms блоки
             
-            for i in range(0, len(audio_data) - chunk_samples, chunk_samples):
-                chunk = audio_data[i:i + chunk_samples].flatten()
-                rms = np.sqrt(np.mean(chunk**2))
-                rms_levels.append(rms)
+            # Анализ уровней громкости: RMS всех 100ms блоков за один проход
+            chunk_samples = int(self.stream_rate * 0.1)
+            audio = np.asarray(audio_data, dtype=np.float32).reshape(-1)
+            block_count = len(audio) // chunk_samples
+            blocks = audio[:block_count * chunk_samples].reshape(block_count, chunk_samples)
+            rms_levels = np.sqrt(np.einsum('ij,ij->i', blocks, blocks) / chunk_samples)
             
-            if rms_levels:
+            if len(rms_levels):
                 background_noise = np.percentile(rms_levels, 20)
                 average_level = np.median(rms_levels)
                 peak_level = np.max(rms_levels)
                 
                 # Установка порога между средним уровнем и пиком
                 new_threshold = average_level + (peak_level - average_level) * 0.6
-                self.threshold = max(new_threshold, background_noise * 3)
+                self.threshold = float(max(new_threshold, background_noise * 3))
+                self._set_reference_noise_floor(background_noise)
                 
                 print(colored(f"✓ Калибровка завершена", "green"))
                 print(colored(f"  Фоновый шум: {background_noise:.4f}", "blue"))
@@ -121,81 +511,382 @@ class ClapDetector:
                 print(colored(f"  Установлен порог: {self.threshold:.4f}", "green"))
                 
                 return self.threshold
-            
+        
         except Exception as e:
             print(colored(f"✗ Ошибка калибровки: {str(e)}", "red"))
         
         return self.threshold
     
+    def calibrate_streaming(self, duration=15, source=None, min_claps=3, min_duration=2.0,
+                            clap_factor=3.0, tolerance=0.05, show_levels=True):
+        """Потоковая калибровка порога: оценки уровней обновляются по блокам 100 мс
+        
+        Память постоянна: шум (20-й перцентиль) и медиана - оценки P², пик - максимум.
+        Калибровка завершается раньше duration, когда оценка шума перестала меняться
+        (в пределах tolerance за последнюю секунду) и услышано min_claps хлопков.
+        """
+        print(colored(f"\n🔊 Калибровка микрофона (до {duration} секунд)...", "yellow"))
+        print(colored(f"Сделайте {min_claps} хлопка с паузами - калибровка завершится автоматически", "yellow"))
+        
+        block_size = int(self.stream_rate * 0.1)
+        blocks_per_second = 10
+        ring = AudioRingBuffer(capacity=32, chunk_size=block_size)
+        
+        noise = P2Quantile(0.2)
+        median = P2Quantile(0.5)
+        peak_level = 0.0
+        claps_seen = 0
+        above = False
+        noise_history = [None] * blocks_per_second  # Оценки шума за последнюю секунду (кольцо)
+        blocks = 0
+        
+        def callback(indata, frames, time_info, status):
+            ring.write(indata[:, 0], 0.0)
+        
+        source = self._get_source(source)
+        try:
+            with source.open_stream(callback, samplerate=self.stream_rate, blocksize=block_size,
+                                    channels=1, ready=ring.has_space):
+                while blocks < duration * blocks_per_second:
+                    # Признак конца читается до буфера: после него новых блоков не будет
+                    finished = source.is_finished()
+                    item = ring.peek()
+                    if item is None:
+                        if finished:
+                            break
+                        time.sleep(0.01)
+                        continue
+                    
+                    block = item[0]
+                    rms = float(np.sqrt(np.dot(block, block) / len(block)))
+                    ring.consume()
+                    blocks += 1
+                    
+                    # Хлопок - резкое превышение текущего уровня шума (по переднему фронту)
+                    floor = noise.value
+                    is_loud = floor is not None and blocks > min_duration * blocks_per_second and rms > floor * clap_factor
+                    if is_loud and not above:
+                        claps_seen += 1
+                    above = is_loud
+                    
+                    if not is_loud:
+                        noise.add(rms)
+                    median.add(rms)
+                    peak_level = max(peak_level, rms)
+                    
+                    previous = noise_history[blocks % blocks_per_second]
+                    noise_history[blocks % blocks_per_second] = noise.value
+                    
+                    if show_levels:
+                        bar = "#" * min(int(rms / max(peak_level, 1e-9) * 30), 30)
+                        print(f"\r  Уровень [{bar:<30}] {rms:.4f}  шум {noise.value or 0:.4f}  хлопков {claps_seen}",
+                              end="", flush=True)
+                    
+                    converged = (previous is not None and noise.value is not None
+                                 and abs(noise.value - previous) <= tolerance * max(previous, 1e-9))
+                    if converged and claps_seen >= min_claps:
+                        break
+        except Exception as e:
+            print(colored(f"\n✗ Ошибка калибровки: {str(e)}", "red"))
+            return self.threshold
+        
+        if show_levels:
+            print()
+        
+        if blocks == 0:
+            print(colored("⚠ Нет аудио-данных для калибровки", "yellow"))
+            return self.threshold
+        
+        background_noise = noise.value or 0.0
+        average_level = median.value
+        
+        # Установка порога между средним уровнем и пиком (как в calibrate_threshold)
+        new_threshold = average_level + (peak_level - average_level) * 0.6
+        self.threshold = float(max(new_threshold, background_noise * 3))
+        self._set_reference_noise_floor(background_noise)
+        
+        print(colored(f"✓ Калибровка завершена за {blocks / blocks_per_second:.1f} с аудио", "green"))
+        if claps_seen < min_claps:
+            print(colored(f"⚠ Услышано хлопков: {claps_seen} из {min_claps}", "yellow"))
+        print(colored(f"  Фоновый шум: {background_noise:.4f}", "blue"))
+        print(colored(f"  Средний уровень: {average_level:.4f}", "blue"))
+        print(colored(f"  Пиковый уровень: {peak_level:.4f}", "blue"))
+        print(colored(f"  Установлен порог: {self.threshold:.4f}", "green"))
+        
+        return self.threshold
+    
+    def _set_reference_noise_floor(self, noise_floor):
+        """Уровень шума, при котором подобран порог (адаптивный порог отсчитывается от него)"""
+        self.reference_noise_floor = float(noise_floor)
+        self.noise_floor = float(noise_floor)
+        self.current_threshold = None
+    
+    @property
+    def callback_budget(self):
+        """Бюджет времени на один блок (сек)"""
+        return self.chunk_size / self.sample_rate
+    
     def _audio_callback(self, indata, frames, time_info, status):
-        """Обработка аудио-данных в реальном времени"""
+        """Приём аудио-данных в реальном времени (только копирование в буфер)"""
+        start = time.perf_counter()
+        
         if status:
-            print(colored(f"⚠ Предупреждение аудио: {status}", "yellow"))
+            self.status_count += 1
+            self._last_status = status
+        
+        adc_time = time_info.inputBufferAdcTime if time_info is not None else 0.0
+        if time_info is not None:
+            # Часы потока переводятся в perf_counter: время АЦП хлопка для трассировки
+            self._clock_offset = start - time_info.currentTime
+        self._ring.write(indata if self.channels > 1 else indata[:, 0], adc_time, self._frame_counter)
+        self._frame_counter += frames
+        
+        elapsed = time.perf_counter() - start
+        self.callback_time_last = elapsed
+        if elapsed > self.callback_time_max:
+            self.callback_time_max = elapsed
+        self.callback_count += 1
+        self.profiler.record_callback(elapsed, status)
+    
+    def _analysis_loop(self):
+        """Поток анализа: чтение блоков из кольцевого буфера"""
+        poll_interval = self.callback_budget / 4
         
-        # Анализ аудио-фрагмента
-        audio_chunk = indata[:, 0]
+        while self.is_running:
+            if not self.analyze_pending():
+                time.sleep(poll_interval)
+    
+    def analyze_pending(self, max_chunks=None):
+        """Анализ накопленных блоков буфера (не более max_chunks); возвращает их число
+        
+        Вызывается одним потоком за раз: собственным потоком анализа или
+        рабочим потоком общего пула (MultiStreamSupervisor).
+        """
+        # Предупреждения о перегрузках callback и потерях аудио - отсюда, не из callback
+        self.profiler.check()
         
-        if self.is_clap_sound(audio_chunk):
-            current_time = time.time()
-            time_since_last_clap = current_time - self.last_clap_time
+        processed = 0
+        while max_chunks is None or processed < max_chunks:
+            item = self._ring.peek()
+            if item is None:
+                break
             
-            if time_since_last_clap > self.clap_cooldown:
-                self.clap_count += 1
-                self.last_clap_time = current_time
-                
-                if self.clap_count == 1:
-                    print(colored("👏 Обнаружен одиночный хлопок!", "cyan"), end="", flush=True)
-                elif self.clap_count == 2:
-                    time_between_claps = current_time - self.last_clap_time + self.clap_cooldown
-                    if time_between_claps <= self.double_clap_window:
-                        print(colored("\n👏👏 ДВОЙНОЙ ХЛОПОК ОБНАРУЖЕН! Выполняется действие...", "green", attrs=['bold']))
-                        self.on_double_clap()
-                        self.clap_count = 0
-                    else:
-                        self.clap_count = 1
-                        print(colored("\n👏 Обнаружен одиночный хлопок!", "cyan"), end="", flush=True)
+            audio_chunk, adc_time, position = item
+            profiling = self.profiler.begin_sample()
+            if self._fusion is not None:
+                audio_chunk = self._fusion.fuse(audio_chunk)
+            if self._decimator is not None:
+                audio_chunk = self._decimator.process(audio_chunk)
+                position //= self._decimator.factor
+            if self._clock_origin is None:
+                self._clock_origin = adc_time - position / self.sample_rate
+            
+            try:
+                self._process_chunk(audio_chunk, int(position))
+            except Exception as e:
+                get_logger().error(f"✗ Ошибка анализа аудио: {str(e)}")
+            finally:
+                if profiling:
+                    self.profiler.end_sample()
+                self._ring.consume()
+            processed += 1
+        return processed
+    
+    def _process_chunk(self, audio_chunk, position):
+        """Анализ аудио-фрагмента; position - номер первого сэмпла блока в потоке"""
+        cpu_start = time.thread_time()
+        is_clap = self.is_clap_sound(audio_chunk)
+        self.profiler.record_analysis(time.thread_time() - cpu_start)
+        if self.adaptive_threshold:
+            is_clap = self._update_noise_floor(self._last_rms, is_clap, position)
+        
+        if not is_clap:
+            self._onset_detector.observe(audio_chunk)
+            return
+        detected_at = time.perf_counter()
+        
+        # Уточнение момента хлопка внутри блока по коротким окнам
+        clap_sample = position + self._onset_detector.locate(audio_chunk)
+        event = self._register_clap(self._sample_to_time(clap_sample))
+        
+        if event is not None:
+            self.last_clap_sample = clap_sample
+            self.claps_detected += 1
+        
+        if event == "single":
+            get_logger().info("👏 Обнаружен одиночный хлопок!", "cyan", event="clap", sample=clap_sample)
+        elif event == "double":
+            self.double_claps_detected += 1
+            trace = None
+            if self.trace_latency:
+                trace = ClapTrace()
+                trace.mark("adc", self._sample_to_time(clap_sample) + self._clock_offset)
+                trace.mark("detected", detected_at)
+                trace.mark("confirmed")
+            get_logger().info("👏👏 ДВОЙНОЙ ХЛОПОК ОБНАРУЖЕН! Выполняется действие...", "green", attrs=['bold'],
+                              event="double_clap", sample=clap_sample)
+            self._dispatch_double_clap(trace)
+    
+    def _sample_to_time(self, sample):
+        """Перевод номера сэмпла в время по часам потока"""
+        origin = self._clock_origin if self._clock_origin is not None else 0.0
+        return origin + sample / self.sample_rate
+    
+    def _register_clap(self, clap_time):
+        """Решение об одиночном/двойном хлопке (возвращает "single", "double" или None)"""
+        time_since_last_clap = clap_time - self.last_clap_time
+        
+        if time_since_last_clap <= self.clap_cooldown:
+            return None
+        
+        self.last_clap_time = clap_time
+        
+        if self.clap_count == 1 and time_since_last_clap <= self.double_clap_window:
+            self.clap_count = 0
+            return "double"
+        
+        self.clap_count = 1
+        return "single"
+    
+    def _dispatch_double_clap(self, trace=None):
+        """Передача действия исполнителю, чтобы не задерживать анализ"""
+        if self._action_executor is not None:
+            self._action_executor.submit(self._run_action, trace)
+        else:
+            self._run_action(trace)
+    
+    def _run_action(self, trace=None):
+        """Выполнение обработчика двойного хлопка (трасса доступна через current_trace())"""
+        set_current_trace(trace)
+        try:
+            self.on_double_clap()
+        except Exception as e:
+            get_logger().error(f"✗ Ошибка обработчика двойного хлопка: {str(e)}")
+        finally:
+            set_current_trace(None)
+    
+    def get_callback_stats(self):
+        """Статистика времени выполнения audio callback"""
+        return {
+            'callbacks': self.callback_count,
+            'last_ms': self.callback_time_last * 1000,
+            'max_ms': self.callback_time_max * 1000,
+            'budget_ms': self.callback_budget * 1000,
+            'status_flags': self.status_count,
+            'dropped_chunks': self._ring.dropped if self._ring else 0,
+            'profiler': self.profiler.get_stats() if self.profiler else None
+        }
     
     def on_double_clap(self):
         """Обработчик двойного хлопка (можно переопределить)"""
         pass
     
-    def start_detection(self, callback=None):
-        """Запуск детекции хлопков"""
+    def start_detection(self, callback=None, source=None):
+        """Запуск детекции хлопков (до остановки или до конца данных источника)
+        
+        Возвращает False, если поток не удалось открыть или запись прервала ошибка.
+        """
         if callback:
             self.on_double_clap = callback
+        source = self._get_source(source)
         
         self.is_running = True
-        self.clap_count = 0
-        self.last_clap_time = 0
+        self._start_workers()
         
+        succeeded = True
         try:
             print(colored(f"\n🎤 Начало мониторинга хлопков...", "blue"))
-            print(colored("Порог чувствительности: {:.4f}".format(self.threshold), "blue"))
+            print(colored("Порог чувствительности: {:.4f}".format(self.active_threshold), "blue"))
+            if self._fusion is not None:
+                print(colored(f"Каналов: {self.channels}, объединение: {self.channel_fusion}", "blue"))
+            if self.adaptive_threshold and self.noise_floor is not None:
+                print(colored(f"Уровень шума: {self.noise_floor:.4f} (порог адаптивный)", "blue"))
             print(colored("Сделайте двойной хлопок для управления лампами\n", "yellow"))
             
-            with sd.InputStream(
-                callback=self._audio_callback,
-                channels=1,
-                samplerate=self.sample_rate,
-                blocksize=self.chunk_size
+            with source.open_stream(
+                self._audio_callback,
+                samplerate=self.stream_rate,
+                blocksize=self.chunk_size * self.decimation,
+                channels=self.channels,
+                ready=self._ring.has_space
             ):
+                if self.on_listening is not None:
+                    self.on_listening()
                 while self.is_running:
-                    time.sleep(0.1)
+                    # Воспроизведение завершается, когда все блоки проанализированы
+                    if source.is_finished() and self._ring.pending() == 0:
+                        break
+                    time.sleep(0.1 if source.is_live else 0.005)
         
         except Exception as e:
             print(colored(f"✗ Ошибка при записи аудио: {str(e)}", "red"))
+            succeeded = False
         
+        finally:
+            self.is_running = False
+            self._stop_workers()
+        
+        get_logger().flush()
         print(colored("\n🛑 Мониторинг остановлен", "yellow"))
+        self.profiler.print_report()
+        print(colored(f"  Потеряно блоков: {self._ring.dropped}", "blue"))
+        self.profiler.print_profile()
+        if self._fusion is not None:
+            print(colored(f"  Лучший канал: {self._fusion.best_channel}, задержки: {self._fusion.delays.tolist()}", "blue"))
+        return succeeded
+    
+    def _start_workers(self):
+        """Создание кольцевого буфера, потока анализа и исполнителя действий"""
+        self.prepare_stream()
+        self._action_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clap-action")
+        self.audio_thread = threading.Thread(target=self._analysis_loop, name="clap-analysis", daemon=True)
+        self.audio_thread.start()
+    
+    def prepare_stream(self):
+        """Сброс состояния потока и создание кольцевого буфера перед открытием потока"""
+        self.clap_count = 0
+        self.last_clap_time = float('-inf')
+        self.last_clap_sample = None
+        self._armed = True
+        self._last_floor_save = None
+        
+        # При прореживании блок захвата длиннее блока анализа в decimation раз
+        self._ring = AudioRingBuffer(self.ring_capacity, self.chunk_size * self.decimation, self.channels)
+        self._decimator = Decimator(self.decimation) if self.decimation > 1 else None
+        self._fusion = self._create_fusion(self.channels, self.stream_rate) if self.channels > 1 else None
+        if self._bandpass is not None:
+            self._bandpass.reset()
+        self._onset_detector.reset()
+        self._frame_counter = 0
+        self._clock_origin = None
+        self._clock_offset = 0.0
+        self.callback_count = 0
+        self.callback_time_last = 0.0
+        self.callback_time_max = 0.0
+        self.status_count = 0
+        self.profiler = CallbackProfiler(self.callback_budget, sample_every=self.profile_every)
+    
+    def _stop_workers(self):
+        """Остановка потока анализа и исполнителя действий"""
+        if self.audio_thread and self.audio_thread.is_alive() and self.audio_thread is not threading.current_thread():
+            self.audio_thread.join()
+        if self._action_executor:
+            self._action_executor.shutdown(wait=False)
+            self._action_executor = None
     
     def stop_detection(self):
         """Остановка детекции хлопков"""
         self.is_running = False
-        if self.audio_thread and self.audio_thread.is_alive():
+        if self.audio_thread and self.audio_thread.is_alive() and self.audio_thread is not threading.current_thread():
             self.audio_thread.join()
 
 # Функция для тестирования детекции
+# python record_audio.py [--profile N] - N: каждый N-й блок анализируется под cProfile
 if __name__ == "__main__":
     detector = ClapDetector()
+    if "--profile" in sys.argv:
+        index = sys.argv.index("--profile")
+        detector.profile_every = int(sys.argv[index + 1]) if len(sys.argv) > index + 1 else 50
     
     # Вывод доступных микрофонов
     devices = detector.find_best_microphone()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import itertools
+import threading
+import time
+
+class CircuitOpenError(Exception):
+    """Запрос отклонён: API временно считается недоступным"""
+    pass
+
+class LatencyTracker:
+    """Задержки запросов по конечным точкам в кольцевых буферах фиксированного размера
+    
+    Запись - без блокировок: запросы выполняют несколько потоков (дублирование, asyncio,
+    прогрев), поэтому номер ячейки выдаёт itertools.count (next() атомарен под GIL),
+    а запись в ячейку списка - одна операция. Чтение копирует окно и не мешает записи.
+    """
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = {}  # endpoint -> (окно задержек, счётчик записей)
+    
+    def record(self, endpoint, seconds):
+        """Запись задержки одного запроса"""
+        entry = self._samples.get(endpoint)
+        if entry is None:
+            entry = self._samples.setdefault(endpoint, ([None] * self.window, itertools.count()))
+        entry[0][next(entry[1]) % self.window] = seconds
+    
+    def _values(self, endpoint):
+        """Копия окна задержек (ячейки, номер которых выдан, но ещё не записан, пропускаются)"""
+        entry = self._samples.get(endpoint)
+        if entry is None:
+            return []
+        return [value for value in entry[0][:] if value is not None]
+    
+    def percentile(self, endpoint, q, min_samples=1):
+        """Перцентиль задержки (сек) или None, если данных недостаточно"""
+        values = self._values(endpoint)
+        if len(values) < min_samples:
+            return None
+        values.sort()
+        return self._percentile(values, q)
+    
+    @staticmethod
+    def _percentile(values, q):
+        """Перцентиль по отсортированному списку"""
+        index = min(int(round(q / 100 * (len(values) - 1))), len(values) - 1)
+        return values[index]
+    
+    def snapshot(self):
+        """p50/p95/p99 и число измерений по всем конечным точкам"""
+        result = {}
+        for endpoint in list(self._samples):
+            values = self._values(endpoint)
+            values.sort()
+            result[endpoint] = {
+                'count': len(values),
+                'p50': self._percentile(values, 50) if values else None,
+                'p95': self._percentile(values, 95) if values else None,
+                'p99': self._percentile(values, 99) if values else None
+            }
+        return result
+
+class CircuitBreaker:
+    """Автоматический выключатель: быстрый отказ, пока облако деградировало
+    
+    closed - запросы проходят; после failure_threshold ошибок подряд - open;
+    через reset_timeout - half_open: пропускается один пробный запрос.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        """Можно ли выполнить запрос"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            
+            self.rejected += 1
+            return False
+    
+    def record_success(self):
+        """Успешный запрос закрывает выключатель"""
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+    
+    def record_failure(self):
+        """Ошибка запроса; при превышении порога выключатель размыкается"""
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
@@ -7,18 +7,18 @@ from termcolor import colored
 
 from yandex_api import YandexSmartHomeAPI
 from record_audio import ClapDetector
+from calibration import CalibrationManager
+from main import MISSING_CREDENTIALS, load_credentials
 
 def test_api():
     """Тестирование API Яндекс.Дом"""
     print(colored("\n=== Тест API Яндекс.Дом ===", "blue", attrs=['bold']))
     
     try:
-        token = "y0__xDLjqC3BhjMgj0gkub-jhYwq63BsggL8YblL10mlsjdh7nt0KStsUr2sg"
-        device_ids = [
-            "19a27edd-f48b-43d5-9a53-5d913cd9272b",
-            "72a33ab1-6a1d-4b98-a811-8a98bfeb873d",
-            "95cf0e1e-8117-4248-a87a-f7d83a1c50b1"
-        ]
+        token, device_ids = load_credentials(CalibrationManager().config)
+        if not token or not device_ids:
+            print(colored(MISSING_CREDENTIALS, "red"))
+            return False
         
         api = YandexSmartHomeAPI(token)
         api.add_devices(device_ids)
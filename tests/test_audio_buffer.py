@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+from audio_buffer import AudioRingBuffer
+
+def _chunk(value, size=4):
+    return np.full(size, value, dtype=np.float32)
+
+def test_full_buffer_drops_newest_block_and_keeps_unread():
+    ring = AudioRingBuffer(capacity=2, chunk_size=4)
+    assert ring.write(_chunk(1), 0.0, 0)
+    assert ring.write(_chunk(2), 0.1, 4)
+    assert not ring.has_space()
+    
+    # Переполнение: новый блок отбрасывается, непрочитанные не перезаписываются
+    assert not ring.write(_chunk(3), 0.2, 8)
+    assert ring.dropped == 1
+    assert ring.pending() == 2
+    
+    chunk, timestamp, position = ring.peek()
+    assert np.all(chunk == 1)
+    assert timestamp == 0.0 and position == 0
+
+def test_peek_does_not_advance_until_consume():
+    ring = AudioRingBuffer(capacity=3, chunk_size=4)
+    assert ring.peek() is None
+    ring.write(_chunk(1), 0.0, 0)
+    ring.write(_chunk(2), 0.1, 4)
+    
+    first = ring.peek()[0]
+    assert np.all(ring.peek()[0] == first)
+    assert ring.pending() == 2
+    
+    ring.consume()
+    chunk, _, position = ring.peek()
+    assert np.all(chunk == 2) and position == 4
+    ring.consume()
+    assert ring.peek() is None
+    
+    # Лишний consume на пустом буфере ничего не ломает
+    ring.consume()
+    assert ring.pending() == 0 and ring.has_space()
+
+def test_wraparound_preserves_order_and_short_blocks():
+    ring = AudioRingBuffer(capacity=2, chunk_size=4)
+    for i in range(5):
+        assert ring.write(_chunk(i, size=4 if i != 3 else 2), i * 0.1, i * 4)
+        chunk, timestamp, position = ring.peek()
+        assert np.all(chunk == i)
+        assert len(chunk) == (2 if i == 3 else 4)
+        assert position == i * 4
+        ring.consume()
+    assert ring.dropped == 0
+
+def test_long_chunk_is_truncated_and_multichannel_shape_kept():
+    ring = AudioRingBuffer(capacity=2, chunk_size=4, channels=2)
+    block = np.arange(12, dtype=np.float32).reshape(6, 2)
+    ring.write(block, 0.0, 0)
+    chunk = ring.peek()[0]
+    assert chunk.shape == (4, 2)
+    assert np.array_equal(chunk, block[:4])
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from scipy import signal
+
+from audio_dsp import ChannelFusion, Decimator, P2Quantile
+
+@pytest.mark.parametrize("q, tolerance", [(0.5, 0.02), (0.9, 0.02), (0.99, 0.05)])
+def test_p2_quantile_tracks_exact_quantile(q, tolerance):
+    values = np.random.default_rng(0).lognormal(size=5000)
+    estimator = P2Quantile(q)
+    for value in values:
+        estimator.add(float(value))
+    
+    assert estimator.value == pytest.approx(np.quantile(values, q), rel=tolerance)
+
+def test_p2_quantile_before_five_values():
+    estimator = P2Quantile(0.5)
+    assert estimator.value is None
+    for value in (3.0, 1.0, 2.0):
+        estimator.add(value)
+    assert estimator.value == 2.0
+
+@pytest.mark.parametrize("factor", [2, 3, 4])
+def test_decimator_matches_resample_poly(factor):
+    audio = np.random.default_rng(factor).standard_normal(16000).astype(np.float32)
+    decimator = Decimator(factor)
+    
+    # Блоки некратной длины: фаза прореживания переносится между блоками
+    streamed = np.concatenate([decimator.process(audio[i:i + 1001]) for i in range(0, len(audio), 1001)])
+    reference = signal.resample_poly(audio, 1, factor)
+    
+    # Потоковый фильтр запаздывает на half_len = 10 * factor входных, то есть 10 выходных сэмплов
+    lag = 10
+    assert len(streamed) == len(reference)
+    np.testing.assert_allclose(streamed[lag:], reference[:len(streamed) - lag], atol=1e-5)
+
+def test_decimator_reset_restarts_stream():
+    audio = np.random.default_rng(0).standard_normal(4000).astype(np.float32)
+    decimator = Decimator(3)
+    first = decimator.process(audio)
+    decimator.process(audio[:7])
+    decimator.reset()
+    np.testing.assert_array_equal(decimator.process(audio), first)
+
+def _two_channel_clap(delay, blocks=4, block_size=1024):
+    """Хлопок в середине блока; второй канал запаздывает на delay сэмплов"""
+    rng = np.random.default_rng(1)
+    clap = np.zeros(blocks * block_size, dtype=np.float32)
+    clap[1400:1500] = rng.standard_normal(100) * np.hanning(100)
+    stereo = np.stack((clap, np.roll(clap, delay)), axis=1)
+    return stereo + rng.standard_normal(stereo.shape).astype(np.float32) * 1e-3
+
+@pytest.mark.parametrize("delay", [5, -7, 0])
+def test_gcc_phat_delay_sign_and_alignment(delay):
+    block_size = 1024
+    max_delay = 16
+    stereo = _two_channel_clap(delay, block_size=block_size)
+    fusion = ChannelFusion(2, 16000, 1000, 7000, mode="delay_and_sum", max_delay=max_delay)
+    fused = np.concatenate([fusion.fuse(stereo[i:i + block_size]) for i in range(0, len(stereo), block_size)])
+    
+    # Положительная задержка - канал слышит хлопок позже
+    assert fusion.delays[1] - fusion.delays[0] == delay
+    
+    # После выравнивания сумма совпадает с опорным каналом, сдвинутым на max_delay
+    reference = stereo[:, fusion.best_channel]
+    np.testing.assert_allclose(fused[max_delay:], reference[:-max_delay], atol=1e-2)
+
+def test_channel_fusion_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        ChannelFusion(2, 16000, 1000, 7000, mode="median")
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+try:
+    import sounddevice
+except (ImportError, OSError):
+    pytest.skip("sounddevice (PortAudio) недоступен", allow_module_level=True)
+
+from audio_sources import ArraySource, AudioSource
+
+def test_replay_finishes_after_last_callback():
+    """Признак конца появляется только после того, как callback получил последний блок"""
+    audio = np.arange(10 * 256, dtype=np.float32)
+    source = ArraySource(audio, 8000)
+    received = []
+    
+    def callback(indata, frames, time_info, status):
+        # Пока callback не вернулся, воспроизведение не считается законченным
+        assert not source.is_finished()
+        received.append(indata[:, 0].copy())
+    
+    with source.open_stream(callback, samplerate=8000, blocksize=256):
+        assert source.finished.wait(timeout=5)
+    
+    assert len(received) == 10
+    assert np.array_equal(np.concatenate(received), audio)
+
+def test_record_sets_finished_at_end_of_data():
+    source = ArraySource(np.ones(300, dtype=np.float32), 8000)
+    source.record(256, 8000)
+    assert not source.is_finished()
+    block = source.record(256, 8000)
+    assert source.is_finished()
+    assert block[:44, 0].tolist() == [1.0] * 44 and not block[44:].any()
+
+def test_audio_source_requires_stream_and_record():
+    class Incomplete(AudioSource):
+        def record(self, frames, samplerate, channels=1):
+            return np.zeros((frames, channels), dtype=np.float32)
+    
+    with pytest.raises(TypeError):
+        Incomplete()
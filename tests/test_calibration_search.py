@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import numpy as np
+import pytest
+
+try:
+    import sounddevice
+except (ImportError, OSError):
+    pytest.skip("sounddevice (PortAudio) недоступен", allow_module_level=True)
+
+from calibration import CalibrationManager
+from calibration_search import _search_detector, apply_parameters
+from record_audio import ClapDetector
+
+BEST = {
+    'threshold': 0.05, 'clap_cooldown': 0.2, 'double_clap_window': 0.75,
+    'clap_freq_min': 1500, 'clap_freq_max': 8000, 'fft_band_ratio': 0.3
+}
+
+def test_applied_parameters_drop_previous_noise_reference(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({'threshold': 0.3, 'reference_noise_floor': 0.02, 'noise_floor': 0.03}))
+    apply_parameters(BEST, CalibrationManager(str(path)))
+    
+    config = json.loads(path.read_text())
+    assert config['threshold'] == 0.05
+    assert config['reference_noise_floor'] is None
+    assert config['noise_floor'] is None
+
+def _configured_detector(config):
+    """Детектор с уровнями шума из конфигурации (как SmartLampController._create_detector)"""
+    detector = ClapDetector()
+    detector.threshold = config['threshold']
+    detector.noise_floor = config.get('noise_floor')
+    detector.reference_noise_floor = config.get('reference_noise_floor')
+    return detector
+
+def test_live_detector_thresholds_match_search(tmp_path):
+    path = tmp_path / "config.json"
+    stale = {'threshold': 0.3, 'reference_noise_floor': 0.02, 'noise_floor': 0.03}
+    path.write_text(json.dumps(stale))
+    manager = apply_parameters(BEST, CalibrationManager(str(path)))
+    
+    search = _search_detector(1024, adaptive=True)
+    search.threshold = BEST['threshold']
+    rms = np.abs(np.random.default_rng(0).normal(0.02, 0.003, 200))
+    expected = search.threshold_trace(rms)
+    
+    np.testing.assert_allclose(_configured_detector(manager.config).threshold_trace(rms), expected)
+    
+    # С опорным уровнем прежней калибровки порог был бы другим
+    stale_config = dict(stale, threshold=BEST['threshold'])
+    assert not np.allclose(_configured_detector(stale_config).threshold_trace(rms), expected)
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import pytest
+
+from command_queue import CommandQueue
+
+class _Trace:
+    """Трасса-заглушка: запоминает отметки этапов"""
+    def __init__(self, name):
+        self.name = name
+        self.marks = []
+    
+    def mark(self, stage):
+        self.marks.append(stage)
+
+class _Tracer:
+    def __init__(self):
+        self.discarded = []
+    
+    def discard(self, trace):
+        self.discarded.append(trace.name)
+
+class _BlockingHandler:
+    """Обработчик, который ждёт разрешения, пока тест накапливает команды"""
+    def __init__(self, error=None):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.error = error
+    
+    def __call__(self, trace):
+        self.calls.append(trace)
+        self.started.set()
+        self.release.wait(timeout=2)
+        if self.error:
+            raise self.error
+
+def _wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("условие не выполнено за отведённое время")
+        time.sleep(0.005)
+
+@pytest.fixture
+def handler():
+    handler = _BlockingHandler()
+    yield handler
+    handler.release.set()
+
+def _queue(handler, **kwargs):
+    queue = CommandQueue(handler, **kwargs)
+    queue.start()
+    return queue
+
+@pytest.mark.parametrize("extra, executions", [(1, 2), (2, 1), (3, 2), (4, 1)])
+def test_toggles_accumulated_during_execution_coalesce_by_parity(handler, extra, executions):
+    queue = _queue(handler)
+    queue.submit()
+    assert handler.started.wait(timeout=2)
+    for _ in range(extra):
+        queue.submit()
+    
+    handler.release.set()
+    _wait_for(lambda: queue.executed + queue.coalesced == 1 + extra)
+    queue.stop()
+    
+    assert len(handler.calls) == executions
+    assert queue.executed == executions
+    assert queue.coalesced == 1 + extra - executions
+    assert queue.depth == 0
+
+def test_first_fresh_command_runs_and_others_are_discarded(handler):
+    tracer = _Tracer()
+    queue = _queue(handler, tracer=tracer)
+    queue.submit(_Trace("first"))
+    assert handler.started.wait(timeout=2)
+    for name in ("a", "b", "c"):
+        queue.submit(_Trace(name))
+    
+    handler.release.set()
+    _wait_for(lambda: queue.executed == 2)
+    queue.stop()
+    
+    assert [trace.name for trace in handler.calls] == ["first", "a"]
+    assert handler.calls[1].marks == ["queued", "dequeued"]
+    assert sorted(tracer.discarded) == ["b", "c"]
+
+def test_stale_commands_are_dropped(handler):
+    tracer = _Tracer()
+    queue = _queue(handler, max_age=0.05, tracer=tracer)
+    queue.submit()
+    assert handler.started.wait(timeout=2)
+    queue.submit(_Trace("stale"))
+    time.sleep(0.1)
+    
+    handler.release.set()
+    _wait_for(lambda: queue.dropped_stale == 1)
+    queue.stop()
+    
+    assert queue.executed == 1
+    assert len(handler.calls) == 1
+    assert tracer.discarded == ["stale"]
+
+def test_handler_error_is_counted_and_queue_keeps_running():
+    handler = _BlockingHandler(error=RuntimeError("нет связи"))
+    handler.release.set()
+    queue = _queue(handler)
+    queue.submit()
+    _wait_for(lambda: queue.failed == 1)
+    queue.submit()
+    _wait_for(lambda: queue.failed == 2)
+    queue.stop()
+    
+    stats = queue.get_stats()
+    assert stats['executed'] == 0
+    assert stats['failed'] == 2
+    assert not stats['in_flight']
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+try:
+    import sounddevice
+except (ImportError, OSError):
+    pytest.skip("sounddevice (PortAudio) недоступен", allow_module_level=True)
+
+from audio_sources import ArraySource, synthesize_claps
+from record_audio import ClapDetector
+
+SAMPLE_RATE = 44100
+
+def _recording():
+    """Хлопки разной силы; с 6-й секунды фон громче - адаптивный порог поднимается"""
+    audio = synthesize_claps(12, SAMPLE_RATE, [1.0, 1.7, 3.0, 7.0, 7.7, 10.0], noise_level=0.01, clap_level=0.8, seed=1)
+    audio += synthesize_claps(12, SAMPLE_RATE, [5.0, 5.7, 8.5, 9.2], noise_level=0.0, clap_level=0.45, seed=3)
+    rng = np.random.default_rng(2)
+    audio[6 * SAMPLE_RATE:] += rng.normal(0, 0.03, len(audio) - 6 * SAMPLE_RATE).astype(np.float32)
+    return audio
+
+def _detector(adaptive):
+    detector = ClapDetector(sample_rate=SAMPLE_RATE, chunk_size=1024)
+    detector.threshold = 0.04
+    detector.fft_band_ratio = 0.3
+    detector.adaptive_threshold = adaptive
+    detector.trace_latency = False
+    return detector
+
+def _replay(detector, audio):
+    """События живого пути (поток, кольцевой буфер, анализ) при воспроизведении записи"""
+    events = []
+    register_clap = detector._register_clap
+    
+    def recording_register(clap_time):
+        event = register_clap(clap_time)
+        if event is not None:
+            sample = round(clap_time * SAMPLE_RATE)
+            events.append(('clap', sample))
+            if event == "double":
+                events.append(('double_clap', sample))
+        return event
+    
+    detector._register_clap = recording_register
+    detector.start_detection(source=ArraySource(audio, SAMPLE_RATE))
+    return events
+
+@pytest.mark.parametrize("mode", ["fft", "iir"])
+@pytest.mark.parametrize("adaptive", [True, False])
+def test_offline_matches_replay(adaptive, mode):
+    audio = _recording()
+    detector = _detector(adaptive)
+    detector.detection_mode = mode
+    offline = [(event['type'], event['sample']) for event in detector.detect_offline(audio)]
+    
+    live_detector = _detector(adaptive)
+    live_detector.detection_mode = mode
+    assert _replay(live_detector, audio) == offline
+    assert any(kind == 'double_clap' for kind, _ in offline)
+
+def test_adaptive_threshold_changes_offline_decisions():
+    audio = _recording()
+    adaptive = [event for event in _detector(True).detect_offline(audio) if event['type'] == 'clap']
+    fixed = [event for event in _detector(False).detect_offline(audio) if event['type'] == 'clap']
+    assert len(adaptive) < len(fixed)
+
+def test_offline_restores_noise_state():
+    detector = _detector(True)
+    detector._set_reference_noise_floor(0.01)
+    detector.detect_offline(_recording())
+    assert detector.noise_floor == pytest.approx(0.01)
+    assert detector.current_threshold is None
+    assert detector._armed
+
+def test_lower_sample_rate_keeps_block_duration(monkeypatch):
+    monkeypatch.setattr(sounddevice, "check_input_settings", lambda **kwargs: None)
+    detector = _detector(True)
+    assert detector.select_sample_rate() == (22050, 22050)
+    assert detector.chunk_size == 512
+    assert detector.callback_budget == pytest.approx(1024 / SAMPLE_RATE)
+
+def test_decimated_recording_gives_same_claps():
+    # До 6-й секунды: широкополосный фон после неё прореживание частично срезает
+    audio = _recording()[:6 * SAMPLE_RATE]
+    full = [(event['type'], event['time']) for event in _detector(True).detect_offline(audio)]
+    
+    # Порог и доля полосы, подобранные на 44100 Гц, работают и после прореживания
+    decimated = [(event['type'], event['time']) for event in _detector(True).detect_offline(audio, decimate=True)]
+    assert [kind for kind, _ in decimated] == [kind for kind, _ in full]
+    assert ('double_clap', pytest.approx(5.7, abs=0.03)) in full
+    assert np.allclose([t for _, t in decimated], [t for _, t in full], atol=0.03)
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+from async_yandex_api import AsyncYandexSmartHomeAPI, EventLoopThread
+from device_cache import DeviceMetadataCache
+from mock_yandex_server import MockYandexServer
+from yandex_api import ON_OFF, YandexSmartHomeAPI
+
+def _api(server, cache_file):
+    return YandexSmartHomeAPI("token", test_connection=False, keepalive_interval=0, reconcile_interval=0,
+                              metadata_cache=DeviceMetadataCache(str(cache_file)), base_url=server.base_url)
+
+def test_cached_capabilities_skip_device_checks_after_restart(tmp_path):
+    cache_file = tmp_path / "device_cache.json"
+    with MockYandexServer(device_count=3) as server:
+        # Первый запуск: кэша нет - каждая лампа проверяется запросом /devices/{id}
+        api = _api(server, cache_file)
+        api.add_devices(server.device_ids)
+        api.close()
+        assert server.get_stats()['requests'] == {"/devices/{id}": 3}
+        
+        cache = DeviceMetadataCache(str(cache_file))
+        assert all(cache.has_capability(device_id, ON_OFF) for device_id in server.device_ids)
+        assert cache.get(server.device_ids[0])['name'] == "Лампа 1"
+        
+        # Перезапуск: возможности из кэша, состояния всех ламп - одним запросом /user/info
+        api = _api(server, cache_file)
+        api.add_devices(server.device_ids)
+        api.close()
+        assert server.get_stats()['requests'] == {"/devices/{id}": 3, "/user/info": 1}
+        assert api.get_cached_states() == {device_id: False for device_id in server.device_ids}
+
+def test_async_add_devices_uses_cache(tmp_path):
+    cache_file = tmp_path / "device_cache.json"
+    loop = EventLoopThread()
+    loop.start()
+    with MockYandexServer(device_count=3) as server:
+        try:
+            first = _api(server, cache_file)
+            first.add_devices(server.device_ids[:2])
+            first.close()
+            
+            # Две лампы из кэша (один /user/info), третья проверяется отдельно
+            api = _api(server, cache_file)
+            async_api = AsyncYandexSmartHomeAPI(api)
+            available = loop.submit(async_api.add_devices(server.device_ids)).result(timeout=10)
+            async_api.close()
+            api.close()
+        finally:
+            loop.stop()
+    assert available == 3
+    assert server.get_stats()['requests'] == {"/devices/{id}": 3, "/user/info": 1}
+
+def test_unknown_device_has_no_capabilities(tmp_path):
+    cache = DeviceMetadataCache(str(tmp_path / "device_cache.json"))
+    assert cache.has_capability("missing", ON_OFF) is None
+    cache.update("lamp", {"name": "Лампа", "capabilities": [{"type": "devices.capabilities.range"}]})
+    assert cache.has_capability("lamp", ON_OFF) is False
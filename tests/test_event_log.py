@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import json
+import sys
+import threading
+
+import requests
+
+import event_log
+from event_log import EventLogger
+from yandex_api import YandexSmartHomeAPI
+
+class _RecordingStream:
+    """Замена stdout: запоминает строки и потоки, из которых они выведены"""
+    def __init__(self):
+        self.lines = []
+        self.threads = set()
+    
+    def write(self, text):
+        self.threads.add(threading.current_thread().name)
+        self.lines.extend(line for line in text.split("\n") if line)
+    
+    def flush(self):
+        pass
+
+def test_full_queue_drops_and_counts(monkeypatch):
+    monkeypatch.setattr(sys, "stdout", _RecordingStream())
+    logger = EventLogger(capacity=3)
+    results = [logger.info(f"запись {i}", color=None) for i in range(5)]
+    assert results == [True, True, True, False, False]
+    assert logger.get_stats() == {'pending': 3, 'written': 0, 'dropped': 2}
+
+def test_caller_never_writes_output(monkeypatch):
+    stream = _RecordingStream()
+    monkeypatch.setattr(sys, "stdout", stream)
+    logger = EventLogger()
+    
+    # До запуска записи только накапливаются
+    logger.info("до запуска", color=None)
+    assert stream.lines == []
+    
+    logger.start()
+    logger.info("после запуска", color=None)
+    logger.flush()
+    logger.stop()
+    assert stream.lines == ["до запуска", "после запуска"]
+    assert stream.threads == {"event-log"}
+    
+    # После остановки вызывающий поток тоже не пишет в stdout
+    logger.info("после остановки", color=None)
+    assert stream.lines == ["до запуска", "после запуска"]
+    assert logger.get_stats()['pending'] == 1
+
+def test_json_fields_do_not_override_standard_keys(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "stdout", _RecordingStream())
+    path = tmp_path / "events.jsonl"
+    logger = EventLogger(console=False, json_file=str(path)).start()
+    logger.warning("хлопок", event="clap", time=0)
+    logger.stop()
+    
+    record = json.loads(path.read_text(encoding="utf-8").strip())
+    assert record['level'] == "warning"
+    assert record['message'] == "хлопок"
+    assert record['time'] > 0
+    assert record['fields'] == {'event': "clap", 'time': 0}
+
+def test_configure_logging_keeps_late_records_and_counters(monkeypatch):
+    stream = _RecordingStream()
+    monkeypatch.setattr(sys, "stdout", stream)
+    monkeypatch.setattr(event_log, "_logger", None)
+    
+    first = event_log.configure_logging(capacity=2)
+    first.info("первая", color=None)
+    first.flush()
+    first.stop()
+    first.info("поздняя", color=None)  # Поток уже сменил журнал, а сообщение пришло в старый
+    
+    second = event_log.configure_logging()
+    second.flush()
+    second.stop()
+    assert stream.lines == ["первая", "поздняя"]
+    assert second.get_stats()['written'] == 2
+
+def test_api_state_errors_go_through_the_log(monkeypatch):
+    stream = _RecordingStream()
+    monkeypatch.setattr(sys, "stdout", stream)
+    logger = EventLogger()  # Не запущен: записи остаются в очереди
+    monkeypatch.setattr(event_log, "_logger", logger)
+    
+    api = YandexSmartHomeAPI("token", test_connection=False, keepalive_interval=0, reconcile_interval=0)
+    api.retry_backoff = 0.001
+    
+    def send(method, path, timeout, **kwargs):
+        raise requests.ConnectionError("нет соединения")
+    
+    api._send_hedged = send
+    api.device_ids = ["lamp-1"]
+    assert api.get_cached_state("lamp-1") is False
+    assert api.reconcile_states() == 0
+    api.close()
+    
+    assert stream.lines == []
+    assert [record[1] for record in logger._records] == ["error", "error"]
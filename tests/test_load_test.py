@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+
+from event_log import configure_logging, get_logger
+from load_test import run_load_test
+
+def test_load_test_is_quiet_and_restores_logger(capsys):
+    configure_logging(console=True)
+    result = run_load_test("baseline", toggles=6, concurrency=2)
+    get_logger().flush()
+    
+    assert result['succeeded'] == 6
+    assert "Устройство" not in capsys.readouterr().out
+    assert get_logger().console
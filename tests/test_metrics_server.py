@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import urllib.error
+import urllib.request
+
+import pytest
+
+from metrics_server import Metric, MetricsServer, render_metrics
+
+def test_render_metrics_exposition_format():
+    text = render_metrics([
+        Metric("smartlamp_claps_total", "counter", "Хлопков").add(3),
+        Metric("smartlamp_latency_seconds", "gauge", "Задержка").add(0.25, stage="api").add(1.0, stage="total"),
+    ])
+    
+    assert text == (
+        "# HELP smartlamp_claps_total Хлопков\n"
+        "# TYPE smartlamp_claps_total counter\n"
+        "smartlamp_claps_total 3\n"
+        "# HELP smartlamp_latency_seconds Задержка\n"
+        "# TYPE smartlamp_latency_seconds gauge\n"
+        'smartlamp_latency_seconds{stage="api"} 0.25\n'
+        'smartlamp_latency_seconds{stage="total"} 1\n'
+    )
+
+def test_render_metrics_escapes_labels_and_special_values():
+    text = render_metrics([
+        Metric("smartlamp_value", "gauge", "Значение")
+        .add(float("nan"), name='a"b')
+        .add(float("inf"), name="c\\d")
+        .add(float("-inf"), name="e\nf"),
+    ])
+    
+    assert 'smartlamp_value{name="a\\"b"} NaN' in text
+    assert 'smartlamp_value{name="c\\\\d"} +Inf' in text
+    assert 'smartlamp_value{name="e\\nf"} -Inf' in text
+
+def test_metrics_without_samples_are_skipped():
+    text = render_metrics([
+        Metric("smartlamp_empty", "gauge", "Нет данных").add(None),
+        Metric("smartlamp_up", "gauge", "Работает").add(1),
+    ])
+    
+    assert "smartlamp_empty" not in text
+    assert text.endswith("smartlamp_up 1\n")
+
+@pytest.fixture
+def server():
+    server = MetricsServer(lambda: [Metric("smartlamp_up", "gauge", "Работает").add(1)], port=0).start()
+    yield server
+    server.stop()
+
+def test_server_serves_metrics_and_counts_scrapes(server):
+    for scrape in (1, 2):
+        with urllib.request.urlopen(server.url, timeout=2) as response:
+            body = response.read().decode("utf-8")
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+        assert "smartlamp_up 1\n" in body
+        assert f"smartlamp_metrics_scrapes_total {scrape}\n" in body
+
+def test_server_returns_404_for_other_paths(server):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(f"http://{server.host}:{server.port}/other", timeout=2)
+    assert error.value.code == 404
+
+def test_collect_error_returns_500():
+    def collect():
+        raise RuntimeError("сбой")
+    
+    server = MetricsServer(collect, port=0).start()
+    try:
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(server.url, timeout=2)
+        assert error.value.code == 500
+        assert "сбой" in error.value.read().decode("utf-8")
+    finally:
+        server.stop()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+
+try:
+    import sounddevice
+except (ImportError, OSError):
+    pytest.skip("sounddevice (PortAudio) недоступен", allow_module_level=True)
+
+from audio_sources import AudioSource
+from multi_stream import MultiStreamSupervisor
+from record_audio import ClapDetector
+
+class _Stream:
+    def __init__(self, source):
+        self.source = source
+    
+    def __enter__(self):
+        if self.source.fail_on_enter:
+            raise OSError("устройство занято")
+        self.source.entered += 1
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.source.exited += 1
+
+class _Source(AudioSource):
+    """Источник, который считает открытия и закрытия потока или не открывается"""
+    def __init__(self, fail_on_open=False, fail_on_enter=False):
+        self.fail_on_open = fail_on_open
+        self.fail_on_enter = fail_on_enter
+        self.entered = 0
+        self.exited = 0
+    
+    def open_stream(self, callback, samplerate, blocksize, channels=1, ready=None):
+        if self.fail_on_open:
+            raise OSError("устройство не найдено")
+        return _Stream(self)
+    
+    def record(self, frames, samplerate, channels=1):
+        raise NotImplementedError
+
+@pytest.mark.parametrize("failure", [{"fail_on_open": True}, {"fail_on_enter": True}])
+def test_failed_open_closes_opened_streams_and_executor(failure):
+    supervisor = MultiStreamSupervisor(workers=1)
+    first = _Source()
+    broken = _Source(**failure)
+    supervisor.add_stream(ClapDetector(), name="first", source=first)
+    supervisor.add_stream(ClapDetector(), name="broken", source=broken)
+    
+    with pytest.raises(OSError):
+        supervisor.run()
+    
+    assert (first.entered, first.exited) == (1, 1)
+    assert broken.exited == 0
+    assert supervisor._action_executor is None
+    assert not supervisor.is_running
+    assert all(stream.stream is None and not stream.detector.is_running for stream in supervisor.streams)
+    assert supervisor._queue.empty()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import requests
+
+from resilience import CircuitBreaker, LatencyTracker
+from yandex_api import YandexSmartHomeAPI
+
+def _api(attempts):
+    """Клиент без сети: каждая попытка запроса записывается и завершается ошибкой соединения"""
+    api = YandexSmartHomeAPI("token", test_connection=False, keepalive_interval=0, reconcile_interval=0)
+    api.retry_backoff = 0.001
+    
+    def send(method, path, timeout, **kwargs):
+        attempts.append(path)
+        raise requests.ConnectionError("нет соединения")
+    
+    api._send_hedged = send
+    return api
+
+def test_breaker_opens_after_threshold_and_probes_once():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    
+    # После reset_timeout пропускается ровно один пробный запрос
+    breaker.opened_at -= 1
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.rejected == 2
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0.05)
+    breaker.state = "open"
+    breaker.opened_at -= 1
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+def test_retries_count_as_one_failure():
+    attempts = []
+    api = _api(attempts)
+    try:
+        try:
+            api._request("GET", "/devices/lamp", timeout=1.0)
+        except requests.ConnectionError:
+            pass
+        assert len(attempts) == api.max_retries + 1
+        assert api.circuit_breaker.consecutive_failures == 1
+        assert api.circuit_breaker.state == "closed"
+    finally:
+        api.close()
+
+def test_retry_stops_when_breaker_opens():
+    attempts = []
+    api = _api(attempts)
+    send = api._send_hedged
+    
+    def send_and_open(method, path, timeout, **kwargs):
+        # Параллельные запросы размыкают выключатель во время первой попытки
+        for _ in range(api.circuit_breaker.failure_threshold):
+            api.circuit_breaker.record_failure()
+        return send(method, path, timeout, **kwargs)
+    
+    api._send_hedged = send_and_open
+    try:
+        try:
+            api._request("GET", "/devices/lamp", timeout=1.0)
+        except requests.ConnectionError:
+            pass
+        assert len(attempts) == 1
+    finally:
+        api.close()
+
+def test_failed_half_open_probe_is_not_retried():
+    attempts = []
+    api = _api(attempts)
+    api.circuit_breaker.state = "open"
+    api.circuit_breaker.opened_at = 0.0
+    try:
+        try:
+            api._request("GET", "/devices/lamp", timeout=1.0)
+        except requests.ConnectionError:
+            pass
+        assert len(attempts) == 1
+        assert api.circuit_breaker.state == "open"
+    finally:
+        api.close()
+
+def test_latency_snapshot():
+    tracker = LatencyTracker(window=4)
+    for seconds in (0.1, 0.2, 0.3, 0.4, 0.5):
+        tracker.record("GET /devices", seconds)
+    snapshot = tracker.snapshot()["GET /devices"]
+    assert snapshot['count'] == 4
+    assert snapshot['p50'] in (0.3, 0.4)
+    assert snapshot['p99'] == 0.5
+
+def test_latency_record_from_many_threads():
+    tracker = LatencyTracker(window=1000)
+    
+    def worker():
+        for _ in range(100):
+            tracker.record("GET /devices", 0.1)
+    
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert tracker.snapshot()["GET /devices"]['count'] == 800
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+try:
+    import sounddevice
+except (ImportError, OSError):
+    pytest.skip("sounddevice (PortAudio) недоступен", allow_module_level=True)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _run(args, **env):
+    """Запуск Python в отдельном процессе: sys.modules не загрязнён другими тестами"""
+    environment = {k: v for k, v in os.environ.items() if not k.startswith("YANDEX_")}
+    environment.update(env)
+    return subprocess.run([sys.executable] + args, cwd=ROOT, env=environment,
+                          capture_output=True, text=True, timeout=60)
+
+def test_importing_main_does_not_load_scipy_or_api_client():
+    heavy = ("scipy", "scipy.signal", "requests", "yandex_api", "async_yandex_api")
+    result = _run(["-c", f"import sys, main; print([m for m in {heavy!r} if m in sys.modules])"])
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
+
+def test_daemon_without_credentials_exits_with_message(tmp_path):
+    result = _run(["daemon.py", str(tmp_path / "config.json")])
+    assert result.returncode == 2
+    assert "Не заданы токен или лампы" in result.stdout
+
+def test_daemon_exits_non_zero_when_microphone_fails(tmp_path):
+    # Заглушка sounddevice и машина без микрофона одинаково не открывают поток
+    result = _run(["-c", "import sounddevice as sd; sd.InputStream = None; "
+                         "import sys, daemon; sys.exit(daemon.run_daemon(sys.argv[1]))",
+                   str(tmp_path / "config.json")],
+                  YANDEX_TOKEN="token", YANDEX_DEVICE_IDS="lamp")
+    assert result.returncode == 1
+    assert "возврата в меню" not in result.stdout
+
+def test_runtime_files_are_kept_next_to_config(tmp_path):
+    result = _run(["-c", "import sys; from main import SmartLampController; "
+                         "print(SmartLampController(config_file=sys.argv[1])._data_path('device_cache.json'))",
+                   str(tmp_path / "config.json")])
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == str(tmp_path / "device_cache.json")
+
+def test_api_stats_reach_system_info_and_metrics(tmp_path):
+    script = (
+        "import sys\n"
+        "from main import SmartLampController\n"
+        "from metrics_server import render_metrics\n"
+        "from mock_yandex_server import MockYandexServer\n"
+        "from yandex_api import YandexSmartHomeAPI\n"
+        "with MockYandexServer(device_count=1) as server:\n"
+        "    controller = SmartLampController(config_file=sys.argv[1])\n"
+        "    controller.yandex_api = YandexSmartHomeAPI('token', test_connection=False, keepalive_interval=0,\n"
+        "                                               reconcile_interval=0, base_url=server.base_url)\n"
+        "    device_id = server.device_ids[0]\n"
+        "    controller.yandex_api.get_device_state(device_id)\n"
+        "    controller.yandex_api.get_device_state(device_id)\n"
+        "    controller.print_api_stats()\n"
+        "    print(render_metrics(controller.collect_metrics()))\n"
+        "    controller.yandex_api.close()\n"
+    )
+    result = _run(["-c", script, str(tmp_path / "config.json")])
+    assert result.returncode == 0, result.stderr
+    assert "Соединения API: новых 1" in result.stdout
+    assert "Кэш состояний: записей 1" in result.stdout
+    assert "# TYPE smartlamp_api_latency_seconds summary" in result.stdout
+    assert "smartlamp_api_connections_total 1" in result.stdout
@@ -2,134 +2,571 @@
 # -*- coding: utf-8 -*-
 
 import requests
-import json
+import random
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
 from termcolor import colored
 
+from device_cache import DeviceStateCache
+from event_log import get_logger
+from resilience import LatencyTracker, CircuitBreaker, CircuitOpenError
+
+ON_OFF = "devices.capabilities.on_off"
+
 class YandexSmartHomeAPI:
-    def __init__(self, token):
+    def __init__(self, token, pool_size=4, keepalive_interval=25, state_ttl=60, reconcile_interval=30,
+                 test_connection=True, metadata_cache=None, base_url=None):
         self.token = token
-        self.base_url = "https://api.iot.yandex.net/v1.0"
+        # base_url - другой адрес API (например, локальный mock_yandex_server для тестов)
+        self.base_url = base_url or "https://api.iot.yandex.net/v1.0"
         self.headers = {
             "Authorization": f"Bearer {token}",
             "Content-Type": "application/json"
         }
         self.device_ids = []
-        self._test_connection()
+        
+        # Постоянная сессия: соединения TCP+TLS переиспользуются между запросами
+        self.pool_size = pool_size
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+        
+        # Прогрев простаивающих соединений, чтобы хлопок не ждал рукопожатия
+        self.keepalive_interval = keepalive_interval
+        self._keepalive_thread = None
+        self._keepalive_stop = threading.Event()
+        self._last_request_time = 0.0
+        self.request_count = 0
+        self.warmup_count = 0
+        
+        # Локальный кэш состояний: переключение без предварительного чтения,
+        # фоновая сверка с API исправляет расхождения
+        self.state_cache = DeviceStateCache(ttl=state_ttl)
+        self.reconcile_interval = reconcile_interval
+        self._reconcile_thread = None
+        self._reconcile_stop = threading.Event()
+        
+        # Защита от хвостовых задержек: бюджет времени на переключение, повторы
+        # с экспоненциальной паузой, дублирующий запрос после p95 и выключатель
+        self.toggle_deadline = 4.0  # Общий бюджет времени на одно переключение (сек)
+        self.max_retries = 3
+        self.retry_backoff = 0.1  # Начальная пауза между повторами (сек)
+        self.hedge_percentile = 95
+        self.hedge_min_delay = 0.05
+        self.hedge_min_samples = 20
+        self.latency = LatencyTracker()
+        self.circuit_breaker = CircuitBreaker()
+        self._hedge_executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="api-hedge")
+        self.retry_count = 0
+        self.hedge_count = 0
+        
+        # Имена и возможности устройств на диске (DeviceMetadataCache), чтобы не ждать сети при старте
+        self.metadata_cache = metadata_cache
+        
+        # test_connection=False - проверка подключения выполняется вызывающим кодом (например, в фоне)
+        if test_connection:
+            self._test_connection()
+        self.start_keepalive()
+    
+    def _endpoint(self, method, path):
+        """Имя конечной точки для статистики задержек"""
+        if path.startswith("/devices/") and path != "/devices/actions":
+            path = "/devices/{id}"
+        return f"{method} {path}"
+    
+    def _send(self, method, path, timeout, **kwargs):
+        """Одна попытка HTTP-запроса через общую сессию с замером задержки"""
+        self.request_count += 1
+        self._last_request_time = time.monotonic()
+        start = time.perf_counter()
+        response = self.session.request(method, f"{self.base_url}{path}", timeout=timeout, **kwargs)
+        self.latency.record(self._endpoint(method, path), time.perf_counter() - start)
+        return response
+    
+    def _send_hedged(self, method, path, timeout, **kwargs):
+        """Попытка с дублирующим запросом, если первый не ответил за p95 задержки"""
+        hedge_delay = self.latency.percentile(
+            self._endpoint(method, path), self.hedge_percentile, min_samples=self.hedge_min_samples)
+        if hedge_delay is None or hedge_delay >= timeout:
+            return self._send(method, path, timeout, **kwargs)
+        
+        primary = self._hedge_executor.submit(self._send, method, path, timeout, **kwargs)
+        done, _ = wait([primary], timeout=max(hedge_delay, self.hedge_min_delay))
+        if done:
+            return primary.result()
+        
+        self.hedge_count += 1
+        hedge = self._hedge_executor.submit(self._send, method, path, timeout, **kwargs)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    error = e
+        raise error
+    
+    def _request(self, method, path, timeout, deadline_at=None, trace=None, **kwargs):
+        """HTTP-запрос к API с бюджетом времени, повторами, дублированием и выключателем
+        
+        deadline_at - момент (time.monotonic()), после которого новые попытки не делаются.
+        trace - трасса задержки (ClapTrace): отмечаются первая отправка и последний ответ.
+        """
+        if not self.circuit_breaker.allow():
+            raise CircuitOpenError("API Яндекс.Дом временно недоступно (выключатель разомкнут)")
+        
+        if deadline_at is None:
+            deadline_at = time.monotonic() + timeout
+        
+        response = None
+        error = None
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            
+            # Повтор - только пока выключатель пропускает запросы: его могли разомкнуть
+            # другие запросы, а неудачная пробная попытка (half_open) не повторяется
+            if attempt > 0 and not self.circuit_breaker.allow():
+                break
+            
+            if trace is not None:
+                trace.mark_once("sent")
+            try:
+                response = self._send_hedged(method, path, min(timeout, remaining), **kwargs)
+                if trace is not None:
+                    trace.mark("response")
+                error = None
+                if response.status_code < 500 and response.status_code != 429:
+                    self.circuit_breaker.record_success()
+                    return response
+            except requests.RequestException as e:
+                response, error = None, e
+            
+            if attempt == self.max_retries:
+                break
+            
+            # Экспоненциальная пауза со случайным разбросом, не выходящая за бюджет
+            backoff = self.retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.0)
+            if time.monotonic() + backoff >= deadline_at:
+                break
+            self.retry_count += 1
+            time.sleep(backoff)
+        
+        # Одна ошибка на логический запрос, сколько бы попыток он ни сделал
+        self.circuit_breaker.record_failure()
+        if response is not None:
+            return response
+        if error is not None:
+            raise error
+        raise requests.Timeout(f"Истёк бюджет времени запроса {method} {path}")
+    
+    def get_latency_stats(self):
+        """Перцентили задержек по конечным точкам и состояние защиты от сбоев"""
+        return {
+            'endpoints': self.latency.snapshot(),
+            'circuit_state': self.circuit_breaker.state,
+            'circuit_rejected': self.circuit_breaker.rejected,
+            'retries': self.retry_count,
+            'hedged': self.hedge_count
+        }
+    
+    def warm_up(self, connections=None):
+        """Открытие/поддержание соединений в пуле лёгкими параллельными запросами"""
+        connections = connections or self.pool_size
+        
+        def ping(_):
+            try:
+                self.session.head(self.base_url, timeout=5).close()
+                return True
+            except Exception:
+                return False
+        
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            warmed = sum(executor.map(ping, range(connections)))
+        self.warmup_count += 1
+        return warmed
+    
+    def start_keepalive(self):
+        """Запуск фонового прогрева соединений"""
+        if not self.keepalive_interval or (self._keepalive_thread and self._keepalive_thread.is_alive()):
+            return
+        
+        self._keepalive_stop.clear()
+        self._keepalive_thread = threading.Thread(target=self._keepalive_loop, name="api-keepalive", daemon=True)
+        self._keepalive_thread.start()
+    
+    def _keepalive_loop(self):
+        """Периодический прогрев соединений, простаивающих дольше интервала"""
+        self.warm_up()
+        while not self._keepalive_stop.wait(self.keepalive_interval):
+            if time.monotonic() - self._last_request_time >= self.keepalive_interval:
+                self.warm_up()
+    
+    def get_connection_stats(self):
+        """Статистика переиспользования соединений"""
+        pools = self._adapter.poolmanager.pools
+        new_connections = 0
+        pool_requests = 0
+        for key in pools.keys():
+            pool = pools[key]
+            new_connections += pool.num_connections
+            pool_requests += pool.num_requests
+        
+        return {
+            'api_requests': self.request_count,
+            'pool_requests': pool_requests,
+            'new_connections': new_connections,
+            'reused_requests': max(pool_requests - new_connections, 0),
+            'reuse_ratio': (pool_requests - new_connections) / pool_requests if pool_requests else 0.0,
+            'warmups': self.warmup_count
+        }
+    
+    def start_reconciler(self):
+        """Запуск фоновой сверки кэша состояний с API"""
+        if not self.reconcile_interval or (self._reconcile_thread and self._reconcile_thread.is_alive()):
+            return
+        
+        self._reconcile_stop.clear()
+        self._reconcile_thread = threading.Thread(target=self._reconcile_loop, name="api-reconcile", daemon=True)
+        self._reconcile_thread.start()
+    
+    def _reconcile_loop(self):
+        """Периодическое обновление кэша из /user/info"""
+        while not self._reconcile_stop.wait(self.reconcile_interval):
+            self.reconcile_states()
+    
+    def reconcile_states(self):
+        """Сверка кэша состояний с API (возвращает число исправленных записей)"""
+        since = time.monotonic()
+        states = self.get_all_device_states(update_cache=False)
+        if states is None:
+            return 0
+        
+        corrected = self.state_cache.reconcile(states, since)
+        if corrected:
+            get_logger().info(f"ℹ Состояние {corrected} устройств обновлено по данным API", "blue",
+                              event="reconcile", corrected=corrected)
+        return corrected
+    
+    def close(self):
+        """Остановка фоновых потоков и закрытие соединений"""
+        self._keepalive_stop.set()
+        self._reconcile_stop.set()
+        for thread in (self._keepalive_thread, self._reconcile_thread):
+            if thread and thread.is_alive():
+                thread.join(timeout=1)
+        self._hedge_executor.shutdown(wait=False)
+        self.session.close()
     
     def _test_connection(self):
         """Проверка подключения к API Яндекс.Дом"""
         try:
-            response = requests.get(
-                f"{self.base_url}/user/info",
-                headers=self.headers,
+            response = self._request(
+                "GET", "/user/info",
                 timeout=10
             )
             if response.status_code == 200:
                 print(colored("✓ Успешное подключение к API Яндекс.Дом", "green"))
+                return True
             else:
                 print(colored(f"✗ Ошибка подключения к API: {response.status_code}", "red"))
                 print(colored(f"Ответ: {response.text}", "yellow"))
         except Exception as e:
             print(colored(f"✗ Ошибка сети: {str(e)}", "red"))
+        return False
     
     def add_devices(self, device_ids):
         """Добавление списка устройств для управления"""
         self.device_ids = device_ids
         print(colored(f"✓ Добавлено {len(device_ids)} устройств", "blue"))
         
-        # Проверка доступности устройств
-        for device_id in device_ids:
+        # Проверка доступности устройств: лампы из кэша - одним запросом состояний
+        cached, unchecked = self.split_cached_devices(device_ids)
+        for device_id in unchecked:
             self._check_device(device_id)
+        if cached:
+            self._check_cached_devices(cached)
+        
+        if self.metadata_cache is not None:
+            self.metadata_cache.save()
+        self.start_reconciler()
     
     def _check_device(self, device_id):
         """Проверка доступности конкретного устройства"""
         try:
-            response = requests.get(
-                f"{self.base_url}/devices/{device_id}",
-                headers=self.headers,
+            response = self._request(
+                "GET", f"/devices/{device_id}",
                 timeout=5
             )
             if response.status_code == 200:
                 device_info = response.json()
                 device_name = device_info.get("name", "Неизвестное устройство")
+                self.state_cache.set(device_id, self._on_off_state(device_info))
+                if self.metadata_cache is not None:
+                    self.metadata_cache.update(device_id, device_info)
                 print(colored(f"  • {device_name} ({device_id[:8]}...) - доступен", "green"))
+                return True
             else:
                 print(colored(f"  • Устройство {device_id[:8]}... - недоступно", "yellow"))
         except Exception as e:
             print(colored(f"  • Ошибка проверки устройства: {str(e)}", "red"))
+        return False
+    
+    def split_cached_devices(self, device_ids):
+        """Лампы, управляемость которых известна из кэша метаданных, и лампы для проверки"""
+        cached, unchecked = [], []
+        for device_id in device_ids:
+            if self.metadata_cache is not None and self.metadata_cache.has_capability(device_id, ON_OFF):
+                cached.append(device_id)
+            else:
+                unchecked.append(device_id)
+        return cached, unchecked
+    
+    def _check_cached_devices(self, device_ids):
+        """Доступность ламп из кэша по одному запросу /user/info (без /devices/{id} для каждой)"""
+        states = self.get_all_device_states() or {}
+        available = 0
+        for device_id in device_ids:
+            if device_id in states:
+                available += 1
+                print(colored(f"  • {self.get_device_name(device_id)} ({device_id[:8]}...) - доступен", "green"))
+            else:
+                print(colored(f"  • {self.get_device_name(device_id)} ({device_id[:8]}...) - недоступно", "yellow"))
+        return available
+    
+    def get_device_name(self, device_id):
+        """Имя устройства из кэша метаданных (или сокращённый ID)"""
+        if self.metadata_cache is not None:
+            metadata = self.metadata_cache.get(device_id)
+            if metadata:
+                return metadata['name']
+        return f"Устройство {device_id[:8]}..."
     
-    def get_device_state(self, device_id):
+    def get_device_state(self, device_id, deadline_at=None):
         """Получение текущего состояния устройства"""
         try:
-            response = requests.get(
-                f"{self.base_url}/devices/{device_id}",
-                headers=self.headers,
-                timeout=5
+            response = self._request(
+                "GET", f"/devices/{device_id}",
+                timeout=5,
+                deadline_at=deadline_at
             )
             if response.status_code == 200:
-                device_info = response.json()
-                capabilities = device_info.get("capabilities", [])
-                for cap in capabilities:
-                    if cap.get("type") == "devices.capabilities.on_off":
-                        return cap.get("state", {}).get("value", False)
+                state = self._on_off_state(response.json())
+                self.state_cache.set(device_id, state)
+                return state
             return False
         except Exception as e:
-            print(colored(f"✗ Ошибка получения состояния: {str(e)}", "red"))
+            get_logger().error(f"✗ Ошибка получения состояния: {str(e)}")
             return False
     
-    def toggle_device(self, device_id):
+    def _on_off_state(self, device_info):
+        """Состояние включения из описания устройства"""
+        capabilities = device_info.get("capabilities", [])
+        for cap in capabilities:
+            if cap.get("type") == ON_OFF:
+                return cap.get("state", {}).get("value", False)
+        return False
+    
+    def get_cached_state(self, device_id, deadline_at=None):
+        """Состояние устройства из кэша (запрос к API только при промахе)"""
+        state = self.state_cache.get(device_id)
+        if state is None:
+            state = self.get_device_state(device_id, deadline_at=deadline_at)
+        return state
+    
+    def get_cached_states(self, deadline_at=None):
+        """Состояния всех устройств из кэша; при промахе - один запрос к /user/info"""
+        states = {}
+        for device_id in self.device_ids:
+            state = self.state_cache.get(device_id)
+            if state is None:
+                return self.get_all_device_states(deadline_at=deadline_at)
+            states[device_id] = state
+        return states
+    
+    def get_all_device_states(self, update_cache=True, deadline_at=None):
+        """Состояния всех управляемых устройств одним запросом к /user/info"""
+        try:
+            response = self._request(
+                "GET", "/user/info",
+                timeout=10,
+                deadline_at=deadline_at
+            )
+            if response.status_code != 200:
+                get_logger().error(f"✗ HTTP ошибка: {response.status_code}", event="http_error", status=response.status_code)
+                return None
+            
+            devices = {device.get("id"): device for device in response.json().get("devices", [])}
+            if self.metadata_cache is not None:
+                # Ответ /user/info содержит имена и возможности - кэш метаданных обновляется попутно
+                for device_id in self.device_ids:
+                    if device_id in devices:
+                        self.metadata_cache.update(device_id, devices[device_id])
+            states = {
+                device_id: self._on_off_state(devices[device_id])
+                for device_id in self.device_ids
+                if device_id in devices
+            }
+            if update_cache:
+                self.state_cache.update(states)
+            return states
+        except Exception as e:
+            get_logger().error(f"✗ Ошибка получения состояния: {str(e)}")
+            return None
+    
+    def _device_action(self, device_id, value):
+        """Описание действия включения/выключения для одного устройства"""
+        return {
+            "id": device_id,
+            "actions": [{
+                "type": ON_OFF,
+                "state": {
+                    "instance": "on",
+                    "value": value
+                }
+            }]
+        }
+    
+    def toggle_device(self, device_id, trace=None):
         """Переключение состояния устройства (вкл/выкл)"""
-        current_state = self.get_device_state(device_id)
+        deadline_at = time.monotonic() + self.toggle_deadline
+        
+        # Состояние из кэша; обращение к API - только при промахе
+        current_state = self.get_cached_state(device_id, deadline_at=deadline_at)
         new_state = not current_state
         
-        payload = {
-            "devices": [{
-                "id": device_id,
-                "actions": [{
-                    "type": "devices.capabilities.on_off",
-                    "state": {
-                        "instance": "on",
-                        "value": new_state
-                    }
-                }]
-            }]
-        }
+        # Оптимистичное обновление: кэш меняется сразу, при ошибке запись сбрасывается
+        self.state_cache.set(device_id, new_state)
+        
+        payload = {"devices": [self._device_action(device_id, new_state)]}
         
         try:
-            response = requests.post(
-                f"{self.base_url}/devices/actions",
-                headers=self.headers,
+            response = self._request(
+                "POST", "/devices/actions",
                 json=payload,
-                timeout=10
+                timeout=10,
+                deadline_at=deadline_at,
+                trace=trace
             )
             
             if response.status_code == 200:
                 action_result = response.json()
-                if action_result.get("status") == "DONE":
-                    print(colored(f"✓ Устройство {device_id[:8]}... {'включено' if new_state else 'выключено'}", "green"))
+                if self._parse_action_results(action_result).get(device_id) == "DONE":
+                    get_logger().info(f"✓ Устройство {device_id[:8]}... {'включено' if new_state else 'выключено'}", "green",
+                                      event="device_toggled", device_id=device_id, state=new_state)
                     return True
                 else:
-                    print(colored(f"✗ Ошибка выполнения действия: {action_result}", "red"))
+                    self.state_cache.invalidate(device_id)
+                    get_logger().error(f"✗ Ошибка выполнения действия: {action_result}")
                     return False
             else:
-                print(colored(f"✗ HTTP ошибка: {response.status_code}", "red"))
-                print(colored(f"Ответ: {response.text}", "yellow"))
+                self.state_cache.invalidate(device_id)
+                get_logger().error(f"✗ HTTP ошибка: {response.status_code}", event="http_error", status=response.status_code)
+                get_logger().warning(f"Ответ: {response.text}")
                 return False
-                
+        
         except Exception as e:
-            print(colored(f"✗ Ошибка управления устройством: {str(e)}", "red"))
+            self.state_cache.invalidate(device_id)
+            get_logger().error(f"✗ Ошибка управления устройством: {str(e)}")
             return False
     
-    def toggle_all_devices(self):
-        """Одновременное переключение всех устройств"""
-        print(colored("\n🔄 Переключение всех ламп...", "cyan"))
+    def toggle_all_devices(self, batched=True, trace=None):
+        """Одновременное переключение всех устройств
+        
+        batched=True - одно чтение состояний и один запрос действий для всех устройств,
+        batched=False - последовательное переключение каждого устройства.
+        """
+        if batched:
+            return self._toggle_all_batched(trace)
+        
+        get_logger().info("\n🔄 Переключение всех ламп...", "cyan")
         success_count = 0
         
         for device_id in self.device_ids:
-            if self.toggle_device(device_id):
+            if self.toggle_device(device_id, trace):
                 success_count += 1
             time.sleep(0.5)  # Небольшая задержка между запросами
         
-        print(colored(f"✓ Успешно переключено {success_count}/{len(self.device_ids)} устройств\n", "green"))
-        return success_count == len(self.device_ids)
\ No newline at end of file
+        get_logger().info(f"✓ Успешно переключено {success_count}/{len(self.device_ids)} устройств\n", "green",
+                          event="toggle_all", succeeded=success_count, total=len(self.device_ids))
+        return success_count == len(self.device_ids)
+    
+    def _toggle_all_batched(self, trace=None):
+        """Переключение всех устройств одним запросом к /devices/actions"""
+        get_logger().info("\n🔄 Переключение всех ламп...", "cyan")
+        deadline_at = time.monotonic() + self.toggle_deadline
+        
+        states = self.get_cached_states(deadline_at=deadline_at)
+        if states is None:
+            return False
+        
+        for device_id in self.device_ids:
+            if device_id not in states:
+                get_logger().warning(f"  • Устройство {device_id[:8]}... - не найдено в аккаунте")
+        
+        new_states = {device_id: not state for device_id, state in states.items()}
+        if not new_states:
+            return False
+        
+        payload = {"devices": [self._device_action(device_id, value) for device_id, value in new_states.items()]}
+        
+        # Оптимистичное обновление кэша до ответа API
+        self.state_cache.update(new_states)
+        
+        try:
+            response = self._request(
+                "POST", "/devices/actions",
+                json=payload,
+                timeout=10,
+                deadline_at=deadline_at,
+                trace=trace
+            )
+            
+            if response.status_code != 200:
+                self.state_cache.invalidate()
+                get_logger().error(f"✗ HTTP ошибка: {response.status_code}", event="http_error", status=response.status_code)
+                get_logger().warning(f"Ответ: {response.text}")
+                return False
+            
+            results = self._parse_action_results(response.json())
+        except Exception as e:
+            self.state_cache.invalidate()
+            get_logger().error(f"✗ Ошибка управления устройствами: {str(e)}")
+            return False
+        
+        success_count = 0
+        for device_id, value in new_states.items():
+            status = results.get(device_id)
+            if status == "DONE":
+                success_count += 1
+                get_logger().info(f"✓ Устройство {device_id[:8]}... {'включено' if value else 'выключено'}", "green",
+                                  event="device_toggled", device_id=device_id, state=value)
+            else:
+                self.state_cache.invalidate(device_id)
+                get_logger().error(f"✗ Устройство {device_id[:8]}...: {status or 'нет ответа'}",
+                                   event="device_error", device_id=device_id, status=status)
+        
+        get_logger().info(f"✓ Успешно переключено {success_count}/{len(self.device_ids)} устройств\n", "green",
+                          event="toggle_all", succeeded=success_count, total=len(self.device_ids))
+        return success_count == len(self.device_ids)
+    
+    def _parse_action_results(self, action_result):
+        """Статусы выполнения действий по устройствам из ответа /devices/actions"""
+        results = {}
+        for device in action_result.get("devices", []):
+            statuses = [
+                cap.get("state", {}).get("action_result", {}).get("status")
+                for cap in device.get("capabilities", [])
+            ]
+            if statuses and all(status == "DONE" for status in statuses):
+                results[device.get("id")] = "DONE"
+            else:
+                results[device.get("id")] = next((status for status in statuses if status != "DONE"), None)
+        return results
\ No newline at end of file